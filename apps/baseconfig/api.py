@@ -3,7 +3,7 @@ from rest_framework import viewsets, permissions
 from rest_framework.filters import SearchFilter
 from rest_framework.request import Request
 from django_filters.rest_framework import DjangoFilterBackend
-from django.core.cache import cache
+from utility import tree
 from . import models
 from . import serializers
 from . import filters
@@ -29,20 +29,16 @@ class BaseTreeViewSet(viewsets.ModelViewSet):
     filterset_class = filters.BaseTreeFilterSet
 
     def list(self, request, *args, **kwargs):
+        """`use_cache=1` 时使用按分类树版本号缓存的结果"""
         if request.query_params.get('use_cache'):
-            data = self.get_from_cache()
-            if data:
-                return Response(data)
-        qs = self.filter_queryset(self.get_queryset())
-        serializer = self.serializer_class(qs, many=True)
-        if request.query_params.get('use_cache'):
-            cache_key = self.request.get_full_path()
-            cache.set(cache_key, serializer.data, 1 * 60 * 60)
-        return Response(serializer.data)
+            data = tree.get_cached_data(['basetree', request.get_full_path()], [models.BaseTree], self.get_tree_data)
+            return Response(data)
+        return Response(self.get_tree_data())
 
-    def get_from_cache(self):
-        cache_key = self.request.get_full_path()
-        return cache.get(cache_key)
+    def get_tree_data(self):
+        qs = list(self.filter_queryset(self.get_queryset()))
+        context = tree.get_tree_context(models.BaseTree.objects.all(), qs)
+        return self.serializer_class(qs, many=True, context=context).data
 
     def perform_update(self, serializer):
         instance = self.get_object()
@@ -55,6 +51,8 @@ class BaseTreeViewSet(viewsets.ModelViewSet):
             new_instance.get_family().update(org_id=new_org_id)
         if new_biz_id != old_biz_id:
             new_instance.get_family().update(biz_id=new_biz_id)
+        if new_org_id != old_org_id or new_biz_id != old_biz_id:
+            tree.invalidate_tree(models.BaseTree)
 
 
 class BaseTreeMoveView(viewsets.GenericViewSet):
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class BaseconfigConfig(AppConfig):
     name = 'baseconfig'
     verbose_name = '08.基础配置'
+
+    def ready(self):
+        import baseconfig.signal_handlers
@@ -1,6 +1,7 @@
 from rest_framework import serializers
 from django.conf import settings
 
+from utility import tree
 from utility.id_gen import gen_new_id
 from . import models
 
@@ -89,10 +90,10 @@ class BaseTreeSerializer(FlatBaseTreeSerializer):
         )
 
     def get_child_serializer_data(self, children):
-        return BaseTreeSerializer(children, many=True).data
+        return BaseTreeSerializer(children, many=True, context=tree.get_child_context(self.context)).data
 
     def get_items(self, obj):
-        children = obj.children.all()
+        children = tree.get_children(self.context, obj)
         childrens = self.get_child_serializer_data(children)
         result = []
         result.extend(childrens)
@@ -127,7 +128,7 @@ class BaseTreeMiniSerializer(BaseTreeSerializer):
         )
 
     def get_child_serializer_data(self, children):
-        return BaseTreeMiniSerializer(children, many=True).data
+        return BaseTreeMiniSerializer(children, many=True, context=tree.get_child_context(self.context)).data
 
 
 class BaseTreeMoveSerializer(serializers.Serializer):
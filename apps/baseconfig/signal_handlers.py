@@ -0,0 +1,13 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from mptt.signals import node_moved
+
+from utility import tree
+from .models import BaseTree
+
+
+@receiver(post_save, sender=BaseTree)
+@receiver(post_delete, sender=BaseTree)
+@receiver(node_moved, sender=BaseTree)
+def invalidate_base_tree(sender, **kwargs):
+    tree.invalidate_tree(BaseTree)
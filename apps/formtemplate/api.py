@@ -1,18 +1,20 @@
 import json
 import logging
+import itertools
 from typing import Type, Union
 from collections import namedtuple
 
 from django.core.exceptions import FieldDoesNotExist
 from django.db import models as django_models
+from django.db import transaction
 from django.db.models import Q, QuerySet
-from django.core.cache import cache
+from django.conf import settings
 from django_filters.rest_framework import DjangoFilterBackend
 
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.serializers import ModelSerializer, PrimaryKeyRelatedField, CharField, HyperlinkedRelatedField
 from rest_framework.utils.field_mapping import ClassLookupDict, get_field_kwargs, get_relation_kwargs
-from rest_framework.exceptions import ParseError
+from rest_framework.exceptions import ParseError, NotAuthenticated
 from rest_framework.utils import model_meta
 from rest_framework.viewsets import ModelViewSet, GenericViewSet, ReadOnlyModelViewSet
 from rest_framework.mixins import CreateModelMixin, UpdateModelMixin, RetrieveModelMixin
@@ -24,7 +26,9 @@ from rest_framework import serializers as rserial
 from django.shortcuts import get_object_or_404
 
 from usercenter.permissions import IsSuperuser
+from usercenter.pagination import KeysetPaginationMixin
 from utility.filter_fields import (CharInFilter, NumberInFilter)
+from utility.id_gen import gen_new_id
 from org.models import Org
 from service.models import Services
 from customer.models import Customer
@@ -33,12 +37,27 @@ from . import serializers
 from . import models
 from . import filters as self_filters
 from . import tasks
+from . import rollup
+from . import result_cache
+from .registry import template_registry
 
 logger = logging.getLogger('restapi')
 
+# 批量新增时每条 INSERT 语句写入的行数
+BULK_CREATE_BATCH_SIZE = getattr(settings, 'FORMTEMPLATE_BULK_CREATE_BATCH_SIZE', 1000)
+# 报表流式返回时每次从服务端游标读取的行数
+REPORT_STREAM_CHUNK_SIZE = getattr(settings, 'FORMTEMPLATE_REPORT_STREAM_CHUNK_SIZE', 2000)
+
+
 TemplateModelType = Union[Type[models.FormData], Type[Org], Type[Services], Type[Customer], Type[Goods]]
 
 
+def data_changed(template: models.FormTemplate, days=()):
+    """通用数据写入后调用：事务提交后刷新受影响日期的聚合预计算，并使模板相关的查询结果缓存失效"""
+    rollup.schedule_refresh(template, days)
+    result_cache.invalidate_template_data(template)
+
+
 class FormFieldsViewSet(ModelViewSet):
     """模版字段 formtemplate_formfields"""
     queryset = models.FormFields.objects.order_by('sort_num', 'pk')
@@ -158,6 +177,63 @@ def listfetchall(sql, *args):
         return headers, cursor.fetchall()
 
 
+def iterfetchchunks(sql, args=None, chunk_size=REPORT_STREAM_CHUNK_SIZE):
+    """使用服务端游标分批读取，第一次返回表头，之后每次返回一批行"""
+    from django.db import connection
+    with connection.chunked_cursor() as cursor:
+        if args:
+            cursor.execute(sql, tuple(args))
+        else:
+            cursor.execute(sql)
+        # 服务端游标 execute 只执行 DECLARE，第一次读取之后才有 description
+        rows = cursor.fetchmany(chunk_size)
+        yield [col[0] for col in cursor.description]  # type: ignore
+        while rows:
+            yield rows
+            rows = cursor.fetchmany(chunk_size)
+
+
+class ColumnarEncoder(object):
+    """
+    按列编码报表数据
+
+    每批数据编码为 `{"rows": 行数, "columns": [列1数组, 列2数组, ...], "dict": {"列下标": [新增字符串, ...]}}`，
+    字符串列的值为该列字典中的下标，字典在各批之间累加，每批只返回新增的字符串
+    """
+
+    def __init__(self, width):
+        self.width = width
+        # 各列的字典，None 为尚未确定，False 为非字符串列
+        self.dicts = [None] * width  # type: list
+
+    def encode(self, rows):
+        columns = [list(col) for col in zip(*rows)] if rows else [[] for _ in range(self.width)]
+        new_dict = {}
+        for i, col in enumerate(columns):
+            if self.dicts[i] is None:
+                first = next((v for v in col if v is not None), None)
+                if first is not None:
+                    self.dicts[i] = {} if isinstance(first, str) else False
+            if not isinstance(self.dicts[i], dict):
+                continue
+            col_dict = self.dicts[i]
+            added = []
+            encoded = []
+            for v in col:
+                if v is None:
+                    encoded.append(None)
+                    continue
+                index = col_dict.get(v)
+                if index is None:
+                    index = col_dict[v] = len(col_dict)
+                    added.append(v)
+                encoded.append(index)
+            columns[i] = encoded
+            if added:
+                new_dict[str(i)] = added
+        return {'rows': len(rows), 'columns': columns, 'dict': new_dict}
+
+
 class FormDataReportView(APIView):
     """报表结果查询"""
     model = models.FormDataReportConf
@@ -294,6 +370,45 @@ class FormDataReportView(APIView):
         logger.info(f"Report SQL {obj.report_id}: {sql}; WITH values {values}")
         return sql, values
 
+    def fetch_data(self, sql, values):
+        if values and values[0]:
+            return dictfetchall(sql, values)
+        return dictfetchall(sql)
+
+    def create_job(self, report, sql, values):
+        file_type = self.request.GET.get('file_type', 'json')
+        if file_type not in ('json', 'csv'):
+            raise ParseError(f'Bad file_type: {file_type}')
+        user = self.request.user
+        if not user.is_authenticated:
+            raise NotAuthenticated()
+        job = models.FormDataReportJob.objects.create(
+            sys_id=report.sys_id,
+            org_id=report.org_id,
+            report=report,
+            file_type=file_type,
+            sql=sql,
+            sql_values=json.dumps(values, ensure_ascii=False),
+            creator=user,
+        )
+        transaction.on_commit(lambda: tasks.run_report_job.delay(job.pk))
+        return Response(serializers.FormDataReportJobSerializer(job).data, status=202)
+
+    def fetch_cached(self, report, sql, values):
+        """
+        按报表配置的缓存时间缓存查询结果
+
+        缓存键由报表ID和生成的SQL及绑定参数组成，与请求参数的顺序及无关参数无关；
+        报表缓存标签（为空时为SQL中的数据表）对应的数据变更后缓存失效
+        """
+        if not report.cache_ttl:
+            return self.fetch_data(sql, values)
+        tags = report.cache_tag_list or result_cache.get_sql_tables(sql)
+        key = result_cache.make_key(
+            f'report:{report.report_id}', [self.__class__.__name__, sql, values], tags
+        )
+        return result_cache.get_or_compute(key, report.cache_ttl, lambda: self.fetch_data(sql, values))
+
     def get(self, request, *args, **kwargs):
         """
         报表结果查询
@@ -310,6 +425,10 @@ class FormDataReportView(APIView):
             "charts": charts_conf_obj
         }
         ```
+
+        传 `async=1` 时异步执行查询（需要登录），立即返回任务信息（状态码 202），结构同 `/api/v1/reportjob/<pk>/`；
+        `file_type` 为结果文件类型，可选 `json` (默认，结构同上), `csv`；
+        通过 `/api/v1/reportjob/<pk>/` 查询状态和进度，`status` 为 `success` 后从 `download` 下载 gzip 压缩的结果文件
         """
         obj = get_object_or_404(self.model, report_id=kwargs['report_id'])
         data_struct_conf = self.parse_json(obj.data_struct)
@@ -319,10 +438,9 @@ class FormDataReportView(APIView):
             sql, values = self.gen_sql(obj)
         except ValueError as e:
             return Response({'error': str(e)}, status=400)
-        if values and values[0]:
-            data = dictfetchall(sql, values)
-        else:
-            data = dictfetchall(sql)
+        if request.GET.get('async') in ('1', 'true'):
+            return self.create_job(obj, sql, values)
+        data = self.fetch_cached(obj, sql, values)
         result_dict['id'] = kwargs['report_id']
         result_dict['title'] = obj.report_name
         result_dict['data'] = data
@@ -359,6 +477,14 @@ class FormDataReportCompressionView(FormDataReportView):
             "charts": charts_conf_obj
         }
         ```
+
+        传 `columnar=true` 时 `data` 按列编码，字符串列为字典下标：
+        `{"rows": 2, "columns": [[1,2], [0,0]], "dict": {"1": ["aaa"]}}`
+
+        传 `stream=json` 或 `stream=ndjson` 时使用服务端游标分批读取并流式返回，不使用报表缓存：
+
+        * `stream=json` 返回结构同上，`data` 在最后；按列编码时 `data` 为每批数据编码结果的数组，字典在各批之间累加
+        * `stream=ndjson` 第一行为除 `data` 外的报表信息，之后每行一条数据；按列编码时每行为一批数据的编码结果
         """
         obj = get_object_or_404(self.model, report_id=kwargs['report_id'])
         data_struct_conf = self.parse_json(obj.data_struct)
@@ -368,13 +494,16 @@ class FormDataReportCompressionView(FormDataReportView):
             sql, values = self.gen_sql(obj)
         except ValueError as e:
             return Response({'error': str(e)}, status=400)
-        if values and values[0]:
-            hd, data = listfetchall(sql, values)
-        else:
-            hd, data = listfetchall(sql)
+        stream = request.GET.get('stream')
+        columnar = request.GET.get('columnar') in ('1', 'true')
+        if stream:
+            if stream not in ('json', 'ndjson'):
+                raise ParseError(f'Bad stream: {stream}')
+            return self.stream_response(obj, sql, values, stream, columnar, data_struct_conf, charts_struct_conf)
+        hd, data = self.fetch_cached(obj, sql, values)
         result_dict['id'] = kwargs['report_id']
         result_dict['title'] = obj.report_name
-        result_dict['data'] = data
+        result_dict['data'] = ColumnarEncoder(len(hd)).encode(data) if columnar else data
         header = data_struct_conf.get('header')
         if header is None and len(data) > 0:
             header = [{"key": x, "title": x, "type": 'str'} for x in hd]
@@ -382,11 +511,104 @@ class FormDataReportCompressionView(FormDataReportView):
         result_dict['charts'] = charts_struct_conf
         return Response(result_dict)
 
+    def stream_response(self, report, sql, values, stream, columnar, data_struct_conf, charts_struct_conf):
+        from django.http import StreamingHttpResponse
+        from rest_framework.utils.encoders import JSONEncoder
+
+        def dumps(obj):
+            return json.dumps(obj, cls=JSONEncoder, ensure_ascii=False, separators=(',', ':'))
+
+        chunks = iterfetchchunks(sql, values if values and values[0] else None)
+        hd = next(chunks)
+        first = next(chunks, None)
+        header = data_struct_conf.get('header')
+        if header is None and first:
+            header = [{"key": x, "title": x, "type": 'str'} for x in hd]
+        meta = {
+            'id': report.report_id,
+            'title': report.report_name,
+            'header': header,
+            'charts': charts_struct_conf,
+        }
+        encoder = ColumnarEncoder(len(hd)) if columnar else None
+
+        def iter_items():
+            if first is None:
+                return
+            for rows in itertools.chain([first], chunks):
+                if encoder is not None:
+                    yield [dumps(encoder.encode(rows))]
+                else:
+                    yield [dumps(row) for row in rows]
+
+        def iter_ndjson():
+            yield dumps(meta) + '\n'
+            for items in iter_items():
+                yield ''.join(f'{i}\n' for i in items)
+
+        def iter_json():
+            yield dumps(meta)[:-1] + ',"data":['
+            sep = ''
+            for items in iter_items():
+                yield sep + ','.join(items)
+                sep = ','
+            yield ']}'
+
+        if stream == 'ndjson':
+            return StreamingHttpResponse(iter_ndjson(), content_type='application/x-ndjson; charset=utf-8')
+        return StreamingHttpResponse(iter_json(), content_type='application/json; charset=utf-8')
+
+    def fetch_data(self, sql, values):
+        if values and values[0]:
+            return listfetchall(sql, values)
+        return listfetchall(sql)
+
     def post(self, request, *args, **kwargs):
         self.request._request.GET = self.request.data.copy()
         return self.get(self.request, *args, **kwargs)
 
 
+def get_report_job_queryset(user):
+    """当前用户可以查看的报表异步查询任务：自己创建的，超级管理员可以查看全部"""
+    queryset = models.FormDataReportJob.objects.select_related('report').order_by('-create_time')
+    if user.is_superuser:
+        return queryset
+    return queryset.filter(creator=user)
+
+
+class FormDataReportJobViewSet(ReadOnlyModelViewSet):
+    """报表异步查询任务 formtemplate_formdatareportjob"""
+    queryset = models.FormDataReportJob.objects.none()
+    serializer_class = serializers.FormDataReportJobSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    filter_backends = (DjangoFilterBackend,)
+    filterset_fields = ('sys_id', 'org_id', 'report', 'status',)
+
+    def get_queryset(self):
+        return get_report_job_queryset(self.request.user)
+
+
+class FormDataReportJobDownloadView(APIView):
+    """报表异步查询结果下载"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        """
+        报表异步查询结果下载
+
+        返回 gzip 压缩的结果文件，任务未完成时返回404
+        """
+        from django.http import FileResponse
+        from django.utils.encoding import escape_uri_path
+        job = get_object_or_404(get_report_job_queryset(request.user), pk=kwargs['pk'], status='success')
+        if not job.result:
+            return Response(status=404)
+        resp = FileResponse(job.result.open('rb'), content_type='application/gzip')
+        file_name = escape_uri_path(f'{job.report.report_name or job.report.report_id}.{job.file_type}.gz')
+        resp['Content-Disposition'] = f"attachment; filename*=UTF-8''{file_name}"
+        return resp
+
+
 class FormDataReportTestView(APIView):
     """测试报表结果查询"""
     model = models.FormDataReportConf
@@ -691,6 +913,52 @@ def get_update_serializer_class(model_class, template):
     return UpdateSerializer
 
 
+class DataBulkCreateListSerializer(rserial.ListSerializer):
+    """
+    通用数据批量新增
+
+    唯一字段按整批数据用一次 IN 查询检查，使用 bulk_create 在一个事务内分批写入
+    """
+
+    def validate(self, attrs):
+        template = self.child.template
+        model_class = self.child.Meta.model
+        for f in template.unique_fields:
+            seen = set()
+            values = set()
+            org_ids = set()
+            for item in attrs:
+                val = item.get(f.col_name)
+                org_id = item.get('org_id')
+                if val is None or org_id is None:
+                    continue
+                if (val, org_id) in seen:
+                    raise ValidationError(f'{f.col_title}: {val} 数据重复!')
+                seen.add((val, org_id))
+                values.add(val)
+                org_ids.add(org_id)
+            if not seen:
+                continue
+            exists = set(model_class.objects.filter(**{
+                f'{f.col_name}__in': values, 'org_id__in': org_ids,
+                'template_id': template.pk, 'sys_id': template.sys_id
+            }).values_list(f.col_name, 'org_id'))
+            for val, org_id in seen:
+                if (val, org_id) in exists:
+                    raise ValidationError(f'{f.col_title}: {val} 数据已存在!')
+        return attrs
+
+    def create(self, validated_data):
+        model_class = self.child.Meta.model
+        objs = [model_class(**self.child.prepare_create_data(attrs)) for attrs in validated_data]
+        for obj in objs:
+            if hasattr(obj, 'fill_src_id'):
+                obj.fill_src_id()
+        with transaction.atomic():
+            model_class.objects.bulk_create(objs, batch_size=BULK_CREATE_BATCH_SIZE)
+        return objs
+
+
 def get_create_serializer_class(model_class, template: models.FormTemplate):
     class SerializerClass(rserial.ModelSerializer):
         class Meta:
@@ -698,8 +966,12 @@ def get_create_serializer_class(model_class, template: models.FormTemplate):
             fields = [
                 'pk', 'sys_id', 'org_id'
             ]
+            list_serializer_class = DataBulkCreateListSerializer
 
         def validate(self, attrs):
+            if isinstance(self.parent, DataBulkCreateListSerializer):
+                # 批量新增时由 DataBulkCreateListSerializer 统一检查唯一字段
+                return attrs
             org_id = attrs.get('org_id')
             if org_id is None:
                 return attrs
@@ -715,14 +987,19 @@ def get_create_serializer_class(model_class, template: models.FormTemplate):
                     raise ValidationError(f'{f.col_title}: {val} 数据已存在!')
             return attrs
 
-        def create(self, validated_data):
+        @staticmethod
+        def prepare_create_data(validated_data):
+            """补全 src_id，预先生成主键，gps_sn 为空时使用主键，避免保存后再次更新"""
+            validated_data = dict(validated_data)
             if hasattr(model_class, 'src_id') and not validated_data.get('src_id'):
                 validated_data['src_id'] = int(validated_data.get('org_id', 0)) % 100
-            data = super().create(validated_data)
+            validated_data['id'] = gen_new_id(model_class._meta.pk._prefix)
             if hasattr(model_class, 'gps_sn') and not validated_data.get('gps_sn', None):
-                data.gps_sn = str(data.id)
-                data.save()
-            return data
+                validated_data['gps_sn'] = validated_data['id']
+            return validated_data
+
+        def create(self, validated_data):
+            return super().create(self.prepare_create_data(validated_data))
 
         def update(self, instance, validated_data):
             for attr, value in validated_data.items():
@@ -730,6 +1007,7 @@ def get_create_serializer_class(model_class, template: models.FormTemplate):
             instance.save()
             return instance
 
+    SerializerClass.template = template
     if hasattr(model_class, 'biz_id'):
         SerializerClass.Meta.fields.append("biz_id")
     if hasattr(model_class, 'src_id'):
@@ -793,9 +1071,10 @@ class DataBulkDeleteView(GenericViewSet):
         # initial template
         if self.template_id:
             try:
-                self.template = models.FormTemplate.get_by_id(self.template_id)
+                self.compiled = template_registry.get(self.template_id)
             except models.FormTemplate.DoesNotExist:
                 raise ParseError('Bad template_id')
+            self.template = self.compiled.template
             if self.template.need_login and (not request.user or not request.user.is_authenticated):
                 raise ParseError('403 Forbidden')
             self.initial_model()
@@ -805,8 +1084,8 @@ class DataBulkDeleteView(GenericViewSet):
             raise ParseError('Bad sys_id')
 
     def initial_model(self):
-        self.model = self.template.get_model()
-        self.queryset = self.model.objects.filter(template=self.template).order_by('-create_time')
+        self.model = self.compiled.model
+        self.queryset = self.compiled.get_model_queryset()
         if self.template.api_name == 'formdata':
             if self.request.method == 'GET':
                 src_id = self.request.GET.get('src_id')
@@ -820,7 +1099,7 @@ class DataBulkDeleteView(GenericViewSet):
                 self.queryset = self.queryset.filter(src_id=int(src_id) % 100)
 
     def initial_filter(self):
-        self.filterset_class, self.search_fields = get_filtersetclass_and_searchfields(self.model, self.template)
+        self.filterset_class, self.search_fields = self.compiled.model_filterset
 
     def create(self, request, *args, **kwargs):
         """
@@ -845,10 +1124,6 @@ class DataBulkDeleteView(GenericViewSet):
         }
         ```
         """
-        from service.models import Services
-        from org.models import Org
-        from customer.models import Customer
-        from goods.models import Goods
         serializer = self.get_serializer(data=request.data)  # type: serializers.DeleteDataSerializer
         pks = []
         serializer.is_valid(raise_exception=True)
@@ -862,20 +1137,16 @@ class DataBulkDeleteView(GenericViewSet):
             raise ParseError('Not allowed to delete all data')
         pks = list(qs.values_list('id', flat=True))
         self.delete_log(pks)
+        data_changed(self.template, rollup.get_queryset_days(self.template, qs))
         qs.delete()
-        rel_objs = models.FormFields.objects.filter(related_template_id=template_id, col_name='obj_id').values('template_id').distinct()
-        if rel_objs:
-            models.FormData.objects.filter(template_id__in=rel_objs, obj_id__in=pks).update(obj_id=None)
-            Services.objects.filter(template_id__in=rel_objs, obj_id__in=pks).update(obj_id=None)
-            Org.objects.filter(template_id__in=rel_objs, obj_id__in=pks).update(obj_id=None)
-            Customer.objects.filter(template_id__in=rel_objs, obj_id__in=pks).update(obj_id=None)
-            Goods.objects.filter(template_id__in=rel_objs, obj_id__in=pks).update(obj_id=None)
+        if pks:
+            transaction.on_commit(lambda: tasks.related_delete_batch.delay(template_id, pks))
         return Response({'deleted': pks})
 
     def delete_log(self, querys):
         if not querys:
             return
-        from system.models import SystemLog
+        from system import audit
         from utility.client_ip import get_client_ip
         data = querys
         if self.request.user.is_anonymous:
@@ -886,7 +1157,7 @@ class DataBulkDeleteView(GenericViewSet):
             user = self.request.user
             user_name = self.request.user.username
             org_id = self.request.user.org_id
-        log = SystemLog.objects.create(
+        audit.log(
             sys_id=self.template.sys_id,
             org_id=org_id,
             log_level=0,
@@ -896,7 +1167,6 @@ class DataBulkDeleteView(GenericViewSet):
             user_name=user_name,
             content='DELETE:' + str(data),
         )
-        print('log', log)
 
 
 class DataBulkUpdateView(GenericViewSet):
@@ -916,21 +1186,22 @@ class DataBulkUpdateView(GenericViewSet):
         # initial template
         if self.template_id:
             try:
-                self.template = models.FormTemplate.get_by_id(self.template_id)
+                self.compiled = template_registry.get(self.template_id)
             except models.FormTemplate.DoesNotExist:
                 raise ParseError('Bad template_id')
+            self.template = self.compiled.template
             self.initial_model()
             self.initial_filter()
-            self.serializer_class = get_update_serializer_class(self.model, self.template)
+            self.serializer_class = self.compiled.update_serializer_class
         else:
             raise ParseError('DataBulkDeleteView Bad template_id')
 
     def initial_filter(self):
-        self.filterset_class, self.search_fields = get_filtersetclass_and_searchfields(self.model, self.template)
+        self.filterset_class, self.search_fields = self.compiled.model_filterset
 
     def initial_model(self):
-        self.model = self.template.get_model()
-        self.queryset = self.model.objects.filter(template=self.template).order_by('-create_time')
+        self.model = self.compiled.model
+        self.queryset = self.compiled.get_model_queryset()
         if self.template.api_name == 'formdata':
             if self.request.method == 'GET':
                 src_id = self.request.GET.get('src_id')
@@ -984,6 +1255,7 @@ class DataBulkUpdateView(GenericViewSet):
         update.pop('src_id', None)
         update.pop('sys_id', None)
         update.pop('pk', None)
+        data_changed(self.template, rollup.get_queryset_days(self.template, qs))
         count = qs.update(**update)
         self.update_log(querys)
         return Response({'updated': count})
@@ -991,7 +1263,7 @@ class DataBulkUpdateView(GenericViewSet):
     def update_log(self, querys):
         if not querys:
             return
-        from system.models import SystemLog
+        from system import audit
         from utility.client_ip import get_client_ip
         data = querys
         if self.request.user.is_anonymous:
@@ -1002,7 +1274,7 @@ class DataBulkUpdateView(GenericViewSet):
             user = self.request.user
             user_name = self.request.user.username
             org_id = self.request.user.org_id
-        log = SystemLog.objects.create(
+        audit.log(
             sys_id=self.template.sys_id,
             org_id=org_id,
             log_level=0,
@@ -1012,10 +1284,9 @@ class DataBulkUpdateView(GenericViewSet):
             user_name=user_name,
             content='UPDATE :' + str(data),
         )
-        print('log', log)
 
 
-class DataViewSet(ModelViewSet):
+class DataViewSet(KeysetPaginationMixin, ModelViewSet):
     """通用数据CURD接口, 必须具有 template_id (formtemplate_formtemplate.id)"""
     queryset = models.FormTemplate.objects.none()
     permission_classes = [permissions.AllowAny]
@@ -1061,7 +1332,7 @@ class DataViewSet(ModelViewSet):
             raise ParseError('Data is empty!')
         if str(sys_id) != str(self.template.sys_id):
             raise ParseError('sys_id error!')
-        serializer_class = get_create_serializer_class(self.template.get_model(), self.template)
+        serializer_class = self.compiled.create_serializer_class
         if isinstance(request.data, list):
             serializer = serializer_class(data=request.data, many=True)
         else:
@@ -1074,18 +1345,11 @@ class DataViewSet(ModelViewSet):
     def perform_create(self, serializer):
         data = serializer.save()
         if isinstance(data, list):
-            for i in data:
-                self.fetl_post_data(self.template_id, i.pk)
+            data_changed(self.template, rollup.get_instance_days(self.template, data))
+            self.fetl_post_data_batch(self.template_id, [i.pk for i in data])
             return
-        data.save()
+        data_changed(self.template, rollup.get_instance_days(self.template, [data]))
         self.fetl_post_data(self.template_id, data.pk)
-        # model_id_prefix = get_model_id_prefix(self.model)
-        # if hasattr(serializer, 'many') and serializer.many is True:
-        #     for index, attrs in enumerate(serializer.validated_data):
-        #         attrs['id'] = gen_new_id(model_id_prefix, index)
-        #         serializer.child.create(attrs)
-        # else:
-        #     super().perform_create(serializer)
 
     def update(self, request, *args, **kwargs):
         """
@@ -1098,9 +1362,11 @@ class DataViewSet(ModelViewSet):
             raise ParseError('sys_id error!')
         return super().update(request, *args, **kwargs)
 
-    def get_from_cache(self):
-        cache_key = self.request.get_full_path()
-        return cache.get(cache_key)
+    def get_cache_key(self):
+        """use_cache 的缓存键，由查询参数组成；本模板或关联模板的数据变更后失效"""
+        params = sorted((k, self.request.GET.getlist(k)) for k in self.request.GET.keys())
+        tags = [str(self.template.pk), *self.compiled.dependency_ids]
+        return result_cache.make_key(f'data:{self.template.pk}', [self.request.path, params], tags)
 
     def list(self, request, *args, **kwargs):
         """
@@ -1125,6 +1391,11 @@ class DataViewSet(ModelViewSet):
         `float_01_range_min=1&float_01_range_max=20`
         即为查询 "float_01" 在 `1 至 20`范围内的数据
 
+        游标分页：
+        传 `cursor=` (空值) 获取第一页，之后传返回值中的 `next` 获取下一页，`next` 为 null 时没有更多数据；
+        按 `create_time`, `id` (或 `o` 指定的排序字段) 定位，翻页深度不影响查询速度；
+        传 `with_count=false` 时不统计总数，返回的 `count` 为 null
+
         按照部门查询：
         `department_in=由逗号分隔的部门ID字符串`
         一般用于区分数据权限，使用myinfo接口获取的当前用户的department_child_ids进行查询。
@@ -1133,42 +1404,36 @@ class DataViewSet(ModelViewSet):
         查询返回值结构由模板配置决定；
         如果是物表数据，可传 include_gps=true 来返回包含定位点信息的数据，"gps_point"： Point(定位信息结构数据)
         """
-        cache_key = self.request.get_full_path()
+        if str(request.GET.get('sys_id')) != str(self.template.sys_id):
+            raise ParseError('sys_id error!')
         if request.query_params.get('use_cache'):
-            data = self.get_from_cache()
-            if data:
-                return Response(data)
-        from gps.utils import get_point_data
-        sys_id = request.GET.get('sys_id')
+            return Response(result_cache.get_or_compute(
+                self.get_cache_key(), result_cache.DATA_CACHE_TTL, self.get_list_data
+            ))
+        return Response(self.get_list_data())
+
+    def get_list_data(self):
+        from gps.utils import get_point_data_list
+        sys_id = self.request.GET.get('sys_id')
         template = self.template
-        if str(sys_id) != str(self.template.sys_id):
-            raise ParseError('sys_id error!')
         queryset = self.filter_queryset(self.get_queryset())  # type: models.models.QuerySet
         # logger.debug(f"data queryset is: {queryset.query}")
-        include_gps = request.GET.get('include_gps')
+        include_gps = self.request.GET.get('include_gps')
         page = self.paginate_queryset(queryset)
         if page is not None:
             serializer = self.get_serializer(page, many=True)
             data = serializer.data
             if include_gps and (template.api_name in ['goods', 'customer', 'org']):
-                data = [{'gps_point': get_point_data(i['gps_sn'], sys_id), **i} for i in data]
-            resp = self.get_paginated_response(data)
-            if request.query_params.get('use_cache'):
-                cache.set(cache_key, resp.data, 1 * 60 * 60)
-            return resp
+                points = get_point_data_list([i['gps_sn'] for i in data], sys_id)
+                data = [{'gps_point': point, **i} for point, i in zip(points, data)]
+            return self.get_paginated_response(data).data
 
         serializer = self.get_serializer(queryset, many=True)
         data = serializer.data
         if include_gps and (template.api_name in ['goods', 'customer', 'org']):
-            ll = []
-            for i in data:
-                ll.append({'gps_point': get_point_data(i['gps_sn'], sys_id), **i})
-            if request.query_params.get('use_cache'):
-                cache.set(cache_key, ll, 1 * 60 * 60)
-            return Response(ll)
-        if request.query_params.get('use_cache'):
-            cache.set(cache_key, data, 1 * 60 * 60)
-        return Response(data)
+            points = get_point_data_list([i['gps_sn'] for i in data], sys_id)
+            return [{'gps_point': point, **i} for point, i in zip(points, data)]
+        return data
 
     def destroy(self, request, *args, **kwargs):
         """
@@ -1183,10 +1448,11 @@ class DataViewSet(ModelViewSet):
         sys_id = request.GET.get('sys_id')
         if str(sys_id) != str(self.template.sys_id):
             raise ParseError('sys_id error!')
-        self.model = self.template.get_model()
-        self.queryset = self.model.objects.filter(template=self.template).order_by('-create_time')
+        self.model = self.compiled.model
+        self.queryset = self.compiled.get_model_queryset()
         obj = self.queryset.filter(pk=self.kwargs['pk'])
         self.delete_log(obj)
+        data_changed(self.template, rollup.get_queryset_days(self.template, obj))
         obj.delete()
         tasks.related_delete.delay(self.template_id, self.kwargs['pk'])
         return Response(status=204)
@@ -1201,12 +1467,14 @@ class DataViewSet(ModelViewSet):
 
     def perform_update(self, serializer):
         try:
-            before_data = self.get_serializer(instance=self.get_object()).data
+            before_data = self.get_serializer(instance=serializer.instance).data
             after_data = dict(serializer.validated_data)
             self.update_log(before_data, after_data)
         except:
             pass
+        days = rollup.get_instance_days(self.template, [serializer.instance])
         data = serializer.save()
+        data_changed(self.template, days + rollup.get_instance_days(self.template, [data]))
         self.fetl_post_data(self.template_id, data.pk)
 
     def partial_update(self, request, *args, **kwargs):
@@ -1236,9 +1504,10 @@ class DataViewSet(ModelViewSet):
         # initial template
         if self.template_id:
             try:
-                self.template = models.FormTemplate.get_by_id(self.template_id)
+                self.compiled = template_registry.get(self.template_id)
             except models.FormTemplate.DoesNotExist:
                 raise ParseError('Bad template_id')
+            self.template = self.compiled.template
         else:
             raise ParseError('Bad template_id')
         if self.template.need_login and (not request.user or not request.user.is_authenticated):
@@ -1248,35 +1517,21 @@ class DataViewSet(ModelViewSet):
         self.initial_filter()
 
     def initial_model(self):
-        if self.template.has_rel_template:
-            self.model = self.template.get_related_model()
-            annotate_dict = self.template.get_annotate_dict()
-            self.queryset = self.model.objects.filter(template=self.template).annotate(
-                **annotate_dict
-            ).order_by('-create_time')
-        else:
-            self.model = self.template.get_model()
-            self.queryset = self.model.objects.filter(template=self.template).order_by('-create_time')
+        self.model = self.compiled.proxy_model
+        self.queryset = self.compiled.get_queryset()
 
     def initial_serializer_class(self):
-        # serializer_pickle = cache.get(str(self.template_id))
-        # if serializer_pickle:
-        #     serializer_class = pickle.loads(serializer_pickle)
-        # else:
-        #     serializer_class = get_serializer_class(self.model, self.template)
-        #     cache.set(str(self.template_id), pickle.dumps(serializer_class), 30)
-        # self.serializer_class = serializer_class
-        self.serializer_class = get_serializer_class(self.model, self.template)
+        self.serializer_class = self.compiled.serializer_class
 
     def initial_filter(self):
-        self.filterset_class, self.search_fields = get_filtersetclass_and_searchfields(self.model, self.template)
+        self.filterset_class, self.search_fields = self.compiled.filterset
 
     def delete_log(self, obj):
         if not obj:
             return
         if isinstance(obj, QuerySet):
             obj = obj.first()
-        from system.models import SystemLog
+        from system import audit
         from utility.client_ip import get_client_ip
         serializer = self.get_serializer(obj)
         data = serializer.data
@@ -1288,7 +1543,7 @@ class DataViewSet(ModelViewSet):
             user = self.request.user
             user_name = self.request.user.username
             org_id = self.request.user.org_id
-        log = SystemLog.objects.create(
+        audit.log(
             sys_id=self.template.sys_id,
             org_id=org_id,
             log_level=0,
@@ -1298,10 +1553,9 @@ class DataViewSet(ModelViewSet):
             user_name=user_name,
             content='DELETE:' + str(data),
         )
-        print('log', log)
 
     def update_log(self, before, after):
-        from system.models import SystemLog
+        from system import audit
         from utility.client_ip import get_client_ip
         pk = before.get('pk')
         data = f'{before} TO {after}'
@@ -1313,7 +1567,7 @@ class DataViewSet(ModelViewSet):
             user = self.request.user
             user_name = self.request.user.username
             org_id = self.request.user.org_id
-        SystemLog.objects.create(
+        audit.log(
             sys_id=self.template.sys_id,
             org_id=org_id,
             log_level=0,
@@ -1336,27 +1590,36 @@ class DataViewSet(ModelViewSet):
         except Exception as e:
             logger.error(f'fetl_post_data error: {e}', exc_info=e)
 
+    @staticmethod
+    def fetl_post_data_batch(template_id, data_ids):
+        if not data_ids:
+            return
+        try:
+            tasks.fetl_push_data_batch.delay(template_id, data_ids)
+        except Exception as e:
+            logger.error(f'fetl_post_data_batch error: {e}', exc_info=e)
+
 
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
 def data_delete_one(request):
-    from system.models import SystemLog
+    from system import audit
     from utility.client_ip import get_client_ip
-    from .models import FormTemplate
     template_id = request.data.get('template_id')
     pk = request.data.get('pk')
     user = request.user
     if not template_id or not pk:
         raise ParseError('template_id and pk are required')
-    template = FormTemplate.objects.get(id=template_id)
-    model = template.get_model()
+    compiled = template_registry.get(template_id)
+    template = compiled.template
+    model = compiled.model
     obj = model.objects.get(pk=pk)
-    serializer_class = get_serializer_class(model, template)
+    serializer_class = compiled.model_serializer_class
     serializer = serializer_class(obj)
     data = serializer.data
     user_name = get_client_ip(request)
     org_id = obj.org_id or template.org_id
-    SystemLog.objects.create(
+    audit.log(
         sys_id=template.sys_id,
         org_id=org_id,
         log_level=0,
@@ -1366,6 +1629,7 @@ def data_delete_one(request):
         user_name=user_name,
         content=f'DELETE {template_id}: {pk}: {data}',
     )
+    data_changed(template, rollup.get_instance_days(template, [obj]))
     obj.delete()
     return Response(status=204)
 
@@ -1397,7 +1661,7 @@ class DataFindViewSet(DataViewSet):
         return super().list(request, *args, **kwargs)
 
 
-class DataFieldViewSet(ReadOnlyModelViewSet):
+class DataFieldViewSet(KeysetPaginationMixin, ReadOnlyModelViewSet):
     """通用数据部分字段查询接口, 必须具有 template_id (formtemplate_formtemplate.id)"""
     queryset = models.FormTemplate.objects.none()
     permission_classes = [permissions.AllowAny]
@@ -1420,8 +1684,10 @@ class DataFieldViewSet(ReadOnlyModelViewSet):
 
         接口默认去除空值，任意查询字段为空的均不显示，如无需去除，则需要传入 `nullable=true`
 
+        传 `cursor=` 时使用游标分页，用法同通用数据接口
+
         """
-        from gps.utils import get_point_data
+        from gps.utils import get_point_data_list
         sys_id = request.GET.get('sys_id')
         template = self.template
         if str(sys_id) != str(template.sys_id):
@@ -1450,6 +1716,9 @@ class DataFieldViewSet(ReadOnlyModelViewSet):
         distinct = request.GET.get('distinct')
         if not distinct == 'false':
             queryset = queryset.distinct()
+            # 去重后只能按查询字段排序，游标分页以全部查询字段作为唯一键
+            self.keyset_default_ordering = self.field_names
+            self.keyset_unique_fields = self.field_names
         ordering = request.GET.get('ordering')
         if ordering:
             queryset = queryset.order_by(*ordering.split(','))
@@ -1457,18 +1726,15 @@ class DataFieldViewSet(ReadOnlyModelViewSet):
         data = []
         page = self.paginate_queryset(queryset)
 
+        rows = page if page is not None else queryset
+        if has_gps:
+            rows = list(rows)
+            points = get_point_data_list([i['gps_sn'] for i in rows], sys_id)
+            data = [{'gps_point': point, **dict(i)} for point, i in zip(points, rows)]
+        else:
+            data = [dict(i) for i in rows]
         if page is not None:
-            for i in page:
-                if has_gps:
-                    data.append({'gps_point': get_point_data(i['gps_sn'], sys_id), **dict(i)})
-                else:
-                    data.append(dict(i))
             return self.get_paginated_response(data)
-        for i in queryset:
-            if has_gps:
-                data.append({'gps_point': get_point_data(i['gps_sn'], sys_id), **dict(i)})
-            else:
-                data.append(dict(i))
         return Response(data)
 
     def retrieve(self, request, *args, **kwargs):
@@ -1513,9 +1779,10 @@ class DataFieldViewSet(ReadOnlyModelViewSet):
         # initial template
         if self.template_id:
             try:
-                self.template = models.FormTemplate.get_by_id(self.template_id)
+                self.compiled = template_registry.get(self.template_id)
             except models.FormTemplate.DoesNotExist:
                 raise ParseError('Bad template_id')
+            self.template = self.compiled.template
         else:
             raise ParseError('Bad template_id')
         if self.template.need_login and (not request.user or not request.user.is_authenticated):
@@ -1542,32 +1809,44 @@ class DataFieldViewSet(ReadOnlyModelViewSet):
         self.initial_filter()
 
     def initial_model(self):
-        if self.template.has_rel_template:
-            self.model = self.template.get_related_model()
-            annotate_dict = self.template.get_annotate_dict()
-            self.queryset = self.model.objects.filter(template=self.template).annotate(
-                **annotate_dict
-            ).order_by('-create_time')
-        else:
-            self.model = self.template.get_model()
-            self.queryset = self.model.objects.filter(template=self.template).order_by('-create_time')
+        self.model = self.compiled.proxy_model
+        self.queryset = self.compiled.get_queryset()
 
     def initial_filter(self):
-        self.filterset_class, self.search_fields = get_filtersetclass_and_searchfields(self.model, self.template)
+        self.filterset_class, self.search_fields = self.compiled.filterset
 
 
 class DataAggregateViewSet(DataViewSet):
     http_method_names = ['get', 'post']
 
     def list(self, request, *args, **kwargs):
+        """
+        通用数据接口：聚合
+
+        必须在get的query中传: `sys_id`, `template_id`
+
+        按模板配置的聚合字段返回聚合结果，查询参数与通用数据查询接口相同；
+        另可传 `day_after`, `day_before` (YYYY-MM-DD，包含当天) 按数据创建日期过滤
+
+        模板启用聚合预计算且过滤条件只有 `org_id`, `src_id`, `department_in`, 部门字段, `day_after`, `day_before` 时，
+        使用预计算结果返回（数据变更后异步更新，可能有短暂延迟）
+        """
         from django.db.models import Count, Max, Min, Avg, Sum
         sys_id = request.GET.get('sys_id')
         if str(sys_id) != str(self.template.sys_id):
             raise ParseError('sys_id error!')
-        queryset = self.filter_queryset(self.get_queryset())  # type: models.models.QuerySet
-        aggregate_fields = self.template.aggregate_fields.all()
+        aggregate_fields = self.compiled.aggregate_fields
         if not aggregate_fields:
             return Response({})
+        try:
+            day_after, day_before = rollup.parse_day_range(request.GET)
+        except ValueError as e:
+            raise ParseError(str(e))
+        rollup_queryset = rollup.get_rollup_queryset(self.compiled, request.GET)
+        if rollup_queryset is not None:
+            return Response(rollup.aggregate_from_rollup(rollup_queryset, aggregate_fields, self.compiled.model))
+        queryset = self.filter_queryset(self.get_queryset())  # type: models.models.QuerySet
+        queryset = rollup.filter_day_range(queryset, day_after, day_before)
         data = {}
         aggregate_params = {}
         for field in aggregate_fields:  # type: models.FormAggrgateFields
@@ -1595,3 +1874,66 @@ class DataAggregateViewSet(DataViewSet):
     def create(self, request, *args, **kwargs):
         self.request._request.GET = self.request.data.copy()
         return self.list(self.request, *args, **kwargs)
+
+
+class DataExportView(APIView):
+    """通用数据流式导出"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        """
+        通用数据接口：导出
+
+        必须在get的query中传: `sys_id`, `template_id`
+
+        `file_type` 为导出文件类型，可选 `csv` (默认), `xlsx`
+
+        `header` 为表头类型，可选 `title` (默认，字段含义), `alias` (字段别名)
+
+        `exclude` 为不导出的字段别名，多个用逗号隔开
+
+        其他查询参数与通用数据查询接口相同，数据使用服务端游标分批读取并流式返回
+        """
+        from django.http import StreamingHttpResponse, FileResponse
+        from django.utils.encoding import escape_uri_path
+        from .utils import get_template_export_columns, iter_template_data_csv, write_template_data_xlsx
+        template_id = request.GET.get('template_id')
+        if not template_id:
+            raise ParseError('Bad template_id')
+        try:
+            compiled = template_registry.get(template_id)
+        except models.FormTemplate.DoesNotExist:
+            raise ParseError('Bad template_id')
+        template = compiled.template
+        if str(request.GET.get('sys_id')) != str(template.sys_id):
+            raise ParseError('sys_id error!')
+        filterset_class, _ = compiled.filterset
+        filterset = filterset_class(request.GET, queryset=compiled.get_queryset(), request=request)
+        if not filterset.is_valid():
+            raise ValidationError(filterset.errors)
+        queryset = filterset.qs
+        exclude = request.GET.get('exclude')
+        columns = get_template_export_columns(template, exclude.split(',') if exclude else None)
+        header = request.GET.get('header', 'title')
+        file_type = request.GET.get('file_type', 'csv')
+        if file_type == 'xlsx':
+            import tempfile
+            try:
+                import openpyxl  # noqa
+            except ImportError:
+                raise ParseError('xlsx export requires openpyxl')
+            tmp = tempfile.TemporaryFile()
+            write_template_data_xlsx(tmp, queryset, columns, header=header, title=template.title)
+            tmp.seek(0)
+            resp = FileResponse(
+                tmp, content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+            )
+        elif file_type == 'csv':
+            resp = StreamingHttpResponse(
+                iter_template_data_csv(queryset, columns, header=header), content_type='text/csv; charset=utf-8'
+            )
+        else:
+            raise ParseError(f'Bad file_type: {file_type}')
+        file_name = escape_uri_path(f'{template.title}.{file_type}')
+        resp['Content-Disposition'] = f"attachment; filename*=UTF-8''{file_name}"
+        return resp
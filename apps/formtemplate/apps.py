@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class FormtemplateConfig(AppConfig):
     name = 'formtemplate'
     verbose_name = '表单模板和数据'
+
+    def ready(self):
+        import formtemplate.signal_handlers
@@ -0,0 +1,49 @@
+"""
+模板变更广播。
+
+模板或模板字段变更时在 Redis 中递增该模板的版本号和全局版本号，
+各进程（gunicorn worker、celery worker）通过轮询全局版本号发现变更，
+再按模板批量比对版本号，使本进程内对应的编译结果失效。
+"""
+
+import logging
+from typing import Dict, Iterable, Optional
+
+from django_redis import get_redis_connection
+
+logger = logging.getLogger('restapi')
+
+# 全局版本号，任意模板变更都会递增
+BUS_VERSION_KEY = 'formtemplate:bus-version'
+# 各模板版本号 hash，field 为模板ID
+TEMPLATE_VERSIONS_KEY = 'formtemplate:versions'
+
+
+def get_connection():
+    return get_redis_connection('default')
+
+
+def publish_template_change(template_id: str):
+    """递增模板版本号和全局版本号"""
+    conn = get_connection()
+    pipe = conn.pipeline()
+    pipe.hincrby(TEMPLATE_VERSIONS_KEY, str(template_id), 1)
+    pipe.incr(BUS_VERSION_KEY)
+    pipe.execute()
+
+
+def get_bus_version() -> Optional[int]:
+    val = get_connection().get(BUS_VERSION_KEY)
+    return int(val) if val is not None else None
+
+
+def get_template_versions(template_ids: Iterable[str]) -> Dict[str, int]:
+    """批量获取模板版本号，从未变更过的模板版本号为 0"""
+    template_ids = list(template_ids)
+    if not template_ids:
+        return {}
+    values = get_connection().hmget(TEMPLATE_VERSIONS_KEY, template_ids)
+    return {
+        template_id: int(val) if val is not None else 0
+        for template_id, val in zip(template_ids, values)
+    }
@@ -0,0 +1,98 @@
+"""
+通用数据删除后的关联清理。
+
+模板之间通过 `FormFields.related_template`（col_name 为 obj_id 的关联字段）建立引用关系，
+删除某模板的数据后，按引用关系找到引用该模板的模板，按其数据表分组，
+每张数据表每批数据ID只执行一条限定了模板ID的 UPDATE，把 obj_id 置空；
+再批量删除这些数据上传的文件。
+"""
+
+import logging
+from collections import defaultdict
+from typing import Dict, Iterable, List, Set
+
+from django.conf import settings
+
+from . import models
+from . import result_cache
+
+logger = logging.getLogger('restapi')
+
+# 每条 UPDATE / DELETE 语句处理的数据ID数量
+CASCADE_BATCH_SIZE = getattr(settings, 'FORMTEMPLATE_CASCADE_BATCH_SIZE', 1000)
+
+
+def iter_batches(ids: Iterable[str], size: int = CASCADE_BATCH_SIZE):
+    ids = list(ids)
+    for i in range(0, len(ids), size):
+        yield ids[i:i + size]
+
+
+def get_referencing_templates(template_id: str) -> Dict[type, List[str]]:
+    """引用了该模板的模板ID，按模板对应的数据 Model 分组"""
+    result = defaultdict(set)  # type: Dict[type, Set[str]]
+    templates = models.FormTemplate.objects.filter(
+        pk__in=models.FormFields.objects.filter(
+            related_template_id=template_id, col_name='obj_id'
+        ).values('template_id')
+    )
+    for template in templates.only('pk', 'api_name'):
+        try:
+            result[template.get_model()].add(str(template.pk))
+        except ValueError as e:
+            logger.warning(f'cascade skip template {template.pk}: {e}')
+    return {model: sorted(ids) for model, ids in result.items()}
+
+
+def clear_references(template_id: str, obj_ids: Iterable[str]) -> int:
+    """把引用了已删除数据的 obj_id 置空，返回更新的行数"""
+    obj_ids = list(obj_ids)
+    referencing = get_referencing_templates(template_id)
+    if not obj_ids or not referencing:
+        return 0
+    count = 0
+    tags = []
+    for model, template_ids in referencing.items():
+        for batch in iter_batches(obj_ids):
+            count += model.objects.filter(template_id__in=template_ids, obj_id__in=batch).update(obj_id=None)
+        tags.extend(template_ids)
+        tags.append(model._meta.db_table)
+    result_cache.invalidate_tags(tags)
+    return count
+
+
+def delete_files(template_id: str, obj_ids: Iterable[str]) -> int:
+    """删除已删除数据上传的文件，返回删除的文件数量"""
+    from baseconfig.models import BaseConfigFileUpload
+    count = 0
+    for batch in iter_batches(obj_ids):
+        queryset = BaseConfigFileUpload.objects.filter(template_id=template_id, obj_id__in=batch)
+        # 关联了 Dify 文档的文件需要通过 Model.delete 同时删除文档
+        for upload in queryset.filter(dify_document_id__isnull=False):
+            try:
+                upload.file.delete(save=False)
+                upload.delete()
+                count += 1
+            except Exception as e:
+                logger.error(f'delete file {upload.file} error: {e}', exc_info=True)
+        queryset = queryset.filter(dify_document_id__isnull=True)
+        storage = BaseConfigFileUpload._meta.get_field('file').storage
+        deleted = []
+        for pk, name in queryset.values_list('pk', 'file'):
+            try:
+                if name:
+                    storage.delete(name)
+                deleted.append(pk)
+            except Exception as e:
+                logger.error(f'delete file {name} error: {e}', exc_info=True)
+        if deleted:
+            count += BaseConfigFileUpload.objects.filter(pk__in=deleted).delete()[0]
+    return count
+
+
+def related_delete(template_id: str, obj_ids: Iterable[str]):
+    """删除模板数据后的关联清理"""
+    obj_ids = [str(i) for i in obj_ids]
+    updated = clear_references(template_id, obj_ids)
+    deleted = delete_files(template_id, obj_ids)
+    logger.info(f'related delete {template_id}: {len(obj_ids)} objs, {updated} references, {deleted} files')
@@ -0,0 +1,16 @@
+import os
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('formtemplate', '0021_alter_formdatareportconf_creator'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'update_formdata_002.sql'), 'r', encoding='UTF8').read(),
+            reverse_sql='DROP INDEX IF EXISTS formtemplate_formdata_tpl_ctime_id;'
+        ),
+    ]
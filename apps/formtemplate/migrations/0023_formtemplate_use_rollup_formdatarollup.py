@@ -0,0 +1,45 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('formtemplate', '0022_formdata_keyset_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='formtemplate',
+            name='use_rollup',
+            field=models.BooleanField(default=False, help_text='启用后聚合接口优先使用预计算结果', verbose_name='启用聚合预计算'),
+        ),
+        migrations.AddField(
+            model_name='formtemplate',
+            name='rollup_time',
+            field=models.DateTimeField(blank=True, editable=False, help_text='预计算完成时间，为空时聚合接口实时计算', null=True, verbose_name='聚合预计算时间'),
+        ),
+        migrations.CreateModel(
+            name='FormDataRollup',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('sys_id', models.IntegerField(blank=True, null=True, verbose_name='系统ID')),
+                ('org_id', models.IntegerField(blank=True, null=True, verbose_name='组织ID')),
+                ('src_id', models.IntegerField(blank=True, null=True, verbose_name='分区ID')),
+                ('department_id', models.CharField(blank=True, max_length=32, null=True, verbose_name='部门ID')),
+                ('day', models.DateField(help_text='数据创建日期', verbose_name='日期')),
+                ('col_name', models.CharField(max_length=128, verbose_name='字段列名')),
+                ('value', models.TextField(blank=True, help_text='去重计数字段的值', null=True, verbose_name='字段值')),
+                ('value_count', models.BigIntegerField(default=0, verbose_name='非空数量')),
+                ('value_sum', models.DecimalField(blank=True, decimal_places=4, max_digits=32, null=True, verbose_name='求和')),
+                ('value_min', models.DecimalField(blank=True, decimal_places=4, max_digits=32, null=True, verbose_name='最小值')),
+                ('value_max', models.DecimalField(blank=True, decimal_places=4, max_digits=32, null=True, verbose_name='最大值')),
+                ('template', models.ForeignKey(db_constraint=False, help_text='模板ID', on_delete=django.db.models.deletion.CASCADE, related_name='+', to='formtemplate.formtemplate')),
+            ],
+            options={
+                'verbose_name': '06.表单数据聚合预计算',
+                'verbose_name_plural': '06.表单数据聚合预计算',
+                'indexes': [models.Index(fields=['template', 'day'], name='formtemplate_rollup_tpl_day')],
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('formtemplate', '0023_formtemplate_use_rollup_formdatarollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='formdatareportconf',
+            name='cache_ttl',
+            field=models.PositiveIntegerField(default=0, help_text='查询结果缓存时间(秒)，0为不缓存', verbose_name='缓存时间'),
+        ),
+        migrations.AddField(
+            model_name='formdatareportconf',
+            name='cache_tags',
+            field=models.CharField(blank=True, help_text='逗号分隔的模板ID或数据表名，这些模板或数据表的数据变更时缓存失效；为空时使用SQL中的数据表', max_length=1023, null=True, verbose_name='缓存失效标签'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import utility.db_fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('formtemplate', '0024_formdatareportconf_cache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='formdatareportconf',
+            name='job_concurrency',
+            field=models.PositiveIntegerField(default=0, help_text='同时执行的异步查询数量，0为使用系统默认值', verbose_name='异步查询并发数'),
+        ),
+        migrations.AddField(
+            model_name='formdatareportconf',
+            name='job_timeout',
+            field=models.PositiveIntegerField(default=0, help_text='异步查询SQL超时时间(秒)，0为使用系统默认值', verbose_name='异步查询超时'),
+        ),
+        migrations.CreateModel(
+            name='FormDataReportJob',
+            fields=[
+                ('id', utility.db_fields.TableNamePKField('RJ', editable=False, serialize=False)),
+                ('sys_id', models.IntegerField(db_index=True, default=1, verbose_name='系统ID')),
+                ('org_id', models.IntegerField(db_index=True, default=1, verbose_name='组织ID')),
+                ('file_type', models.CharField(choices=[('json', 'JSON'), ('csv', 'CSV')], default='json', help_text='结果文件类型', max_length=16, verbose_name='结果文件类型')),
+                ('sql', models.TextField(verbose_name='查询SQL')),
+                ('sql_values', models.TextField(blank=True, help_text='查询参数(JSON)', null=True, verbose_name='查询参数')),
+                ('status', models.CharField(choices=[('pending', '排队中'), ('running', '执行中'), ('success', '成功'), ('failed', '失败')], db_index=True, default='pending', help_text='状态', max_length=16, verbose_name='状态')),
+                ('row_count', models.BigIntegerField(default=0, help_text='结果行数', verbose_name='结果行数')),
+                ('error', models.TextField(blank=True, help_text='错误信息', null=True, verbose_name='错误信息')),
+                ('result', models.FileField(blank=True, help_text='gzip 压缩的结果文件', max_length=1023, null=True, upload_to='formtemplate/report/%Y/%m/%d/', verbose_name='结果文件')),
+                ('create_time', models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='创建时间')),
+                ('start_time', models.DateTimeField(blank=True, null=True, verbose_name='开始时间')),
+                ('finish_time', models.DateTimeField(blank=True, null=True, verbose_name='完成时间')),
+                ('creator', models.ForeignKey(blank=True, db_constraint=False, help_text='创建人', null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+                ('report', models.ForeignKey(db_constraint=False, help_text='报表', on_delete=django.db.models.deletion.CASCADE, related_name='jobs', to='formtemplate.formdatareportconf')),
+            ],
+            options={
+                'verbose_name': '07.报表异步查询任务',
+                'verbose_name_plural': '07.报表异步查询任务',
+            },
+        ),
+    ]
@@ -0,0 +1 @@
+CREATE INDEX IF NOT EXISTS formtemplate_formdata_tpl_ctime_id ON public.formtemplate_formdata (template_id, create_time DESC, id DESC);
@@ -8,7 +8,6 @@ import goods.models
 from typing import Optional, Dict, Type, List, Any, Union
 from django.utils import timezone
 from django.db import models
-from django.core.cache import cache
 from utility.db_fields import TableNamePKField
 from .const import M2M_MODELS_CHOICES
 
@@ -21,10 +20,6 @@ TemplateModelType = \
     Type['goods.models.Goods']
 
 
-def get_template_field_rel_cache_key(template_id: str) -> str:
-    return f'{template_id}-FF'
-
-
 # 模版字段
 class FormFields(models.Model):
     """模版字段"""
@@ -67,31 +62,6 @@ class FormFields(models.Model):
         """字段最终别名，可能是别名或原始数据库字段名"""
         return self.alias or self.col_name
 
-    def save(self, force_insert=False, force_update=False, using=None, update_fields=None):
-        super().save(force_insert, force_update, using, update_fields)
-        cache.set(self.pk, self)
-        tmpl_key = get_template_field_rel_cache_key(str(self.template_id))
-        tmpl_fld_list = cache.get(tmpl_key)
-        if tmpl_fld_list is None:
-            cache.set(tmpl_key, [self.pk])
-        elif self.pk not in tmpl_fld_list:
-            tmpl_fld_list.append(self.pk)
-            cache.set(tmpl_key, tmpl_fld_list)
-
-    def delete(self, using=None, keep_parents=False):
-        pk = str(self.pk)
-        template_id = str(self.template_id)  # type: ignore
-        result = super().delete(using, keep_parents)
-        cache.delete(pk)
-        tmpl_key = get_template_field_rel_cache_key(template_id)
-        tmpl_fld_list = cache.get(tmpl_key)  # type: list
-        if tmpl_fld_list is None:
-            return result
-        elif pk in tmpl_fld_list:
-            tmpl_fld_list.remove(pk)
-            cache.set(tmpl_key, tmpl_fld_list)
-        return result
-
     @property
     def data_source(self) -> Dict[str, Any]:
         """字段内数据定义"""
@@ -140,6 +110,10 @@ class FormTemplate(models.Model):
     code = models.TextField('代码', null=True, blank=True, help_text='代码')
     photo = models.TextField('截图', null=True, blank=True, help_text='截图')
     need_login = models.BooleanField('需登陆', default=False, help_text='需登陆')
+    use_rollup = models.BooleanField('启用聚合预计算', default=False, help_text='启用后聚合接口优先使用预计算结果')
+    rollup_time = models.DateTimeField(
+        '聚合预计算时间', null=True, blank=True, editable=False, help_text='预计算完成时间，为空时聚合接口实时计算'
+    )
 
     permission = models.ForeignKey(
         'usercenter.FuncPermission', on_delete=models.SET_NULL, null=True, blank=True, help_text='功能模块',
@@ -237,21 +211,18 @@ class FormTemplate(models.Model):
         model_class = self.get_model()
         app_label_name = model_class._meta.app_label
         # 如果有关联字段，则创建一个带有关联字段外键的代理模型用于关系取值
+        # 代理模型按模板ID命名，避免不同模板的代理模型在 app registry 中互相覆盖，
+        # 调用方应通过 formtemplate.registry 复用，不要每次请求都重新创建
         # TODO: 考虑有多个关联ID字段的情况下如何增加多个外键到代理模型中（元类或type）
-        # Example:
-        # meta = type('Meta', (), {'proxy':True, 'app_label':'service'})
-        # type('NewService', (Services,), {'Meta':meta, '__module__':model_class.__module__})
         if self.related_fields and issubclass(model_class, models.Model):
-            class RelData(model_class):  # type: ignore
-                obj = models.ForeignKey(
-                    rel_model_class, on_delete=models.DO_NOTHING, null=True, blank=True, db_constraint=False,
-                    related_name='+', db_column='obj_id'
-                )
-
-                class Meta:
-                    proxy = True
-                    app_label = app_label_name
-            return RelData
+            meta = type('Meta', (), {'proxy': True, 'app_label': app_label_name})
+            obj = models.ForeignKey(
+                rel_model_class, on_delete=models.DO_NOTHING, null=True, blank=True, db_constraint=False,
+                related_name='+', db_column='obj_id'
+            )
+            return type(f'RelData{self.pk}', (model_class,), {
+                'obj': obj, 'Meta': meta, '__module__': model_class.__module__
+            })
         return model_class
 
     def get_model(self) -> TemplateModelType:
@@ -272,8 +243,8 @@ class FormTemplate(models.Model):
 
     def get_serializer_class(self):
         """返回当前模版对应的Serializer类"""
-        from .api import get_serializer_class
-        return get_serializer_class(self.get_model(), self)
+        from .registry import template_registry
+        return template_registry.get(self.pk).model_serializer_class
 
     @property
     def model_table_name(self) -> str:
@@ -285,23 +256,6 @@ class FormTemplate(models.Model):
     def get_by_id(cls, template_id: str) -> 'FormTemplate':
         return cls.objects.prefetch_related('fields').get(pk=template_id)
 
-    def save(self, force_insert=False, force_update=False, using=None, update_fields=None):
-        super().save(force_insert, force_update, using, update_fields)
-        cache.set(self.pk, self)
-
-    def delete(self, using=None, keep_parents=False):
-        pk = str(self.pk)
-        result = super().delete(using, keep_parents)
-        cache.delete(pk)
-        tmpl_key = get_template_field_rel_cache_key(pk)
-        tmpl_fld_list = cache.get(tmpl_key)  # type: list
-        if tmpl_fld_list is None:
-            return result
-        else:
-            for field_pk in tmpl_fld_list:
-                cache.delete(field_pk)
-        return result
-
     def get_data_sources(self):
         fields = self.all_fields
         data_sources = []
@@ -546,9 +500,12 @@ class FormData(models.Model):
         db_table = 'formtemplate_formdata'
         managed = False
 
-    def save(self, force_insert=False, force_update=False, using=None, update_fields=None):
+    def fill_src_id(self):
         if not self.src_id:
             self.src_id = self.org_id or 0
+
+    def save(self, force_insert=False, force_update=False, using=None, update_fields=None):
+        self.fill_src_id()
         super().save(force_insert, force_update, using, update_fields)
 
     @property
@@ -582,6 +539,13 @@ class FormDataReportConf(models.Model):
     arguments = models.TextField('参数定义', null=True, blank=True, help_text='参数定义')
     data_struct = models.TextField('数据定义', null=True, blank=True, help_text='数据定义')
     charts_struct = models.TextField('图表定义', null=True, blank=True, help_text='图表定义')
+    cache_ttl = models.PositiveIntegerField('缓存时间', default=0, help_text='查询结果缓存时间(秒)，0为不缓存')
+    cache_tags = models.CharField(
+        '缓存失效标签', max_length=1023, null=True, blank=True,
+        help_text='逗号分隔的模板ID或数据表名，这些模板或数据表的数据变更时缓存失效；为空时使用SQL中的数据表'
+    )
+    job_concurrency = models.PositiveIntegerField('异步查询并发数', default=0, help_text='同时执行的异步查询数量，0为使用系统默认值')
+    job_timeout = models.PositiveIntegerField('异步查询超时', default=0, help_text='异步查询SQL超时时间(秒)，0为使用系统默认值')
     permission = models.ForeignKey(
         'usercenter.FuncPermission', on_delete=models.SET_NULL, null=True, blank=True, help_text='功能模块',
         db_constraint=False, db_index=True
@@ -594,3 +558,78 @@ class FormDataReportConf(models.Model):
     class Meta:
         verbose_name = '05.表单数据报表'
         verbose_name_plural = verbose_name
+
+    @property
+    def cache_tag_list(self) -> List[str]:
+        return [i.strip() for i in (self.cache_tags or '').split(',') if i.strip()]
+
+
+class FormDataReportJob(models.Model):
+    """报表异步查询任务"""
+    STATUS = (
+        ('pending', '排队中'),
+        ('running', '执行中'),
+        ('success', '成功'),
+        ('failed', '失败'),
+    )
+    FILE_TYPES = (
+        ('json', 'JSON'),
+        ('csv', 'CSV'),
+    )
+    id = TableNamePKField('RJ')
+    sys_id = models.IntegerField('系统ID', default=1, db_index=True)
+    org_id = models.IntegerField('组织ID', default=1, db_index=True)
+    report = models.ForeignKey(
+        'FormDataReportConf', on_delete=models.CASCADE, related_name='jobs', help_text='报表', db_constraint=False
+    )
+    file_type = models.CharField('结果文件类型', max_length=16, choices=FILE_TYPES, default='json', help_text='结果文件类型')
+    sql = models.TextField('查询SQL')
+    sql_values = models.TextField('查询参数', null=True, blank=True, help_text='查询参数(JSON)')
+    status = models.CharField('状态', max_length=16, choices=STATUS, default='pending', db_index=True, help_text='状态')
+    row_count = models.BigIntegerField('结果行数', default=0, help_text='结果行数')
+    error = models.TextField('错误信息', null=True, blank=True, help_text='错误信息')
+    result = models.FileField(
+        '结果文件', upload_to='formtemplate/report/%Y/%m/%d/', max_length=1023, null=True, blank=True,
+        help_text='gzip 压缩的结果文件'
+    )
+    creator = models.ForeignKey(
+        'usercenter.User', on_delete=models.SET_NULL, null=True, blank=True, help_text='创建人', db_constraint=False
+    )
+    create_time = models.DateTimeField('创建时间', default=timezone.now, db_index=True)
+    start_time = models.DateTimeField('开始时间', null=True, blank=True)
+    finish_time = models.DateTimeField('完成时间', null=True, blank=True)
+
+    class Meta:
+        verbose_name = '07.报表异步查询任务'
+        verbose_name_plural = verbose_name
+
+
+class FormDataRollup(models.Model):
+    """
+    表单数据聚合预计算
+
+    按 模板、系统、组织、分区、部门、日期 分桶保存聚合字段的预计算结果：
+    去重计数字段每个不同值一行（value 为字段值），其他聚合字段每桶一行（value 为空）
+    """
+    id = models.BigAutoField(primary_key=True)
+    template = models.ForeignKey(
+        'FormTemplate', on_delete=models.CASCADE, related_name='+', help_text='模板ID', db_constraint=False
+    )
+    sys_id = models.IntegerField('系统ID', null=True, blank=True)
+    org_id = models.IntegerField('组织ID', null=True, blank=True)
+    src_id = models.IntegerField('分区ID', null=True, blank=True)
+    department_id = models.CharField('部门ID', max_length=32, null=True, blank=True)
+    day = models.DateField('日期', help_text='数据创建日期')
+    col_name = models.CharField('字段列名', max_length=128)
+    value = models.TextField('字段值', null=True, blank=True, help_text='去重计数字段的值')
+    value_count = models.BigIntegerField('非空数量', default=0)
+    value_sum = models.DecimalField('求和', max_digits=32, decimal_places=4, null=True, blank=True)
+    value_min = models.DecimalField('最小值', max_digits=32, decimal_places=4, null=True, blank=True)
+    value_max = models.DecimalField('最大值', max_digits=32, decimal_places=4, null=True, blank=True)
+
+    class Meta:
+        verbose_name = '06.表单数据聚合预计算'
+        verbose_name_plural = verbose_name
+        indexes = [
+            models.Index(fields=['template', 'day'], name='formtemplate_rollup_tpl_day'),
+        ]
@@ -0,0 +1,269 @@
+"""
+进程内模板编译注册表。
+
+通用数据接口每次请求都需要根据模板动态构建 Model 代理类、Serializer 类和 FilterSet 类，
+此模块把这些动态类按模板编译一次后缓存在当前进程内，模板或模板字段变更时失效重建。
+其他进程中发生的变更通过 formtemplate.bus 的版本号轮询同步。
+"""
+
+import time
+import logging
+import threading
+from collections import OrderedDict
+from functools import cached_property
+from typing import Dict, Optional, Set, Tuple, Type
+
+from django.apps import apps
+from django.conf import settings
+from django.db import models as django_models, transaction
+
+from . import bus
+from . import models
+
+logger = logging.getLogger('restapi')
+
+# 编译结果在进程内的最长存活时间（秒），None 为不过期，仅依赖变更广播失效
+REGISTRY_TTL = getattr(settings, 'FORMTEMPLATE_REGISTRY_TTL', None)
+# 进程内最多缓存的模板数量
+REGISTRY_MAXSIZE = getattr(settings, 'FORMTEMPLATE_REGISTRY_MAXSIZE', 512)
+# 轮询变更广播的最小间隔（秒）
+BUS_POLL_INTERVAL = getattr(settings, 'FORMTEMPLATE_BUS_POLL_INTERVAL', 1)
+
+
+class CompiledTemplate(object):
+    """模板编译结果，各动态类在首次访问时构建，之后在本版本内复用"""
+
+    def __init__(self, template: models.FormTemplate, version: int):
+        self.template = template
+        self.version = version
+        self.compiled_at = time.monotonic()
+
+    @property
+    def template_id(self) -> str:
+        return str(self.template.pk)
+
+    @cached_property
+    def dependency_ids(self) -> Set[str]:
+        """编译结果依赖的其他模板ID（关联模版）"""
+        return {
+            str(f.related_template_id) for f in self.template.all_fields
+            if f.related_template_id
+        }
+
+    @cached_property
+    def model(self) -> models.TemplateModelType:
+        return self.template.get_model()
+
+    @cached_property
+    def proxy_model(self) -> Type[django_models.Model]:
+        """带有关联外键的代理模型，无关联模版时为模板模型本身"""
+        if self.template.has_rel_template:
+            return self.template.get_related_model()
+        return self.model
+
+    @cached_property
+    def annotate_dict(self) -> Dict[str, django_models.F]:
+        if self.template.has_rel_template:
+            return self.template.get_annotate_dict()
+        return {}
+
+    @cached_property
+    def serializer_class(self):
+        """列表、详情、更新使用的 Serializer 类"""
+        from .api import get_serializer_class
+        return get_serializer_class(self.proxy_model, self.template)
+
+    @cached_property
+    def model_serializer_class(self):
+        """基于模板模型（非代理模型）的 Serializer 类"""
+        from .api import get_serializer_class
+        if self.proxy_model is self.model:
+            return self.serializer_class
+        return get_serializer_class(self.model, self.template)
+
+    @cached_property
+    def create_serializer_class(self):
+        from .api import get_create_serializer_class
+        return get_create_serializer_class(self.model, self.template)
+
+    @cached_property
+    def update_serializer_class(self):
+        from .api import get_update_serializer_class
+        return get_update_serializer_class(self.model, self.template)
+
+    @cached_property
+    def filterset(self) -> Tuple[type, list]:
+        """代理模型对应的 (FilterSet 类, 搜索字段)"""
+        from .api import get_filtersetclass_and_searchfields
+        return get_filtersetclass_and_searchfields(self.proxy_model, self.template)
+
+    @cached_property
+    def model_filterset(self) -> Tuple[type, list]:
+        """模板模型对应的 (FilterSet 类, 搜索字段)"""
+        from .api import get_filtersetclass_and_searchfields
+        if self.proxy_model is self.model:
+            return self.filterset
+        return get_filtersetclass_and_searchfields(self.model, self.template)
+
+    @cached_property
+    def aggregate_fields(self):
+        """模板聚合字段"""
+        return list(self.template.aggregate_fields.select_related('field'))
+
+    @cached_property
+    def rollup_columns(self):
+        """需要预计算的 (去重计数列, 数值聚合列)，无法预计算时为 None"""
+        from .rollup import get_rollup_columns
+        return get_rollup_columns(self.template)
+
+    def get_queryset(self) -> django_models.QuerySet:
+        """通用数据接口的基础查询集"""
+        qs = self.proxy_model.objects.filter(template=self.template)
+        if self.annotate_dict:
+            qs = qs.annotate(**self.annotate_dict)
+        return qs.order_by('-create_time')
+
+    def get_model_queryset(self) -> django_models.QuerySet:
+        return self.model.objects.filter(template=self.template).order_by('-create_time')
+
+    def release(self):
+        """从 Django 的 app registry 中移除本编译结果创建的代理模型"""
+        if 'proxy_model' not in self.__dict__ or self.proxy_model is self.model:
+            return
+        opts = self.proxy_model._meta
+        app_models = apps.all_models.get(opts.app_label, {})
+        if app_models.get(opts.model_name) is self.proxy_model:
+            del app_models[opts.model_name]
+            apps.clear_cache()
+
+
+class TemplateRegistry(object):
+    """进程内模板编译注册表"""
+
+    def __init__(self, ttl=REGISTRY_TTL, maxsize=REGISTRY_MAXSIZE, poll_interval=BUS_POLL_INTERVAL):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.poll_interval = poll_interval
+        self._entries = OrderedDict()  # type: OrderedDict[str, CompiledTemplate]
+        self._versions = {}  # type: Dict[str, int]
+        # 最近一次从变更广播中看到的各模板版本号
+        self._remote_versions = {}  # type: Dict[str, int]
+        self._bus_version = None  # type: Optional[int]
+        self._last_poll = 0.0
+        self._lock = threading.RLock()
+
+    def get_version(self, template_id: str) -> int:
+        return self._versions.get(str(template_id), 0)
+
+    def _is_fresh(self, compiled: CompiledTemplate) -> bool:
+        if compiled.version != self.get_version(compiled.template_id):
+            return False
+        if self.ttl is not None and time.monotonic() - compiled.compiled_at > self.ttl:
+            return False
+        return True
+
+    def sync(self, force=False):
+        """轮询变更广播，使其他进程中已变更模板的编译结果失效"""
+        now = time.monotonic()
+        if not force and now - self._last_poll < self.poll_interval:
+            return
+        self._last_poll = now
+        try:
+            bus_version = bus.get_bus_version()
+            if bus_version == self._bus_version:
+                return
+            with self._lock:
+                template_ids = set(self._remote_versions)
+            remote_versions = bus.get_template_versions(template_ids)
+        except Exception as e:
+            # 无法确认是否有变更时丢弃全部编译结果，保证不使用过期的模板
+            logger.error(f'formtemplate bus sync error: {e}', exc_info=e)
+            self.clear()
+            return
+        with self._lock:
+            for template_id, version in remote_versions.items():
+                if self._remote_versions.get(template_id) != version:
+                    self._remote_versions[template_id] = version
+                    self._invalidate_local(template_id)
+            self._bus_version = bus_version
+
+    def _track_remote(self, template_ids) -> bool:
+        """记录编译前各模板在变更广播中的版本号，需在读取数据库之前调用"""
+        with self._lock:
+            missing = [i for i in template_ids if i not in self._remote_versions]
+        try:
+            remote_versions = bus.get_template_versions(missing)
+        except Exception as e:
+            logger.error(f'formtemplate bus track error: {e}', exc_info=e)
+            return False
+        with self._lock:
+            for template_id, version in remote_versions.items():
+                self._remote_versions.setdefault(template_id, version)
+        return True
+
+    def get(self, template_id: str) -> CompiledTemplate:
+        """获取模板编译结果，不存在时抛出 FormTemplate.DoesNotExist"""
+        template_id = str(template_id)
+        self.sync()
+        with self._lock:
+            compiled = self._entries.get(template_id)
+            if compiled is not None and self._is_fresh(compiled):
+                self._entries.move_to_end(template_id)
+                return compiled
+            version = self.get_version(template_id)
+        tracked = self._track_remote([template_id])
+        template = models.FormTemplate.get_by_id(template_id)
+        compiled = CompiledTemplate(template, version)
+        # 关联模版变更同样需要重新编译本模板
+        tracked = self._track_remote(compiled.dependency_ids) and tracked
+        if not tracked:
+            # 无法感知其他进程的变更时不缓存，避免长期使用过期的模板；
+            # 代理模型构建后立即从 app registry 移除，本次请求仍可使用，重复编译时不会累积
+            compiled.proxy_model
+            compiled.release()
+            return compiled
+        with self._lock:
+            old = self._entries.pop(template_id, None)
+            if old is not None:
+                old.release()
+            self._entries[template_id] = compiled
+            while len(self._entries) > self.maxsize:
+                _, evicted = self._entries.popitem(last=False)
+                evicted.release()
+        return compiled
+
+    def invalidate(self, template_id: Optional[str]):
+        """使模板及依赖它的模板的编译结果失效，并在事务提交后广播给其他进程"""
+        if not template_id:
+            return
+        template_id = str(template_id)
+        self._invalidate_local(template_id)
+        transaction.on_commit(lambda: self._publish(template_id))
+
+    def _publish(self, template_id: str):
+        try:
+            bus.publish_template_change(template_id)
+        except Exception as e:
+            logger.error(f'formtemplate bus publish error: {e}', exc_info=e)
+
+    def _invalidate_local(self, template_id: str):
+        with self._lock:
+            self._versions[template_id] = self.get_version(template_id) + 1
+            dependents = [
+                c.template_id for c in self._entries.values()
+                if template_id in c.dependency_ids
+            ]
+            for dep_id in dependents:
+                self._versions[dep_id] = self.get_version(dep_id) + 1
+
+    def clear(self):
+        with self._lock:
+            for compiled in self._entries.values():
+                compiled.release()
+            self._entries.clear()
+            self._versions.clear()
+            self._remote_versions.clear()
+            self._bus_version = None
+
+
+template_registry = TemplateRegistry()
@@ -0,0 +1,223 @@
+"""
+报表异步查询。
+
+报表接口传 `async=1` 时只生成SQL并创建 FormDataReportJob，由 celery 任务执行查询：
+使用服务端游标分批读取结果，写入 gzip 压缩的 JSON 或 CSV 文件后保存到文件存储。
+
+每个报表同时执行的任务数量受 `job_concurrency` 限制，超出时任务保持排队状态稍后重试，
+超过 `FORMTEMPLATE_REPORT_JOB_MAX_RETRIES` 次后任务失败；
+查询SQL在事务内设置 `statement_timeout`，超时后任务失败，worker 异常退出遗留的执行中任务由定时清理标记为失败。
+"""
+
+import io
+import csv
+import gzip
+import json
+import datetime
+import logging
+import tempfile
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files import File
+from django.db import connection, transaction
+from django.utils import timezone
+from rest_framework.utils.encoders import JSONEncoder
+
+from . import models
+
+logger = logging.getLogger('restapi')
+
+# 每个报表默认同时执行的异步查询数量
+REPORT_JOB_CONCURRENCY = getattr(settings, 'FORMTEMPLATE_REPORT_JOB_CONCURRENCY', 2)
+# 默认查询SQL超时时间（秒）
+REPORT_JOB_TIMEOUT = getattr(settings, 'FORMTEMPLATE_REPORT_JOB_TIMEOUT', 10 * 60)
+# 并发名额已满时重试的间隔（秒）
+REPORT_JOB_RETRY_DELAY = getattr(settings, 'FORMTEMPLATE_REPORT_JOB_RETRY_DELAY', 10)
+# 并发名额已满时最多重试的次数，超过后任务失败
+REPORT_JOB_MAX_RETRIES = getattr(settings, 'FORMTEMPLATE_REPORT_JOB_MAX_RETRIES', 360)
+# 任务及结果文件保留天数
+REPORT_JOB_KEEP_DAYS = getattr(settings, 'FORMTEMPLATE_REPORT_JOB_KEEP_DAYS', 7)
+# 每次从服务端游标读取的行数
+REPORT_JOB_CHUNK_SIZE = getattr(settings, 'FORMTEMPLATE_REPORT_JOB_CHUNK_SIZE', 2000)
+
+PROGRESS_KEY = 'formtemplate:report-job-progress:{}'
+
+
+def get_progress(job: models.FormDataReportJob) -> int:
+    """执行中的任务返回已读取行数，其他返回结果行数"""
+    if job.status == 'running':
+        return cache.get(PROGRESS_KEY.format(job.pk)) or 0
+    return job.row_count
+
+
+def get_timeout(report: models.FormDataReportConf) -> int:
+    return report.job_timeout or REPORT_JOB_TIMEOUT
+
+
+def acquire_slot(job: models.FormDataReportJob) -> bool:
+    """占用报表的并发名额并把任务标记为执行中，名额已满时返回 False"""
+    now = timezone.now()
+    with transaction.atomic():
+        report = models.FormDataReportConf.objects.select_for_update().get(pk=job.report_id)
+        limit = report.job_concurrency or REPORT_JOB_CONCURRENCY
+        # 超过超时时间仍未结束的任务视为 worker 异常退出，不再占用名额
+        running = models.FormDataReportJob.objects.filter(
+            report_id=report.pk, status='running',
+            start_time__gte=now - datetime.timedelta(seconds=get_timeout(report) + 60)
+        ).count()
+        if running >= limit:
+            return False
+        models.FormDataReportJob.objects.filter(pk=job.pk).update(status='running', start_time=now)
+    return True
+
+
+def fail_job(job_id: str, error: str):
+    models.FormDataReportJob.objects.filter(pk=job_id, status__in=('pending', 'running')).update(
+        status='failed', error=error, finish_time=timezone.now()
+    )
+
+
+def run_job(job_id: str) -> bool:
+    """执行异步查询任务，并发名额已满需要稍后重试时返回 False"""
+    job = models.FormDataReportJob.objects.select_related('report').filter(pk=job_id).first()
+    if job is None or job.status != 'pending':
+        return True
+    if not acquire_slot(job):
+        return False
+    job.status = 'running'
+    try:
+        row_count = write_result(job)
+    except Exception as e:
+        logger.error(f'report job {job_id} error: {e}', exc_info=e)
+        models.FormDataReportJob.objects.filter(pk=job_id).update(
+            status='failed', error=str(e), finish_time=timezone.now()
+        )
+    else:
+        models.FormDataReportJob.objects.filter(pk=job_id).update(
+            status='success', row_count=row_count, result=job.result.name, finish_time=timezone.now()
+        )
+    finally:
+        cache.delete(PROGRESS_KEY.format(job_id))
+    return True
+
+
+def load_values(job: models.FormDataReportJob) -> Optional[tuple]:
+    values = json.loads(job.sql_values or '[]')
+    # IN 查询的参数在 JSON 中为数组，需要还原为 tuple
+    values = [tuple(v) if isinstance(v, list) else v for v in values]
+    if values and values[0]:
+        return tuple(values)
+    return None
+
+
+def iter_chunks(job: models.FormDataReportJob):
+    """在设置了超时时间的事务内使用服务端游标分批读取，第一次返回表头，之后每次返回一批行"""
+    args = load_values(job)
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT set_config('statement_timeout', %s, true)", [str(get_timeout(job.report) * 1000)])
+        with connection.chunked_cursor() as cursor:
+            if args:
+                cursor.execute(job.sql, args)
+            else:
+                cursor.execute(job.sql)
+            # 服务端游标 execute 只执行 DECLARE，第一次读取之后才有 description
+            rows = cursor.fetchmany(REPORT_JOB_CHUNK_SIZE)
+            yield [col[0] for col in cursor.description]  # type: ignore
+            while rows:
+                yield rows
+                rows = cursor.fetchmany(REPORT_JOB_CHUNK_SIZE)
+
+
+def write_result(job: models.FormDataReportJob) -> int:
+    """执行查询并把结果写入文件，返回结果行数"""
+    report = job.report
+    progress_key = PROGRESS_KEY.format(job.pk)
+    row_count = 0
+    with tempfile.TemporaryFile() as tmp:
+        with gzip.GzipFile(fileobj=tmp, mode='wb') as gz:
+            out = io.TextIOWrapper(gz, encoding='utf-8', newline='')
+            chunks = iter_chunks(job)
+            hd = next(chunks)
+            writer = JSONResultWriter(out, report, hd) if job.file_type == 'json' else CSVResultWriter(out, hd)
+            for rows in chunks:
+                writer.write_rows(rows)
+                row_count += len(rows)
+                cache.set(progress_key, row_count, get_timeout(report) + 60)
+            writer.close(row_count)
+            out.flush()
+            out.detach()
+        tmp.seek(0)
+        job.result.save(f'{job.pk}.{job.file_type}.gz', File(tmp), save=False)
+    return row_count
+
+
+class JSONResultWriter(object):
+    """与报表查询接口相同结构的 JSON"""
+
+    def __init__(self, out, report: models.FormDataReportConf, hd):
+        self.out = out
+        self.report = report
+        self.hd = hd
+        self.sep = ''
+        head = {'id': report.report_id, 'title': report.report_name}
+        out.write(self.dumps(head)[:-1] + ',"data":[')
+
+    @staticmethod
+    def dumps(obj):
+        return json.dumps(obj, cls=JSONEncoder, ensure_ascii=False, separators=(',', ':'))
+
+    def write_rows(self, rows):
+        self.out.write(self.sep + ','.join(self.dumps(dict(zip(self.hd, row))) for row in rows))
+        self.sep = ','
+
+    def close(self, row_count):
+        data_struct_conf = json.loads(self.report.data_struct)
+        charts_struct_conf = json.loads(self.report.charts_struct)
+        header = data_struct_conf.get('header')
+        if header is None and row_count > 0:
+            header = [{"key": x, "title": x, "type": 'str', "length": 30} for x in self.hd]
+        self.out.write('],"header":' + self.dumps(header) + ',"charts":' + self.dumps(charts_struct_conf) + '}')
+
+
+class CSVResultWriter(object):
+
+    def __init__(self, out, hd):
+        out.write('\ufeff')
+        self.writer = csv.writer(out)
+        self.writer.writerow(hd)
+
+    def write_rows(self, rows):
+        self.writer.writerows(rows)
+
+    def close(self, row_count):
+        pass
+
+
+def expire_running_jobs() -> int:
+    """执行超过超时时间仍未结束的任务视为 worker 异常退出，标记为失败"""
+    now = timezone.now()
+    count = 0
+    running = models.FormDataReportJob.objects.filter(status='running').select_related('report')
+    for job in running.iterator():
+        if job.start_time is None or job.start_time < now - datetime.timedelta(seconds=get_timeout(job.report) + 60):
+            count += models.FormDataReportJob.objects.filter(pk=job.pk, status='running').update(
+                status='failed', error='timeout', finish_time=now
+            )
+    return count
+
+
+def clean_jobs(days: int = REPORT_JOB_KEEP_DAYS):
+    """删除过期的任务及其结果文件"""
+    expire_running_jobs()
+    expired = models.FormDataReportJob.objects.filter(
+        create_time__lt=timezone.now() - datetime.timedelta(days=days)
+    ).exclude(status='running')
+    for job in expired.exclude(result='').exclude(result__isnull=True).iterator():
+        try:
+            job.result.delete(save=False)
+        except Exception as e:
+            logger.error(f'delete report job file {job.result} error: {e}', exc_info=e)
+    expired.delete()
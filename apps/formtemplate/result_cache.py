@@ -0,0 +1,119 @@
+"""
+报表及通用数据查询结果缓存。
+
+缓存键中包含其依赖的标签（模板ID、数据表名）的版本号，通用数据写入后递增相关标签的版本号，
+依赖这些标签的缓存随之失效，旧的缓存条目由过期时间自然清除。
+组织、服务、客户、商品在其他接口中的单条保存、删除由模型信号使缓存失效；
+绕过模型信号的批量 update()、delete() 写入不会使缓存失效，相关缓存在过期时间后刷新。
+
+同一缓存键在失效后同时被多个请求访问时，只有一个请求执行查询，其他请求等待其结果。
+"""
+
+import re
+import json
+import time
+import hashlib
+import logging
+from typing import Callable, Iterable, List, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+logger = logging.getLogger('restapi')
+
+# 通用数据查询接口 use_cache 的缓存时间（秒）
+DATA_CACHE_TTL = getattr(settings, 'FORMTEMPLATE_DATA_CACHE_TTL', 60 * 60)
+# 等待其他请求计算同一结果的最长时间（秒）
+CACHE_WAIT_TIMEOUT = getattr(settings, 'FORMTEMPLATE_CACHE_WAIT_TIMEOUT', 30)
+# 计算锁的过期时间（秒），防止计算进程异常退出后锁无法释放
+CACHE_LOCK_TIMEOUT = getattr(settings, 'FORMTEMPLATE_CACHE_LOCK_TIMEOUT', 120)
+
+TAG_VERSION_KEY = 'formtemplate:tag-version:{}'
+SQL_TABLE_REGEX = re.compile(r'\b(?:from|join)\s+(?:only\s+)?((?:"?\w+"?\.)?"?\w+"?)', re.IGNORECASE)
+
+
+def get_sql_tables(sql: str) -> List[str]:
+    """SQL 中 FROM、JOIN 引用的数据表名"""
+    tables = set()
+    for name in SQL_TABLE_REGEX.findall(sql):
+        tables.add(name.replace('"', '').split('.')[-1].lower())
+    return sorted(tables)
+
+
+def get_tag_versions(tags: Iterable[str]) -> List[str]:
+    """获取标签当前版本号，不存在的标签以当前时间初始化，避免标签被清除后与旧版本号重复"""
+    tags = sorted(set(tags))
+    keys = [TAG_VERSION_KEY.format(tag) for tag in tags]
+    versions = cache.get_many(keys)
+    result = []
+    for key in keys:
+        version = versions.get(key)
+        if version is None:
+            cache.add(key, time.time_ns(), timeout=None)
+            version = cache.get(key)
+        result.append(str(version))
+    return result
+
+
+def invalidate_tags(tags: Iterable[str]):
+    """在事务提交后递增标签版本号，使依赖这些标签的缓存失效"""
+    tags = sorted({str(tag) for tag in tags if tag})
+    if tags:
+        transaction.on_commit(lambda: _incr_tags(tags))
+
+
+def _incr_tags(tags: List[str]):
+    for tag in tags:
+        key = TAG_VERSION_KEY.format(tag)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, time.time_ns(), timeout=None)
+        except Exception as e:
+            logger.error(f'formtemplate cache invalidate {tag} error: {e}', exc_info=e)
+
+
+def get_template_tags(template) -> List[str]:
+    """模板数据写入时需要失效的标签：模板ID和模板数据表名"""
+    return [str(template.pk), template.get_model()._meta.db_table]
+
+
+def invalidate_template_data(template):
+    invalidate_tags(get_template_tags(template))
+
+
+def invalidate_instance_data(instance):
+    """模板模型的单条数据在通用数据接口之外（如组织、客户、商品等接口）写入时使缓存失效"""
+    invalidate_tags([instance.template_id, instance._meta.db_table])
+
+
+def make_key(prefix: str, parts, tags: Iterable[str]) -> str:
+    digest = hashlib.sha1(
+        json.dumps([parts, get_tag_versions(tags)], sort_keys=True, default=str).encode('utf-8')
+    ).hexdigest()
+    return f'formtemplate:{prefix}:{digest}'
+
+
+def get_or_compute(key: str, ttl: Optional[int], func: Callable):
+    """读取缓存，不存在时计算并写入；同一键同时只有一个请求计算"""
+    value = cache.get(key)
+    if value is not None:
+        return value
+    lock_key = f'{key}:lock'
+    if cache.add(lock_key, 1, timeout=CACHE_LOCK_TIMEOUT):
+        try:
+            value = func()
+            cache.set(key, value, ttl)
+            return value
+        finally:
+            cache.delete(lock_key)
+    deadline = time.monotonic() + CACHE_WAIT_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(0.1)
+        value = cache.get(key)
+        if value is not None:
+            return value
+        if cache.get(lock_key) is None:
+            break
+    return func()
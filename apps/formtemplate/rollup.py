@@ -0,0 +1,298 @@
+"""
+聚合字段预计算。
+
+模板启用 `use_rollup` 后，按 模板、系统、组织、分区、部门、日期 分桶预先计算聚合字段的结果并保存在
+FormDataRollup 中，聚合接口的过滤条件只涉及这些维度时直接汇总预计算结果，不再扫描数据表。
+
+通用数据接口的增删改会在事务提交后异步重新计算受影响日期的分桶；
+绕过接口写入的数据由定时任务 reconcile_rollups 重新计算最近几天的分桶来兜底。
+"""
+
+import datetime
+import itertools
+import logging
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.db import connection, transaction, models as django_models
+from django.db.models import Count, Max, Min, Q, Sum
+from django.db.models.functions import Cast, TruncDate
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from . import models
+from .registry import template_registry
+
+logger = logging.getLogger('restapi')
+
+# 预计算分桶维度（日期之外）
+ROLLUP_DIMS = ('sys_id', 'org_id', 'src_id', 'department_id')
+# 定时任务重新计算最近多少天的分桶
+ROLLUP_RECONCILE_DAYS = getattr(settings, 'FORMTEMPLATE_ROLLUP_RECONCILE_DAYS', 2)
+# 写入预计算结果时每批的行数
+ROLLUP_BATCH_SIZE = getattr(settings, 'FORMTEMPLATE_ROLLUP_BATCH_SIZE', 2000)
+# 聚合接口中不影响聚合结果的参数
+ROLLUP_IGNORED_PARAMS = ('template_id', 'sys_id', 'page', 'pageSize', 'o')
+NUMERIC_FIELDS = (django_models.IntegerField, django_models.FloatField, django_models.DecimalField)
+
+
+def get_rollup_columns(template: models.FormTemplate) -> Optional[Tuple[List[str], List[str]]]:
+    """
+    返回模板需要预计算的 (去重计数列, 数值聚合列)
+
+    没有聚合字段，或存在关联字段、非数值字段的数值聚合等无法预计算的聚合字段时返回 None
+    """
+    model = template.get_model()
+    count_cols, stat_cols = set(), set()
+    aggregate_fields = list(template.aggregate_fields.select_related('field'))
+    if not aggregate_fields:
+        return None
+    for f in aggregate_fields:
+        if f.field.is_related:
+            return None
+        try:
+            model_field = model._meta.get_field(f.field.col_name)
+        except FieldDoesNotExist:
+            return None
+        if f.aggr_type == 'count':
+            count_cols.add(model_field.attname)
+        elif f.aggr_type in ('sum', 'avg', 'max', 'min'):
+            if not isinstance(model_field, NUMERIC_FIELDS):
+                return None
+            stat_cols.add(model_field.attname)
+    return sorted(count_cols), sorted(stat_cols)
+
+
+def to_day(value) -> Optional[datetime.date]:
+    if value is None:
+        return None
+    if isinstance(value, datetime.datetime):
+        if timezone.is_aware(value):
+            value = timezone.localtime(value)
+        return value.date()
+    return value
+
+
+def day_start(day: datetime.date) -> datetime.datetime:
+    value = datetime.datetime.combine(day, datetime.time.min)
+    if settings.USE_TZ:
+        value = timezone.make_aware(value)
+    return value
+
+
+def parse_day_range(params) -> Tuple[Optional[datetime.date], Optional[datetime.date]]:
+    """解析聚合接口的 `day_after`, `day_before` 参数，格式错误时抛出 ValueError"""
+    result = []
+    for key in ('day_after', 'day_before'):
+        value = params.get(key)
+        if not value:
+            result.append(None)
+            continue
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f'Bad {key}: {value}')
+        result.append(day)
+    return result[0], result[1]
+
+
+def filter_day_range(queryset, day_after=None, day_before=None):
+    """按数据创建日期过滤，包含起止日期"""
+    if day_after:
+        queryset = queryset.filter(create_time__gte=day_start(day_after))
+    if day_before:
+        queryset = queryset.filter(create_time__lt=day_start(day_before + datetime.timedelta(days=1)))
+    return queryset
+
+
+def iter_rollup_rows(template: models.FormTemplate, count_cols, stat_cols, days=None) -> Iterator[models.FormDataRollup]:
+    """从数据表计算模板的预计算结果，days 为空时计算全部日期"""
+    queryset = template.get_model().objects.filter(template_id=template.pk)
+    if days is not None:
+        queryset = filter_day_range(queryset, min(days), max(days))
+    queryset = queryset.annotate(rollup_day=TruncDate('create_time'))
+    if days is not None:
+        queryset = queryset.filter(rollup_day__in=days)
+    dims = [*ROLLUP_DIMS, 'rollup_day']
+    for col in count_cols:
+        rows = queryset.filter(**{f'{col}__isnull': False}).annotate(
+            rollup_value=Cast(col, django_models.TextField())
+        ).values(*dims, 'rollup_value').annotate(value_count=Count('pk')).order_by()
+        for row in rows.iterator(chunk_size=ROLLUP_BATCH_SIZE):
+            yield models.FormDataRollup(
+                template_id=template.pk, day=row.pop('rollup_day'), col_name=col, value=row.pop('rollup_value'), **row
+            )
+    for col in stat_cols:
+        rows = queryset.filter(**{f'{col}__isnull': False}).values(*dims).annotate(
+            value_count=Count(col), value_sum=Sum(col), value_min=Min(col), value_max=Max(col)
+        ).order_by()
+        for row in rows.iterator(chunk_size=ROLLUP_BATCH_SIZE):
+            yield models.FormDataRollup(template_id=template.pk, day=row.pop('rollup_day'), col_name=col, **row)
+
+
+def rebuild_rollup(template_id: str, days: Optional[Iterable[datetime.date]] = None):
+    """
+    重新计算模板指定日期的预计算结果，days 为空时全部重建
+
+    模板未启用预计算或聚合字段无法预计算时清除已有的预计算结果
+    """
+    template = models.FormTemplate.objects.filter(pk=template_id).first()
+    if days is not None:
+        days = sorted(set(days))
+        if not days:
+            return
+    columns = get_rollup_columns(template) if template is not None and template.use_rollup else None
+    if columns is None and days is not None:
+        return
+    with transaction.atomic():
+        # 同一模板的重新计算串行执行，避免并发删除、写入同一分桶
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_xact_lock(hashtext(%s))', [f'formtemplate-rollup:{template_id}'])
+        rollups = models.FormDataRollup.objects.filter(template_id=template_id)
+        if days is not None:
+            rollups = rollups.filter(day__in=days)
+        rollups.delete()
+        if columns is not None:
+            rows = iter_rollup_rows(template, *columns, days=days)
+            while True:
+                batch = list(itertools.islice(rows, ROLLUP_BATCH_SIZE))
+                if not batch:
+                    break
+                models.FormDataRollup.objects.bulk_create(batch)
+        if days is None and template is not None:
+            rollup_time = timezone.now() if columns is not None else None
+            models.FormTemplate.objects.filter(pk=template_id).update(rollup_time=rollup_time)
+    if days is None:
+        # 聚合接口依据模板的 rollup_time 判断是否可以使用预计算结果
+        template_registry.invalidate(template_id)
+
+
+def reconcile_rollups(days: int = ROLLUP_RECONCILE_DAYS):
+    """重新计算启用预计算的模板最近几天的分桶，尚未构建的全部重建，已停用的清除"""
+    today = to_day(timezone.now())
+    recent = [(today - datetime.timedelta(days=i)).isoformat() for i in range(days)]
+    templates = models.FormTemplate.objects.filter(
+        Q(use_rollup=True) | Q(rollup_time__isnull=False)
+    ).values_list('pk', 'use_rollup', 'rollup_time')
+    for template_id, use_rollup, rollup_time in templates:
+        if use_rollup and rollup_time is not None:
+            _delay_refresh(template_id, recent)
+        else:
+            _delay_refresh(template_id, None)
+
+
+def get_queryset_days(template: models.FormTemplate, queryset) -> List[datetime.date]:
+    """查询集中数据的创建日期，模板未启用预计算时不查询"""
+    if not template.use_rollup:
+        return []
+    return list(
+        queryset.annotate(rollup_day=TruncDate('create_time')).order_by()
+        .values_list('rollup_day', flat=True).distinct()
+    )
+
+
+def get_instance_days(template: models.FormTemplate, instances) -> List[datetime.date]:
+    if not template.use_rollup:
+        return []
+    return [to_day(getattr(i, 'create_time', None)) for i in instances]
+
+
+def schedule_refresh(template: models.FormTemplate, days: Iterable[Optional[datetime.date]]):
+    """数据变更后，在事务提交后异步重新计算受影响日期的分桶"""
+    if not template.use_rollup:
+        return
+    days = sorted({d.isoformat() for d in days if d})
+    if not days:
+        return
+    template_id = str(template.pk)
+    transaction.on_commit(lambda: _delay_refresh(template_id, days))
+
+
+def schedule_rebuild(template_id: str):
+    """在事务提交后异步全部重建模板的预计算结果"""
+    template_id = str(template_id)
+    transaction.on_commit(lambda: _delay_refresh(template_id, None))
+
+
+def reset_rollup(template_id: Optional[str]):
+    """模板字段或聚合字段变更后，停用已有的预计算结果并重建"""
+    if not template_id:
+        return
+    if models.FormTemplate.objects.filter(pk=template_id, use_rollup=True).update(rollup_time=None):
+        schedule_rebuild(template_id)
+
+
+def _delay_refresh(template_id: str, days: Optional[List[str]]):
+    from .tasks import refresh_template_rollup
+    try:
+        refresh_template_rollup.delay(template_id, days)
+    except Exception as e:
+        logger.error(f'formtemplate rollup refresh error: {e}', exc_info=e)
+
+
+def get_rollup_queryset(compiled, params) -> Optional[django_models.QuerySet]:
+    """
+    过滤条件只涉及预计算维度时，返回过滤后的预计算结果查询集，否则返回 None
+
+    支持的过滤条件：`sys_id`, `org_id`, `src_id`, `department_in`, 部门字段, `day_after`, `day_before`
+    """
+    template = compiled.template
+    if not template.use_rollup or template.rollup_time is None or compiled.rollup_columns is None:
+        return None
+    department_aliases = {f.field_alias for f in template.filter_fields if f.col_name == 'department'}
+    queryset = models.FormDataRollup.objects.filter(template_id=template.pk)
+    for key in params.keys():
+        value = params.get(key)
+        if key in ROLLUP_IGNORED_PARAMS or key in ('day_after', 'day_before') or value in (None, ''):
+            continue
+        if key in ('sys_id', 'org_id', 'src_id'):
+            try:
+                queryset = queryset.filter(**{key: int(value)})
+            except (TypeError, ValueError):
+                return None
+        elif key == 'department_in' or key in department_aliases:
+            queryset = queryset.filter(department_id__in=value.split(','))
+        else:
+            return None
+    try:
+        day_after, day_before = parse_day_range(params)
+    except ValueError:
+        return None
+    if day_after:
+        queryset = queryset.filter(day__gte=day_after)
+    if day_before:
+        queryset = queryset.filter(day__lte=day_before)
+    return queryset
+
+
+def aggregate_from_rollup(queryset, aggregate_fields, model) -> Dict[str, object]:
+    """由预计算结果汇总聚合字段，结果与实时聚合一致"""
+    params = {}
+    for i, f in enumerate(aggregate_fields):  # type: int, models.FormAggrgateFields
+        col = model._meta.get_field(f.field.col_name).attname
+        stat = Q(col_name=col, value__isnull=True)
+        if f.aggr_type == 'count':
+            params[f'c{i}'] = Count('value', distinct=True, filter=Q(col_name=col, value__isnull=False))
+        elif f.aggr_type == 'sum':
+            params[f's{i}'] = Sum('value_sum', filter=stat)
+        elif f.aggr_type == 'avg':
+            params[f's{i}'] = Sum('value_sum', filter=stat)
+            params[f'n{i}'] = Sum('value_count', filter=stat)
+        elif f.aggr_type == 'max':
+            params[f'x{i}'] = Max('value_max', filter=stat)
+        elif f.aggr_type == 'min':
+            params[f'm{i}'] = Min('value_min', filter=stat)
+    result = queryset.aggregate(**params) if params else {}
+    data = {}
+    for i, f in enumerate(aggregate_fields):
+        is_int = isinstance(model._meta.get_field(f.field.col_name), django_models.IntegerField)
+        if f.aggr_type == 'count':
+            data[f.aggr_name] = result[f'c{i}']
+        elif f.aggr_type == 'avg':
+            total, count = result[f's{i}'], result[f'n{i}']
+            value = total / count if count else None
+            data[f.aggr_name] = float(value) if is_int and value is not None else value
+        elif f.aggr_type in ('sum', 'max', 'min'):
+            value = result[{'sum': 's', 'max': 'x', 'min': 'm'}[f.aggr_type] + str(i)]
+            data[f.aggr_name] = int(value) if is_int and value is not None else value
+    return data
@@ -65,6 +65,8 @@ class FormTemplateSerializer(ModelSerializer):
             'aggregate_field',
             'photo',
             'need_login',
+            'use_rollup',
+            'rollup_time',
             'department',
             'from_template',
             'permission',
@@ -112,6 +114,7 @@ class FormTemplateMinSerializer(ModelSerializer):
             'header_conf',
             'photo',
             'need_login',
+            'use_rollup',
             'from_template',
         )
 
@@ -159,6 +162,8 @@ class FormDataReportConfSerializer(ModelSerializer):
             'arguments',
             'data_struct',
             'charts_struct',
+            'cache_ttl',
+            'cache_tags',
             'permission',
             'creator',
         )
@@ -169,6 +174,40 @@ class FormDataReportConfSerializer(ModelSerializer):
         return value
 
 
+class FormDataReportJobSerializer(ModelSerializer):
+    report_id = serializers.IntegerField(source='report.report_id', read_only=True)
+    progress = SerializerMethodField()
+    download = SerializerMethodField()
+
+    class Meta:
+        model = models.FormDataReportJob
+        fields = (
+            'pk',
+            'sys_id',
+            'org_id',
+            'report',
+            'report_id',
+            'file_type',
+            'status',
+            'row_count',
+            'progress',
+            'error',
+            'download',
+            'create_time',
+            'start_time',
+            'finish_time',
+        )
+
+    def get_progress(self, obj: models.FormDataReportJob):
+        from .report_jobs import get_progress
+        return get_progress(obj)
+
+    def get_download(self, obj: models.FormDataReportJob):
+        if obj.status != 'success' or not obj.result:
+            return None
+        return f'/api/v1/reportjob/{obj.pk}/download/'
+
+
 class FormTemplateCopySerializer(Serializer):
     form_id = serializers.CharField(required=True, help_text='源表单模板ID')
     target_id = serializers.IntegerField(required=True, help_text='目标系统ID')
@@ -0,0 +1,53 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from org.models import Org
+from service.models import Services
+from customer.models import Customer
+from goods.models import Goods
+from .models import FormTemplate, FormFields, FormAggrgateFields
+from .registry import template_registry
+from . import result_cache
+from . import rollup
+
+
+@receiver(post_save, sender=FormTemplate)
+@receiver(post_delete, sender=FormTemplate)
+def invalidate_template(sender, instance, **kwargs):
+    template_registry.invalidate(instance.pk)
+
+
+@receiver(post_save, sender=FormTemplate)
+def rollup_template(sender, instance, **kwargs):
+    # 启用后尚未构建，或停用后尚未清除
+    if instance.use_rollup == (instance.rollup_time is None):
+        rollup.schedule_rebuild(instance.pk)
+
+
+@receiver(post_save, sender=FormFields)
+@receiver(post_delete, sender=FormFields)
+@receiver(post_save, sender=FormAggrgateFields)
+@receiver(post_delete, sender=FormAggrgateFields)
+def invalidate_template_fields(sender, instance, **kwargs):
+    template_registry.invalidate(instance.template_id)
+
+
+@receiver(post_save, sender=FormFields)
+@receiver(post_delete, sender=FormFields)
+@receiver(post_save, sender=FormAggrgateFields)
+@receiver(post_delete, sender=FormAggrgateFields)
+def reset_template_rollup(sender, instance, **kwargs):
+    rollup.reset_rollup(instance.template_id)
+
+
+@receiver(post_save, sender=Org)
+@receiver(post_delete, sender=Org)
+@receiver(post_save, sender=Services)
+@receiver(post_delete, sender=Services)
+@receiver(post_save, sender=Customer)
+@receiver(post_delete, sender=Customer)
+@receiver(post_save, sender=Goods)
+@receiver(post_delete, sender=Goods)
+def invalidate_template_data(sender, instance, **kwargs):
+    # 通用数据接口的批量写入由 data_changed 处理，这里处理其他应用接口中的单条写入
+    result_cache.invalidate_instance_data(instance)
@@ -7,11 +7,7 @@
 import re
 from celery import shared_task
 from celery.utils.log import get_task_logger
-from service.models import Services
-from org.models import Org
-from customer.models import Customer
-from goods.models import Goods
-from formtemplate.models import FormTemplate, FormFields, FormData
+from formtemplate.models import FormTemplate
 from baseconfig.models import BaseConfigFileUpload
 
 try:
@@ -33,30 +29,27 @@ def related_delete(template_id: str, obj_id: str):
         obj_id (str): 关联对象ID
 
     此任务会：
-    1. 查找所有使用该模板ID的关联字段
-    2. 清除相关模型中的obj_id引用
+    1. 查找所有引用该模板的模板
+    2. 清除这些模板数据中的obj_id引用
     3. 删除相关的文件上传记录
     """
-    logger = get_task_logger('formtemplate.tasks.related_delete')
-
-    # 查找所有使用该模板ID的关联字段
-    rel_objs = FormFields.objects.filter(related_template_id=template_id, col_name='obj_id').values('template_id').distinct()
-    if rel_objs:
-        # 清除相关模型中的obj_id引用
-        FormData.objects.filter(obj_id=obj_id).update(obj_id=None)
-        Services.objects.filter(obj_id=obj_id).update(obj_id=None)
-        Org.objects.filter(obj_id=obj_id).update(obj_id=None)
-        Customer.objects.filter(obj_id=obj_id).update(obj_id=None)
-        Goods.objects.filter(obj_id=obj_id).update(obj_id=None)
-    logger.info(f'related delete {obj_id} success')
-
-    # 删除相关的文件上传记录
-    for bcf in BaseConfigFileUpload.objects.filter(template_id=template_id, obj_id=obj_id):
-        try:
-            bcf.file.delete()
-            bcf.delete()
-        except Exception as e:
-            logger.error(f'delete file {bcf.file} error: {e}', exc_info=True)
+    from formtemplate.cascade import related_delete as _related_delete
+    _related_delete(template_id, [obj_id])
+
+
+@shared_task
+def related_delete_batch(template_id: str, obj_ids: list):
+    """
+    批量删除与指定模板和对象ID列表相关的所有关联数据。
+
+    Args:
+        template_id (str): 表单模板ID
+        obj_ids (list): 关联对象ID列表
+
+    按引用关系每张数据表每批只执行一条 UPDATE，文件记录按批删除。
+    """
+    from formtemplate.cascade import related_delete as _related_delete
+    _related_delete(template_id, obj_ids)
 
 
 @shared_task
@@ -100,3 +93,80 @@ def update_file_template_and_llm(template_id: str, obj_id: str):
         for file_id in files.values_list('id', flat=True):
             create_dify_document_from_file.delay(file_id)
             # create_dify_document_from_file(file_id)
+
+
+@shared_task
+def fetl_push_data_batch(template_id: str, data_ids: list):
+    """
+    批量推送新增数据到 fetl。
+
+    Args:
+        template_id (str): 表单模板ID
+        data_ids (list): 数据ID列表
+
+    批量新增时只投递一个任务，由本任务在 worker 中逐条调用 fetl_push_data。
+    """
+    logger = get_task_logger('formtemplate.tasks.fetl_push_data_batch')
+    try:
+        from fetl.tasks import fetl_push_data
+    except ImportError as e:
+        logger.error(f'fetl_push_data_batch error: {e}')
+        return
+    for data_id in data_ids:
+        try:
+            fetl_push_data(template_id, data_id)
+        except Exception as e:
+            logger.error(f'fetl push {template_id} {data_id} error: {e}', exc_info=True)
+
+
+@shared_task
+def refresh_template_rollup(template_id: str, days: list = None):
+    """
+    重新计算模板的聚合预计算结果。
+
+    Args:
+        template_id (str): 表单模板ID
+        days (list): 需要重新计算的日期（ISO格式字符串）列表，为空时全部重建
+    """
+    import datetime
+    from formtemplate.rollup import rebuild_rollup
+    if days is not None:
+        days = [datetime.date.fromisoformat(i) for i in days]
+    rebuild_rollup(template_id, days)
+
+
+@shared_task
+def reconcile_rollups():
+    """
+    定时核对聚合预计算结果。
+
+    为每个启用预计算的模板重新计算最近几天的分桶，覆盖绕过通用数据接口写入的数据。
+    """
+    from formtemplate.rollup import reconcile_rollups as _reconcile_rollups
+    _reconcile_rollups()
+
+
+@shared_task(bind=True)
+def run_report_job(self, job_id: str):
+    """
+    执行报表异步查询。
+
+    Args:
+        job_id (str): 报表异步查询任务ID
+
+    报表的并发名额已满时任务保持排队状态，稍后重试，超过最大重试次数后任务失败。
+    """
+    from formtemplate.report_jobs import run_job, fail_job, REPORT_JOB_RETRY_DELAY, REPORT_JOB_MAX_RETRIES
+    if run_job(job_id):
+        return
+    if self.request.retries >= REPORT_JOB_MAX_RETRIES:
+        fail_job(job_id, 'report job concurrency limit exceeded')
+        return
+    raise self.retry(countdown=REPORT_JOB_RETRY_DELAY, max_retries=REPORT_JOB_MAX_RETRIES)
+
+
+@shared_task
+def clean_report_jobs():
+    """定时删除过期的报表异步查询任务及其结果文件。"""
+    from formtemplate.report_jobs import clean_jobs
+    clean_jobs()
@@ -1,3 +1,142 @@
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.exceptions import ValidationError
 
-# Create your tests here.
+from . import cascade
+from .api import iterfetchchunks
+from .models import FormTemplate, FormFields, FormData
+from .registry import template_registry
+
+SYS_ID = 9003
+
+
+class IterFetchChunksTestCase(TestCase):
+    """报表服务端游标分批读取"""
+
+    def test_header_and_chunks(self):
+        chunks = iterfetchchunks('SELECT n, n * 2 AS m FROM generate_series(1, 5) AS n', chunk_size=2)
+        self.assertEqual(next(chunks), ['n', 'm'])
+        self.assertEqual([list(rows) for rows in chunks], [
+            [(1, 2), (2, 4)],
+            [(3, 6), (4, 8)],
+            [(5, 10)],
+        ])
+
+    def test_args(self):
+        chunks = iterfetchchunks('SELECT n FROM generate_series(1, %s) AS n WHERE n > %s', [4, 2], chunk_size=10)
+        self.assertEqual(next(chunks), ['n'])
+        self.assertEqual([list(rows) for rows in chunks], [[(3,), (4,)]])
+
+    def test_empty_result(self):
+        chunks = iterfetchchunks('SELECT 1 AS n WHERE false')
+        self.assertEqual(next(chunks), ['n'])
+        self.assertEqual(list(chunks), [])
+
+
+class DataBulkCreateTestCase(TestCase):
+    """通用数据批量新增"""
+
+    def setUp(self):
+        self.template = FormTemplate.objects.create(sys_id=SYS_ID, title='bulk create', api_name='formdata')
+        FormFields.objects.create(
+            sys_id=SYS_ID, template=self.template, col_title='编号', col_name='field_01',
+            widget='input', widget_attr='', verify_exp='', is_required=False, unique=True,
+        )
+        FormFields.objects.create(
+            sys_id=SYS_ID, template=self.template, col_title='名称', col_name='field_02',
+            widget='input', widget_attr='', verify_exp='', is_required=False,
+        )
+        self.serializer_class = template_registry.get(self.template.pk).create_serializer_class
+
+    def make_data(self, count, start=0):
+        return [
+            {
+                'template_id': self.template.pk, 'sys_id': SYS_ID, 'org_id': 1,
+                'field_01': f'no-{i}', 'field_02': f'name-{i}',
+            }
+            for i in range(start, start + count)
+        ]
+
+    def create(self, data):
+        serializer = self.serializer_class(data=data, many=True)
+        serializer.is_valid(raise_exception=True)
+        return serializer.save()
+
+    def test_create(self):
+        objs = self.create(self.make_data(3))
+        self.assertEqual(FormData.objects.filter(template=self.template).count(), 3)
+        # 主键在写入前生成，返回的对象与数据库中的数据一致
+        for obj in objs:
+            saved = FormData.objects.get(pk=obj.pk)
+            self.assertEqual(saved.field_02, obj.field_02)
+            self.assertEqual(saved.src_id, 1)
+
+    def test_query_count(self):
+        # 唯一字段检查和写入的查询次数与数据条数无关
+        with CaptureQueriesContext(connection) as small:
+            self.create(self.make_data(2))
+        with self.assertNumQueries(len(small)):
+            self.create(self.make_data(10, start=2))
+
+    def test_duplicate_in_batch(self):
+        data = self.make_data(2)
+        data[1]['field_01'] = data[0]['field_01']
+        with self.assertRaises(ValidationError):
+            self.create(data)
+        self.assertFalse(FormData.objects.filter(template=self.template).exists())
+
+    def test_duplicate_existing(self):
+        self.create(self.make_data(2))
+        with self.assertRaises(ValidationError):
+            self.create(self.make_data(2, start=1))
+        self.assertEqual(FormData.objects.filter(template=self.template).count(), 2)
+        # 唯一字段按 org_id 区分
+        data = self.make_data(2)
+        for item in data:
+            item['org_id'] = 2
+        self.create(data)
+        self.assertEqual(FormData.objects.filter(template=self.template).count(), 4)
+
+
+class CascadeDeleteTestCase(TestCase):
+    """通用数据删除后的关联清理"""
+
+    def setUp(self):
+        self.parent = FormTemplate.objects.create(sys_id=SYS_ID, title='parent', api_name='formdata')
+        self.child = FormTemplate.objects.create(sys_id=SYS_ID, title='child', api_name='formdata')
+        self.other = FormTemplate.objects.create(sys_id=SYS_ID, title='other', api_name='formdata')
+        FormFields.objects.create(
+            sys_id=SYS_ID, template=self.child, col_title='上级', col_name='obj_id',
+            widget='input', widget_attr='', verify_exp='', related_template=self.parent,
+        )
+        self.parent_ids = [FormData.objects.create(sys_id=SYS_ID, template=self.parent).pk for _ in range(3)]
+
+    def create_children(self, template):
+        return [FormData.objects.create(sys_id=SYS_ID, template=template, obj_id=i).pk for i in self.parent_ids]
+
+    def test_clear_references(self):
+        child_ids = self.create_children(self.child)
+        other_ids = self.create_children(self.other)
+        deleted = self.parent_ids[:2]
+        self.assertEqual(cascade.clear_references(self.parent.pk, deleted), 2)
+        self.assertEqual(
+            list(FormData.objects.filter(pk__in=child_ids).order_by('obj_id').values_list('obj_id', flat=True)),
+            [self.parent_ids[2], None, None],
+        )
+        # 未引用该模板的模板数据不受影响
+        self.assertEqual(
+            sorted(FormData.objects.filter(pk__in=other_ids).values_list('obj_id', flat=True)),
+            sorted(self.parent_ids),
+        )
+
+    def test_delete_files(self):
+        from baseconfig.models import BaseConfigFileUpload
+        for obj_id in self.parent_ids:
+            BaseConfigFileUpload.objects.create(sys_id=SYS_ID, template=self.parent, obj_id=obj_id)
+        BaseConfigFileUpload.objects.create(sys_id=SYS_ID, template=self.other, obj_id=self.parent_ids[0])
+        self.assertEqual(cascade.delete_files(self.parent.pk, self.parent_ids[:2]), 2)
+        self.assertEqual(
+            list(BaseConfigFileUpload.objects.filter(sys_id=SYS_ID).order_by('obj_id').values_list('template_id', 'obj_id')),
+            [(self.other.pk, self.parent_ids[0]), (self.parent.pk, self.parent_ids[2])],
+        )
@@ -11,6 +11,7 @@ router.register(r'formtemplatemin', api.FormTemplateMinViewSet)
 router.register(r'formtemplatecode', api.FormTemplateCodeViewSet)
 router.register(r'formaggrgatefields', api.FormAggrgateFieldsViewSet)
 router.register(r'reportconf', api.FormDataReportConfViewSet)
+router.register(r'reportjob', api.FormDataReportJobViewSet)
 router.register(r'formtemplatecopy', api.FormTemplateCopyViewSet)
 router.register(r'data', api.DataViewSet)
 router.register(r'datafind', api.DataFindViewSet)
@@ -22,7 +23,9 @@ router.register(r'data-aggregate', api.DataAggregateViewSet)
 urlpatterns = (
     path('api/v1/', include(router.urls)),
     path('api/v1/data-delete-one/', api.data_delete_one),
+    path('api/v1/data-export/', api.DataExportView.as_view()),
     path('api/v1/formdatareport/<int:report_id>/', api.FormDataReportView.as_view()),
     path('api/v1/reportcomp/<int:report_id>/', api.FormDataReportCompressionView.as_view()),
+    path('api/v1/reportjob/<str:pk>/download/', api.FormDataReportJobDownloadView.as_view()),
     path('api/v1/testreport/', api.FormDataReportTestView.as_view()),
 )
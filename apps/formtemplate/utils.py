@@ -1,7 +1,9 @@
 import json
 import csv
 import io
-from typing import List, Dict, Any, Optional, Type
+import datetime
+from typing import List, Dict, Any, Optional, Type, Tuple, Iterator
+from django.conf import settings
 from django.db.models import ForeignKey, DO_NOTHING, Model
 from django.db.models.base import ModelBase
 from baseconfig.models import BaseTree, copy_tree_node
@@ -9,6 +11,10 @@ from system.models import SystemOrg
 from .const import M2M_MODELS_CHOICES
 
 from .models import FormTemplate, FormFields, ManyToManyData
+from .registry import template_registry
+
+# 导出时服务端游标每批读取的行数
+EXPORT_CHUNK_SIZE = getattr(settings, 'FORMTEMPLATE_EXPORT_CHUNK_SIZE', 2000)
 
 
 def copy_base_tree_with_params(params: Dict[str, Any], old_sys_id: int, new_sys_id: int) -> Dict[str, any]:
@@ -95,6 +101,8 @@ def copy_field(old_form_template, new_form_template):
         copy_field_data_source(field, old_form_template.sys_id)
         form_fields_bulk.append(field)
     FormFields.objects.bulk_create(form_fields_bulk)
+    # bulk_create 不触发 post_save，需要手动使新模板的编译结果失效
+    template_registry.invalidate(new_form_template.pk)
 
 
 def copy_template(form_id, target_id, new_title=None, creator=None):
@@ -214,6 +222,87 @@ def build_template_proxy_model(template: 'FormTemplate', app_label='formtemplate
     )  # type: ignore
 
 
+def get_template_export_columns(template: 'FormTemplate', exclude_columns: Optional[List[str]] = None) -> List[Tuple[str, FormFields]]:
+    """
+    返回模板导出使用的 (查询路径, 模板字段) 列表。
+
+    关联字段（is_related）通过代理模型的 obj 外键以 `obj__字段名` 连表取值，
+    模型中不存在的字段不导出。
+    """
+    if exclude_columns is None:
+        exclude_columns = []
+    compiled = template_registry.get(template.pk)
+    model = compiled.proxy_model
+    has_obj = model is not compiled.model
+    field_names = set()
+    for f in model._meta.concrete_fields:
+        field_names.add(f.name)
+        field_names.add(f.attname)
+    columns = []
+    for field in compiled.template.all_fields:
+        if field.field_alias in exclude_columns:
+            continue
+        if field.is_related:
+            if not has_obj:
+                continue
+            path = f'obj__{field.col_name}'
+        elif field.col_name in field_names:
+            path = field.col_name
+        else:
+            continue
+        columns.append((path, field))
+    return columns
+
+
+def iter_template_data_rows(queryset, columns: List[Tuple[str, FormFields]], chunk_size=EXPORT_CHUNK_SIZE) -> Iterator[tuple]:
+    """使用服务端游标分批读取导出数据，不缓存整个查询集"""
+    paths = [path for path, _ in columns]
+    return queryset.values_list(*paths).iterator(chunk_size=chunk_size)
+
+
+def export_cell_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, datetime.datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(value, datetime.date):
+        return value.strftime('%Y-%m-%d')
+    return value
+
+
+class Echo(object):
+    """csv.writer 使用的伪文件对象，write 直接返回写入的内容"""
+
+    def write(self, value):
+        return value
+
+
+def iter_template_data_csv(queryset, columns: List[Tuple[str, FormFields]], header='title') -> Iterator[str]:
+    """逐行生成 CSV 文本，用于 StreamingHttpResponse"""
+    writer = csv.writer(Echo())
+    yield '\ufeff'
+    if header == 'alias':
+        yield writer.writerow([f.field_alias for _, f in columns])
+    else:
+        yield writer.writerow([f.col_title for _, f in columns])
+    for row in iter_template_data_rows(queryset, columns):
+        yield writer.writerow([export_cell_value(v) for v in row])
+
+
+def write_template_data_xlsx(file, queryset, columns: List[Tuple[str, FormFields]], header='title', title='Sheet'):
+    """以 write_only 模式逐行写入 xlsx 文件，内存占用与数据量无关"""
+    from openpyxl import Workbook
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title=title[:31] or 'Sheet')
+    if header == 'alias':
+        ws.append([f.field_alias for _, f in columns])
+    else:
+        ws.append([f.col_title for _, f in columns])
+    for row in iter_template_data_rows(queryset, columns):
+        ws.append(list(row))
+    wb.save(file)
+
+
 def template_data_to_csv(template: 'FormTemplate', org_id=None, exclude_columns: Optional[List[str]] = None) -> str:
     if exclude_columns is None:
         exclude_columns = []
@@ -2,12 +2,21 @@ from rest_framework.viewsets import ModelViewSet, GenericViewSet
 from rest_framework.mixins import CreateModelMixin, ListModelMixin
 from rest_framework.permissions import IsAuthenticatedOrReadOnly
 from rest_framework.response import Response
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import JSONParser
 from django_filters.rest_framework.backends import DjangoFilterBackend
-from rest_framework.utils.json import dumps, loads
 from django_redis import get_redis_connection
+from usercenter.permissions import IsSuperuser
 from . import serializers
 from . import models
 from . import filters
+from . import ingest
+from . import buffer
+from . import utils
+from . import geofence
+from . import partitions
+from .parsers import NDJSONParser
 
 
 cache = get_redis_connection("default")
@@ -42,26 +51,7 @@ class LastPointViewSet(CreateModelMixin, GenericViewSet):
         """
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        data = serializer.data
-        sys_id = data['sys_id']
-        org_id = data['org_id']
-        sn_list = data['sn']
-        points = {}
-        for i in sn_list:
-            if not i:
-                continue
-            val = cache.get(f'gps-point-{i}')
-            val = loads(val) if val else None
-            if val and isinstance(val, dict) and \
-               val.get('sys_id') == sys_id and \
-               val.get('org_id') == org_id:
-                points[i] = val
-            elif val is None:
-                val = models.Point.objects.filter(sn=i).order_by('-create_time').first()
-                if val:
-                    points[i] = serializers.PointSerializer(instance=val).data
-            else:
-                points[i] = val
+        points = utils.get_last_point_map(serializer.data['sn'])
         return Response(points)
 
 
@@ -82,31 +72,53 @@ class RefreshLastPointViewSet(CreateModelMixin, GenericViewSet):
         sys_id = data['sys_id']
         org_id = data['org_id']
         sn_list = data['sn']
-        sql = """
-            with T as (
-              select
-                *,
-                row_number() over (
-                  partition by fd.sn
-                  order by
-                    fd.create_time desc
-                ) as rownum
-              from
-                gps_point as fd
-              where
-                fd.org_id = %s and 
-                fd.sys_id = %s and
-                fd.sn in %s
-            )
-            select * from T where rownum = 1
-        """
-        qs = models.Point.objects.raw(sql, (org_id, sys_id, tuple(sn_list),))
-        cache = get_redis_connection("default")
-        for i in qs:
-            cache.set(f'gps-point-{i.sn}', dumps(serializers.PointSerializer(instance=i).data))
+        utils.refresh_last_point(sys_id, org_id, sn_list)
         return Response('success')
 
 
+class PointBatchViewSet(CreateModelMixin, GenericViewSet):
+    """定位点批量写入API gps_point"""
+    queryset = models.Point.objects.none()
+    permission_classes = [IsAuthenticatedOrReadOnly]
+    serializer_class = serializers.PointSerializer
+    parser_classes = [JSONParser, NDJSONParser]
+
+    def create(self, request, *args, **kwargs):
+        """批量写入定位点
+
+        请求体为定位点数组（application/json），或每行一个定位点（application/x-ndjson），
+        定位点结构同 gps-point API；也可使用 `{"points": [...]}`。
+
+        全部定位点校验通过后在一个事务内写入（启用写入缓冲时写入缓冲后返回 202），
+        `返回值结构`：`{"success": true, "count": 100}`
+        """
+        items = request.data
+        if isinstance(items, dict):
+            items = items.get('points')
+        if not isinstance(items, list) or not items:
+            raise ValidationError('请提交定位点数组')
+        if len(items) > ingest.GPS_BATCH_MAX_POINTS:
+            raise ValidationError(f'每次最多提交 {ingest.GPS_BATCH_MAX_POINTS} 个定位点')
+        serializer = self.get_serializer(data=items, many=True)
+        serializer.is_valid(raise_exception=True)
+        if buffer.GPS_WRITE_BEHIND:
+            points = buffer.enqueue_points(serializer.validated_data)
+            return Response({'success': True, 'count': len(points)}, status=status.HTTP_202_ACCEPTED)
+        points = [models.Point(**attrs) for attrs in serializer.validated_data]
+        ingest.save_points(points)
+        return Response({'success': True, 'count': len(points)}, status=status.HTTP_201_CREATED)
+
+
+class PointBufferStatsViewSet(GenericViewSet):
+    """定位数据写入缓冲状态API"""
+    queryset = models.Point.objects.none()
+    permission_classes = [IsSuperuser]
+
+    def list(self, request, *args, **kwargs):
+        """缓冲积压消息数 `length`、最早积压消息距今秒数 `lag_seconds`、最近一次写入时间和数量"""
+        return Response(buffer.get_stats())
+
+
 class PointViewSet(ModelViewSet):
     """地图标记记录API gps_point geo_type='point'"""
     queryset = models.Point.objects.order_by('-create_time')
@@ -115,15 +127,22 @@ class PointViewSet(ModelViewSet):
     filter_backends = (DjangoFilterBackend,)
     filterset_class = filters.PointFilterSet
 
+    def create(self, request, *args, **kwargs):
+        """启用写入缓冲时定位点写入缓冲后立即返回 202"""
+        if not buffer.GPS_WRITE_BEHIND:
+            return super().create(request, *args, **kwargs)
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        point = buffer.enqueue_points([serializer.validated_data])[0]
+        return Response(self.get_serializer(point).data, status=status.HTTP_202_ACCEPTED)
+
     def perform_create(self, serializer: serializers.PointSerializer):
         instance = serializer.save()
-        data = serializer.data
-        cache.set(f'gps-point-{instance.sn}', dumps(data))
+        ingest.record_last_points([instance])
 
     def perform_update(self, serializer):
         instance = serializer.save()
-        data = serializer.data
-        cache.set(f'gps-point-{instance.sn}', dumps(data))
+        ingest.record_last_points([instance])
 
 
 class PointFindViewSet(PointViewSet):
@@ -172,3 +191,86 @@ class PolygonViewSet(ModelViewSet):
     serializer_class = serializers.PolygonSerializer
     filter_backends = (DjangoFilterBackend,)
     filterset_class = filters.PolygonFilterSet
+
+
+class GeofenceContainsViewSet(CreateModelMixin, GenericViewSet):
+    """电子围栏：包含定位点的多边形API"""
+    queryset = models.Polygon.objects.none()
+    permission_classes = [IsAuthenticatedOrReadOnly]
+    serializer_class = serializers.GeofenceContainsSerializer
+
+    def create(self, request, *args, **kwargs):
+        """批量查询包含定位点的多边形
+
+        `points` 为定位点数组，按顺序返回包含每个定位点的多边形ID数组，`返回值结构`：
+        `[["point-...", "point-..."], [], ...]`
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        if len(data['points']) > ingest.GPS_BATCH_MAX_POINTS:
+            raise ValidationError(f'每次最多提交 {ingest.GPS_BATCH_MAX_POINTS} 个定位点')
+        return Response(geofence.find_containing(
+            data['sys_id'], data['org_id'], data['points'], data['category']
+        ))
+
+
+class GeofencePointsViewSet(CreateModelMixin, GenericViewSet):
+    """电子围栏：多边形内的定位点API"""
+    queryset = models.Point.objects.order_by('client_time')
+    permission_classes = [IsAuthenticatedOrReadOnly]
+    serializer_class = serializers.GeofencePointsSerializer
+
+    def create(self, request, *args, **kwargs):
+        """查询客户端时间范围内位于多边形内的定位点，可按 sn（可多个）过滤
+
+        按客户端时间排序返回定位点数组，结构同 gps-point API
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        polygon = models.Polygon.objects.filter(pk=data['polygon']).first()
+        if not polygon:
+            return Response({}, status=404)
+        start, end = data['client_time_after'], data['client_time_before']
+        qs = self.get_queryset().filter(
+            sys_id=polygon.sys_id, org_id=polygon.org_id, client_time__gte=start, client_time__lte=end
+        )
+        if data.get('sn'):
+            qs = qs.filter(sn__in=data['sn'])
+        qs = partitions.prune_by_client_time(qs, slice(start, end))
+        points = geofence.points_within(polygon, qs)
+        return Response(serializers.PointSerializer(points, many=True).data)
+
+
+class GeofenceEventsViewSet(CreateModelMixin, GenericViewSet):
+    """电子围栏：进出事件API"""
+    queryset = models.Point.objects.order_by('client_time')
+    permission_classes = [IsAuthenticatedOrReadOnly]
+    serializer_class = serializers.GeofenceEventsSerializer
+
+    def create(self, request, *args, **kwargs):
+        """按设备轨迹计算进出围栏事件
+
+        以时间范围开始前的最后一个定位点所在的多边形为初始状态，`返回值结构`：
+
+        ```
+        [
+          {"polygon": "point-...", "event": "enter", "point": {... 同 gps-point API 数据结构}},
+          {"polygon": "point-...", "event": "exit", "point": {...}}
+        ]
+        ```
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        start, end = data['client_time_after'], data['client_time_before']
+        index = geofence.get_index(data['sys_id'], data['org_id'], data['category'])
+        qs = self.get_queryset().filter(sys_id=data['sys_id'], org_id=data['org_id'], sn=data['sn'])
+        previous = qs.filter(client_time__lt=start).order_by('-client_time').first()
+        track = partitions.prune_by_client_time(
+            qs.filter(client_time__gte=start, client_time__lte=end), slice(start, end)
+        )[:geofence.GPS_GEOFENCE_MAX_POINTS]
+        events = geofence.detect_events(index, track, index.containing(previous) if previous else ())
+        points = serializers.PointSerializer([i['point'] for i in events], many=True).data
+        return Response([{**event, 'point': point} for event, point in zip(events, points)])
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class GpsConfig(AppConfig):
     name = 'gps'
+
+    def ready(self):
+        import gps.signal_handlers
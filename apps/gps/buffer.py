@@ -0,0 +1,169 @@
+"""
+定位数据写入缓冲（write-behind）。
+
+设置 `GPS_WRITE_BEHIND = True` 后，定位点接口校验通过即写入 Redis Stream 并立即返回，
+最后定位缓存同时更新；celery 任务或 `gps_flush_buffer` 命令以消费组读取缓冲，
+批量写入 gps_point，数据库事务提交后再确认（XACK）并删除消息。
+
+进程异常退出时未确认的消息保留在消费组的待处理列表中，超过空闲时间后由其他消费者接管重新写入，
+定位点主键和服务器时间（create_time）在写入缓冲时生成，重复写入时忽略冲突（分区表主键为 id, create_time）。
+
+缓冲中的消息数超过 `GPS_BUFFER_MAX_LENGTH` 时接口返回 429，由设备稍后重试。
+"""
+
+import os
+import json
+import time
+import socket
+import logging
+from typing import List, Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django_redis import get_redis_connection
+from redis.exceptions import ResponseError
+from rest_framework.exceptions import Throttled
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework.utils.json import dumps
+
+from . import models
+from . import ingest
+
+logger = logging.getLogger('restapi')
+
+# 是否启用写入缓冲
+GPS_WRITE_BEHIND = getattr(settings, 'GPS_WRITE_BEHIND', False)
+# 缓冲中最多保留的消息数量，超过后拒绝写入
+GPS_BUFFER_MAX_LENGTH = getattr(settings, 'GPS_BUFFER_MAX_LENGTH', 1000000)
+# 拒绝写入时建议设备重试的等待时间（秒）
+GPS_BUFFER_RETRY_AFTER = getattr(settings, 'GPS_BUFFER_RETRY_AFTER', 10)
+# 每批从缓冲读取并写入数据库的消息数量
+GPS_BUFFER_BATCH_SIZE = getattr(settings, 'GPS_BUFFER_BATCH_SIZE', 5000)
+# 未确认的消息空闲超过该时间（毫秒）后由其他消费者接管
+GPS_BUFFER_CLAIM_IDLE = getattr(settings, 'GPS_BUFFER_CLAIM_IDLE', 60 * 1000)
+
+STREAM_KEY = 'gps:point-stream'
+STATS_KEY = 'gps:point-stream:stats'
+GROUP_NAME = 'gps-point-writer'
+
+
+def get_connection():
+    return get_redis_connection('default')
+
+
+def get_consumer_name() -> str:
+    return f'{socket.gethostname()}-{os.getpid()}'
+
+
+def enqueue_points(items: List[dict]) -> List[models.Point]:
+    """把校验后的定位点写入缓冲，返回未保存的定位点（已生成主键）"""
+    r = get_connection()
+    if r.xlen(STREAM_KEY) + len(items) > GPS_BUFFER_MAX_LENGTH:
+        raise Throttled(wait=GPS_BUFFER_RETRY_AFTER, detail='定位数据写入繁忙，请稍后重试')
+    now = timezone.now()
+    points = []
+    pipe = r.pipeline(transaction=False)
+    for attrs in items:
+        point = models.Point(**attrs)
+        point.create_time = now
+        points.append(point)
+        pipe.xadd(STREAM_KEY, {'data': dumps({**attrs, 'id': point.pk, 'create_time': now}, cls=JSONEncoder)})
+    pipe.execute()
+    ingest.update_last_points(points)
+    return points
+
+
+def ensure_group(r):
+    try:
+        r.xgroup_create(STREAM_KEY, GROUP_NAME, id='0', mkstream=True)
+    except ResponseError as e:
+        if 'BUSYGROUP' not in str(e):
+            raise
+
+
+def build_points(messages) -> List[models.Point]:
+    point_fields = {f.attname: f for f in models.Point._meta.concrete_fields}
+    points = []
+    for msg_id, fields in messages:
+        try:
+            data = json.loads(fields[b'data'])
+            # 时间等字段在消息中为字符串，按字段类型还原
+            points.append(models.Point(**{
+                k: point_fields[k].to_python(v) for k, v in data.items() if k in point_fields
+            }))
+        except Exception as e:
+            # 无法解析的消息记录日志后直接确认，避免反复处理
+            logger.error(f'gps buffer message {msg_id} invalid: {e}', exc_info=e)
+    return points
+
+
+def write_messages(r, messages) -> int:
+    """写入一批消息，事务提交后确认并删除消息"""
+    points = build_points(messages)
+    with transaction.atomic():
+        models.Point.objects.bulk_create(
+            points, batch_size=ingest.GPS_BULK_CREATE_BATCH_SIZE, ignore_conflicts=True
+        )
+        # 最后定位缓存已在写入缓冲时更新
+        ingest.record_last_points(points, update_cache=False)
+    ids = [msg_id for msg_id, _ in messages]
+    pipe = r.pipeline(transaction=False)
+    pipe.xack(STREAM_KEY, GROUP_NAME, *ids)
+    pipe.xdel(STREAM_KEY, *ids)
+    pipe.hincrby(STATS_KEY, 'flushed_total', len(points))
+    pipe.hset(STATS_KEY, mapping={'last_flush_time': time.time(), 'last_flush_count': len(points)})
+    pipe.execute()
+    return len(points)
+
+
+def claim_stale(r, consumer: str):
+    """接管其他消费者异常退出后遗留的未确认消息"""
+    result = r.xautoclaim(
+        STREAM_KEY, GROUP_NAME, consumer, GPS_BUFFER_CLAIM_IDLE, start_id='0-0', count=GPS_BUFFER_BATCH_SIZE
+    )
+    return result[1] if result else []
+
+
+def flush(max_seconds: Optional[float] = None, block_ms: Optional[int] = None) -> int:
+    """读取缓冲写入数据库，直到缓冲为空或超过 max_seconds，返回写入的定位点数量"""
+    r = get_connection()
+    ensure_group(r)
+    consumer = get_consumer_name()
+    deadline = time.monotonic() + max_seconds if max_seconds else None
+    total = 0
+    messages = claim_stale(r, consumer)
+    while True:
+        if not messages:
+            resp = r.xreadgroup(GROUP_NAME, consumer, {STREAM_KEY: '>'}, count=GPS_BUFFER_BATCH_SIZE, block=block_ms)
+            messages = resp[0][1] if resp else []
+        if not messages:
+            break
+        total += write_messages(r, messages)
+        messages = []
+        if deadline and time.monotonic() > deadline:
+            break
+    if total:
+        logger.info(f'gps buffer flushed {total} points, lag {get_stats().get("lag_seconds")}s')
+    return total
+
+
+def get_stats() -> dict:
+    """缓冲状态：积压消息数、最早一条积压消息距今的秒数、最近一次写入的时间和数量"""
+    r = get_connection()
+    length = r.xlen(STREAM_KEY)
+    lag = 0.0
+    if length:
+        oldest = r.xrange(STREAM_KEY, count=1)
+        if oldest:
+            lag = max(time.time() - int(oldest[0][0].split(b'-')[0]) / 1000, 0)
+    stats = {k.decode(): v.decode() for k, v in r.hgetall(STATS_KEY).items()}
+    return {
+        'enabled': GPS_WRITE_BEHIND,
+        'length': length,
+        'max_length': GPS_BUFFER_MAX_LENGTH,
+        'lag_seconds': round(lag, 3),
+        'flushed_total': int(stats.get('flushed_total', 0)),
+        'last_flush_time': float(stats['last_flush_time']) if 'last_flush_time' in stats else None,
+        'last_flush_count': int(stats.get('last_flush_count', 0)),
+    }
@@ -1,6 +1,7 @@
 import django_filters
 from utility.filter_fields import CharInFilter
 from . import models
+from . import partitions
 
 
 class PointFilterSet(django_filters.FilterSet):
@@ -31,6 +32,13 @@ class PointFilterSet(django_filters.FilterSet):
             'sn',
         )
 
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        # 只按客户端时间查询时补充服务器时间下限，分区表只扫描相关分区
+        if not self.form.cleaned_data.get('create_time'):
+            queryset = partitions.prune_by_client_time(queryset, self.form.cleaned_data.get('client_time'))
+        return queryset
+
 
 class PointTimeFilterSet(django_filters.FilterSet):
     time_point = django_filters.DateTimeFilter(method='filter_time_point')
@@ -0,0 +1,233 @@
+"""
+电子围栏计算。
+
+多边形的 line 解析后生成 Shapely 几何对象及 prepared 几何对象，按多边形缓存在进程内，
+line 未变化时直接复用；按 (sys_id, org_id, category) 构建 STRtree 空间索引，
+先按外包矩形筛选候选多边形，再用 prepared 几何对象精确判断。
+
+多边形保存、删除后递增 (sys_id, org_id) 的版本号，各进程发现版本号变化后重建索引。
+"""
+
+import json
+import time
+import logging
+import threading
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from . import models
+
+logger = logging.getLogger('restapi')
+
+# 进程内缓存的多边形几何对象数量上限
+GPS_GEOFENCE_GEOMETRY_MAXSIZE = getattr(settings, 'GPS_GEOFENCE_GEOMETRY_MAXSIZE', 100000)
+# 按时间范围查询多边形内定位点时最多返回的数量
+GPS_GEOFENCE_MAX_POINTS = getattr(settings, 'GPS_GEOFENCE_MAX_POINTS', 10000)
+
+FENCE_VERSION_KEY = 'gps:geofence-version:{}:{}'
+
+
+class Geometry(object):
+    """多边形的几何对象，polygon 为 Shapely Polygon，prepared 用于重复判断"""
+
+    def __init__(self, line: str, polygon):
+        from shapely.prepared import prep
+        self.line = line
+        self.polygon = polygon
+        self.prepared = prep(polygon)
+        self.bounds = polygon.bounds
+
+    def contains(self, x: float, y: float) -> bool:
+        from shapely.geometry import Point as SPoint
+        minx, miny, maxx, maxy = self.bounds
+        if x < minx or x > maxx or y < miny or y > maxy:
+            return False
+        return self.prepared.contains(SPoint(x, y))
+
+
+_geometries = {}  # type: Dict[str, Geometry]
+_geometries_lock = threading.Lock()
+
+
+def parse_line(line) -> Optional[list]:
+    if not line:
+        return None
+    if isinstance(line, str):
+        try:
+            line = json.loads(line)
+        except ValueError:
+            return None
+    if not isinstance(line, list) or len(line) < 3:
+        return None
+    return line
+
+
+def build_geometry(line) -> Optional[Geometry]:
+    from shapely.geometry import Polygon
+    coords = parse_line(line)
+    if coords is None:
+        return None
+    try:
+        polygon = Polygon([[float(i[0]), float(i[1])] for i in coords])
+    except (TypeError, ValueError, IndexError):
+        return None
+    return Geometry(line if isinstance(line, str) else json.dumps(line), polygon)
+
+
+def get_geometry(pk: str, line) -> Optional[Geometry]:
+    """获取多边形的几何对象，line 与缓存中相同时复用"""
+    if pk is None:
+        return build_geometry(line)
+    text = line if isinstance(line, str) or line is None else json.dumps(line)
+    geometry = _geometries.get(pk)
+    if geometry is not None and geometry.line == text:
+        return geometry
+    geometry = build_geometry(line)
+    with _geometries_lock:
+        if geometry is None:
+            _geometries.pop(pk, None)
+        else:
+            if len(_geometries) >= GPS_GEOFENCE_GEOMETRY_MAXSIZE:
+                _geometries.clear()
+            _geometries[pk] = geometry
+    return geometry
+
+
+def discard_geometry(pk: str):
+    with _geometries_lock:
+        _geometries.pop(pk, None)
+
+
+def to_xy(point) -> Optional[Tuple[float, float]]:
+    """定位点转换为 (经度, 纬度)，支持 Point、字典、[经度, 纬度]"""
+    try:
+        if isinstance(point, (list, tuple)):
+            return float(point[0]), float(point[1])
+        if isinstance(point, dict):
+            return float(point['longitude']), float(point['latitude'])
+        return float(point.longitude), float(point.latitude)
+    except (TypeError, ValueError, KeyError, IndexError):
+        return None
+
+
+class FenceIndex(object):
+    """一组多边形的 STRtree 空间索引"""
+
+    def __init__(self, polygons: Sequence[Tuple[str, Geometry]], version=None):
+        from shapely.strtree import STRtree
+        self.version = version
+        self.ids = [pk for pk, _ in polygons]
+        self.geometries = [geometry for _, geometry in polygons]
+        self.tree = STRtree([g.polygon for g in self.geometries]) if polygons else None
+        self._positions = {id(g.polygon): i for i, g in enumerate(self.geometries)}
+
+    def candidates(self, x: float, y: float) -> List[int]:
+        """按外包矩形筛选的候选多边形位置"""
+        from shapely.geometry import Point as SPoint
+        if self.tree is None:
+            return []
+        pt = SPoint(x, y)
+        if hasattr(self.tree, 'query_items'):
+            return list(self.tree.query_items(pt))
+        result = self.tree.query(pt)
+        # Shapely 2 返回位置，更早的版本返回几何对象
+        return [int(i) if not hasattr(i, 'geom_type') else self._positions[id(i)] for i in result]
+
+    def containing(self, point) -> List[str]:
+        """包含该定位点的多边形ID"""
+        xy = to_xy(point)
+        if xy is None:
+            return []
+        return [
+            self.ids[i] for i in sorted(self.candidates(*xy))
+            if self.geometries[i].contains(*xy)
+        ]
+
+
+_local_indexes = {}  # type: Dict[Tuple[int, int, Optional[str]], FenceIndex]
+_local_lock = threading.Lock()
+
+
+def get_version(sys_id: int, org_id: int):
+    key = FENCE_VERSION_KEY.format(sys_id, org_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def get_index(sys_id: int, org_id: int, category: Optional[str] = None) -> FenceIndex:
+    """获取 (sys_id, org_id, category) 的多边形索引，category 为 None 时包含全部类别"""
+    version = get_version(sys_id, org_id)
+    key = (sys_id, org_id, category)
+    index = _local_indexes.get(key)
+    if index is not None and index.version == version:
+        return index
+    qs = models.Polygon.objects.filter(sys_id=sys_id, org_id=org_id)
+    if category is not None:
+        qs = qs.filter(category=category)
+    polygons = []
+    for pk, line in qs.order_by('pk').values_list('pk', 'line'):
+        geometry = get_geometry(pk, line)
+        if geometry is not None:
+            polygons.append((pk, geometry))
+    index = FenceIndex(polygons, version)
+    with _local_lock:
+        _local_indexes[key] = index
+    return index
+
+
+def find_containing(sys_id: int, org_id: int, points: Iterable, category: Optional[str] = None) -> List[List[str]]:
+    """按顺序返回包含每个定位点的多边形ID"""
+    index = get_index(sys_id, org_id, category)
+    return [index.containing(point) for point in points]
+
+
+def points_within(polygon: models.Polygon, queryset, limit: int = GPS_GEOFENCE_MAX_POINTS) -> List[models.Point]:
+    """queryset 中位于多边形内的定位点，queryset 应已按时间范围过滤"""
+    geometry = get_geometry(polygon.pk, polygon.line)
+    if geometry is None:
+        return []
+    result = []
+    for point in queryset.iterator(chunk_size=2000):
+        xy = to_xy(point)
+        if xy is not None and geometry.contains(*xy):
+            result.append(point)
+            if len(result) >= limit:
+                break
+    return result
+
+
+def detect_events(index: FenceIndex, track: Iterable, initial: Iterable[str] = ()) -> List[dict]:
+    """按时间顺序的定位点轨迹计算进出围栏事件，initial 为轨迹开始前所在的多边形"""
+    inside = set(initial)
+    events = []
+    for point in track:
+        if to_xy(point) is None:
+            continue
+        current = set(index.containing(point))
+        for pk in sorted(current - inside):
+            events.append({'polygon': pk, 'event': 'enter', 'point': point})
+        for pk in sorted(inside - current):
+            events.append({'polygon': pk, 'event': 'exit', 'point': point})
+        inside = current
+    return events
+
+
+def invalidate(sys_id: int, org_id: int):
+    """在事务提交后递增 (sys_id, org_id) 的围栏版本号"""
+    transaction.on_commit(lambda: _incr_version(sys_id, org_id))
+
+
+def _incr_version(sys_id: int, org_id: int):
+    key = FENCE_VERSION_KEY.format(sys_id, org_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, time.time_ns(), timeout=None)
+    except Exception as e:
+        logger.error(f'gps geofence invalidate {sys_id}:{org_id} error: {e}', exc_info=e)
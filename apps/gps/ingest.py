@@ -0,0 +1,123 @@
+"""
+定位数据批量写入。
+
+批量接口一次校验全部定位点，在一个事务内 bulk_create 写入 gps_point，
+同一事务内按 sn 只保留每批中最新的定位点更新最后定位表 gps_lastpoint（客户端时间更新的才覆盖），
+事务提交后通过一次 pipeline 以实际更新了最后定位表的定位点更新 Redis 中的最后定位缓存，
+缓存中已有客户端时间更新的定位时同样不覆盖，迟到的定位点不会使缓存比最后定位表旧。
+"""
+
+import logging
+from typing import Iterable, List
+
+from django.conf import settings
+from django.db import connection, transaction
+from django_redis import get_redis_connection
+from rest_framework.utils.json import dumps
+
+from . import models
+from . import serializers
+
+logger = logging.getLogger('restapi')
+
+# 批量接口每次请求最多接收的定位点数量
+GPS_BATCH_MAX_POINTS = getattr(settings, 'GPS_BATCH_MAX_POINTS', 5000)
+# 每条 INSERT 语句写入的定位点数量
+GPS_BULK_CREATE_BATCH_SIZE = getattr(settings, 'GPS_BULK_CREATE_BATCH_SIZE', 1000)
+
+LAST_POINT_KEY = 'gps-point-{}'
+
+# 缓存中已有客户端时间更新的定位时不覆盖；客户端时间为 ISO 8601 格式，可直接按字符串比较
+SET_LAST_POINT_SCRIPT = """
+local current = redis.call('GET', KEYS[1])
+if current then
+    local ok, data = pcall(cjson.decode, current)
+    if ok and type(data) == 'table' and type(data['client_time']) == 'string' and data['client_time'] > ARGV[2] then
+        return 0
+    end
+end
+redis.call('SET', KEYS[1], ARGV[1])
+return 1
+"""
+
+
+def get_newest_points(points: Iterable[models.Point]) -> List[models.Point]:
+    """每个 sn 只保留客户端时间最新的定位点，时间相同时保留后提交的"""
+    newest = {}
+    for point in points:
+        if not point.sn:
+            continue
+        current = newest.get(point.sn)
+        if current is None or point.client_time >= current.client_time:
+            newest[point.sn] = point
+    return list(newest.values())
+
+
+def set_last_point_cache(r, items: Iterable[dict]):
+    """通过一次 pipeline 写入最后定位缓存（PointSerializer 数据），缓存中已有更新的定位时不覆盖"""
+    script = r.register_script(SET_LAST_POINT_SCRIPT)
+    pipe = r.pipeline(transaction=False)
+    for item in items:
+        script(
+            keys=[LAST_POINT_KEY.format(item['sn'])], args=[dumps(item), item.get('client_time') or ''],
+            client=pipe
+        )
+    pipe.execute()
+
+
+def update_last_points(points: Iterable[models.Point]):
+    """更新最后定位缓存"""
+    newest = get_newest_points(points)
+    if not newest:
+        return
+    data = serializers.PointSerializer(newest, many=True).data
+    try:
+        set_last_point_cache(get_redis_connection('default'), data)
+    except Exception as e:
+        logger.error(f'gps update last points error: {e}', exc_info=e)
+
+
+def upsert_last_point_table(points: Iterable[models.Point]) -> List[models.Point]:
+    """按 sn 更新最后定位表，已有记录的客户端时间更新时才覆盖，返回实际写入最后定位表的定位点"""
+    newest = sorted(get_newest_points(points), key=lambda p: p.sn)
+    if not newest:
+        return []
+    table = models.LastPoint._meta.db_table
+    fields = [f for f in models.LastPoint.POINT_FIELDS if f != 'sn']
+    columns = ['sn', 'point_id'] + fields
+    qn = connection.ops.quote_name
+    updates = ', '.join(f'{qn(c)} = EXCLUDED.{qn(c)}' for c in columns[1:])
+    placeholder = '(' + ', '.join(['%s'] * len(columns)) + ')'
+    written = set()
+    with connection.cursor() as cursor:
+        for i in range(0, len(newest), GPS_BULK_CREATE_BATCH_SIZE):
+            batch = newest[i:i + GPS_BULK_CREATE_BATCH_SIZE]
+            params = []
+            for point in batch:
+                params.extend([point.sn, point.pk] + [getattr(point, f) for f in fields])
+            cursor.execute(
+                f'INSERT INTO {qn(table)} ({", ".join(qn(c) for c in columns)}) '
+                f'VALUES {", ".join([placeholder] * len(batch))} '
+                f'ON CONFLICT ({qn("sn")}) DO UPDATE SET {updates} '
+                f'WHERE {qn(table)}.{qn("client_time")} <= EXCLUDED.{qn("client_time")} '
+                f'RETURNING {qn("point_id")}',
+                params
+            )
+            written.update(row[0] for row in cursor.fetchall())
+    return [p for p in newest if str(p.pk) in written]
+
+
+def record_last_points(points: List[models.Point], update_cache: bool = True):
+    """定位点写入后在同一事务内更新最后定位表，事务提交后以写入最后定位表的定位点更新最后定位缓存"""
+    with transaction.atomic():
+        written = upsert_last_point_table(points)
+        if update_cache and written:
+            transaction.on_commit(lambda: update_last_points(written))
+
+
+def save_points(points: List[models.Point]) -> List[models.Point]:
+    """在一个事务内批量写入定位点及最后定位表，提交后更新最后定位缓存"""
+    with transaction.atomic():
+        models.Point.objects.bulk_create(points, batch_size=GPS_BULK_CREATE_BATCH_SIZE)
+        record_last_points(points)
+    return points
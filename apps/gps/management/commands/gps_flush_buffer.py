@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "持续读取定位数据写入缓冲并批量写入数据库"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', dest='once', action='store_true',
+                            help='缓冲为空后退出')
+        parser.add_argument('--block', dest='block', default=5000, type=int,
+                            help='缓冲为空时等待新消息的时间（毫秒）')
+
+    def handle(self, *args, **options):
+        from gps import buffer
+        if options['once']:
+            count = buffer.flush()
+            self.stdout.write(f"写入 {count} 个定位点")
+            return
+        while True:
+            try:
+                buffer.flush(block_ms=options['block'])
+            except KeyboardInterrupt:
+                break
+            except Exception as e:
+                self.stderr.write(f"写入失败: {e}")
+                time.sleep(5)
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "定位数据表分区管理：convert 转换为按时间分区的表，maintain 创建后续分区并删除过期数据"
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', choices=['convert', 'maintain', 'status'],
+                            help='convert: 转换为分区表; maintain: 创建分区并按保留期限删除; status: 查看分区')
+
+    def handle(self, *args, **options):
+        from gps import partitions
+        action = options['action']
+        if action == 'convert':
+            if partitions.is_partitioned():
+                self.stdout.write("定位数据表已经是分区表")
+                return
+            partitions.convert()
+            self.stdout.write(self.style.SUCCESS("定位数据表已转换为分区表"))
+        elif action == 'maintain':
+            result = partitions.maintain()
+            self.stdout.write(
+                f"分区表: {result['partitioned']}, 分区: {', '.join(result['created'])}, "
+                f"删除分区: {', '.join(result['dropped'])}, 删除数据: {result['purged']}"
+            )
+        else:
+            if not partitions.is_partitioned():
+                self.stdout.write("定位数据表未分区")
+                return
+            for name in partitions.list_partitions():
+                self.stdout.write(name)
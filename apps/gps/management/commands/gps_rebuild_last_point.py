@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "由定位历史重建最后定位表，并刷新最后定位缓存"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cache-only', dest='cache_only', action='store_true',
+                            help='只按最后定位表刷新缓存')
+
+    def handle(self, *args, **options):
+        from gps import utils
+        if not options['cache_only']:
+            count = utils.rebuild_last_point_table()
+            self.stdout.write(f"更新最后定位 {count} 条")
+        count = utils.refresh_last_point_all()
+        self.stdout.write(f"刷新最后定位缓存 {count} 条")
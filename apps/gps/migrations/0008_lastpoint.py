@@ -0,0 +1,43 @@
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gps', '0007_alter_point_latitude_alter_point_longitude'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LastPoint',
+            fields=[
+                ('sn', models.CharField(help_text='SN', max_length=128, primary_key=True, serialize=False, verbose_name='SN')),
+                ('point_id', models.CharField(help_text='定位点ID', max_length=64, verbose_name='定位点ID')),
+                ('sys_id', models.IntegerField(db_index=True, default=1, verbose_name='系统ID')),
+                ('org_id', models.IntegerField(db_index=True, default=1, verbose_name='组织ID')),
+                ('biz_id', models.IntegerField(default=1, verbose_name='业务ID')),
+                ('src_id', models.IntegerField(default=1, verbose_name='数据源ID')),
+                ('category', models.CharField(blank=True, help_text='类别', max_length=128, null=True, verbose_name='类别')),
+                ('sdk_name', models.CharField(default='amap', help_text='定位组件名称', max_length=32, verbose_name='定位组件名称')),
+                ('coordinate_name', models.CharField(default='GCJ02', help_text='坐标系名称', max_length=32, verbose_name='坐标系名称')),
+                ('longitude', models.CharField(blank=True, help_text='经度', max_length=32, null=True, verbose_name='经度')),
+                ('latitude', models.CharField(blank=True, help_text='纬度', max_length=32, null=True, verbose_name='纬度')),
+                ('radius', models.FloatField(blank=True, help_text='半径', null=True, verbose_name='半径')),
+                ('altitude', models.FloatField(blank=True, help_text='海拔', null=True, verbose_name='海拔')),
+                ('direction', models.FloatField(blank=True, help_text='方向角', null=True, verbose_name='方向角')),
+                ('velocity', models.FloatField(blank=True, help_text='速度', null=True, verbose_name='速度')),
+                ('acceleration', models.FloatField(blank=True, help_text='加速度', null=True, verbose_name='加速度')),
+                ('create_time', models.DateTimeField(default=django.utils.timezone.now, help_text='服务器时间', verbose_name='服务器时间')),
+                ('client_time', models.DateTimeField(default=django.utils.timezone.now, help_text='客户端时间', verbose_name='客户端时间')),
+                ('field_01', models.CharField(blank=True, max_length=128, null=True, verbose_name='Field 01')),
+                ('field_02', models.CharField(blank=True, max_length=128, null=True, verbose_name='Field 02')),
+                ('field_03', models.CharField(blank=True, max_length=128, null=True, verbose_name='Field 03')),
+                ('text_01', models.TextField(blank=True, null=True, verbose_name='Text_01')),
+            ],
+            options={
+                'verbose_name': '03.最后定位信息',
+                'verbose_name_plural': '03.最后定位信息',
+            },
+        ),
+    ]
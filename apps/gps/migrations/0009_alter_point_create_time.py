@@ -0,0 +1,17 @@
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gps', '0008_lastpoint'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='point',
+            name='create_time',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now, editable=False, help_text='服务器时间', verbose_name='服务器时间'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+from django.db import migrations
+
+
+def backfill_last_points(apps, schema_editor):
+    """由定位历史填充最后定位表，已有记录的客户端时间更新时不覆盖"""
+    Point = apps.get_model('gps', 'Point')
+    LastPoint = apps.get_model('gps', 'LastPoint')
+    qn = schema_editor.quote_name
+    table = qn(LastPoint._meta.db_table)
+    fields = [f.column for f in LastPoint._meta.concrete_fields if f.column not in ('sn', 'point_id')]
+    columns = ', '.join(qn(c) for c in fields)
+    updates = ', '.join(f'{qn(c)} = EXCLUDED.{qn(c)}' for c in ['point_id'] + fields)
+    schema_editor.execute(f"""
+        INSERT INTO {table} ({qn('sn')}, {qn('point_id')}, {columns})
+        SELECT DISTINCT ON (fd.sn) fd.sn, fd.id, {', '.join(f'fd.{qn(c)}' for c in fields)}
+        FROM {qn(Point._meta.db_table)} AS fd
+        WHERE fd.sn IS NOT NULL AND fd.sn <> ''
+        ORDER BY fd.sn, fd.client_time DESC, fd.create_time DESC
+        ON CONFLICT ({qn('sn')}) DO UPDATE SET {updates}
+        WHERE {table}.{qn('client_time')} <= EXCLUDED.{qn('client_time')}
+    """)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gps', '0009_alter_point_create_time'),
+    ]
+
+    operations = [
+        # 最后定位缓存未命中时只查询最后定位表，部署后需要先由定位历史填充
+        migrations.RunPython(backfill_last_points, migrations.RunPython.noop),
+    ]
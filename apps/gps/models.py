@@ -21,7 +21,8 @@ class Point(models.Model):
     direction = models.FloatField('方向角', db_index=True, null=True, blank=True, help_text='方向角')
     velocity = models.FloatField('速度', db_index=True, null=True, blank=True, help_text='速度')
     acceleration = models.FloatField('加速度', db_index=True, null=True, blank=True, help_text='加速度')
-    create_time = models.DateTimeField('服务器时间', auto_now_add=True, db_index=True, help_text='服务器时间')
+    # 写入缓冲时生成，重新写入同一定位点时保持不变（分区表主键包含此字段）
+    create_time = models.DateTimeField('服务器时间', default=timezone.now, editable=False, db_index=True, help_text='服务器时间')
     client_time = models.DateTimeField('客户端时间', default=timezone.now, db_index=True, help_text='客户端时间')
 
     field_01 = models.CharField('Field 01', max_length=128, db_index=True, null=True, blank=True, help_text='idx')
@@ -40,6 +41,48 @@ class Point(models.Model):
         return polygon.contains_point(self)
 
 
+class LastPoint(models.Model):
+    """最后定位，每个 sn 一条，定位点写入时按客户端时间更新"""
+    sn = models.CharField('SN', max_length=128, primary_key=True, help_text='SN')
+    point_id = models.CharField('定位点ID', max_length=64, help_text='定位点ID')
+    sys_id = models.IntegerField('系统ID', default=1, db_index=True)
+    org_id = models.IntegerField('组织ID', default=1, db_index=True)
+    biz_id = models.IntegerField('业务ID', default=1)
+    src_id = models.IntegerField('数据源ID', default=1)
+    category = models.CharField('类别', null=True, blank=True, max_length=128, help_text='类别')
+    sdk_name = models.CharField('定位组件名称', max_length=32, default='amap', help_text='定位组件名称')
+    coordinate_name = models.CharField('坐标系名称', max_length=32, default='GCJ02', help_text='坐标系名称')
+    longitude = models.CharField('经度', max_length=32, null=True, blank=True, help_text='经度')
+    latitude = models.CharField('纬度', max_length=32, null=True, blank=True, help_text='纬度')
+    radius = models.FloatField('半径', null=True, blank=True, help_text='半径')
+    altitude = models.FloatField('海拔', null=True, blank=True, help_text='海拔')
+    direction = models.FloatField('方向角', null=True, blank=True, help_text='方向角')
+    velocity = models.FloatField('速度', null=True, blank=True, help_text='速度')
+    acceleration = models.FloatField('加速度', null=True, blank=True, help_text='加速度')
+    create_time = models.DateTimeField('服务器时间', default=timezone.now, help_text='服务器时间')
+    client_time = models.DateTimeField('客户端时间', default=timezone.now, help_text='客户端时间')
+
+    field_01 = models.CharField('Field 01', max_length=128, null=True, blank=True)
+    field_02 = models.CharField('Field 02', max_length=128, null=True, blank=True)
+    field_03 = models.CharField('Field 03', max_length=128, null=True, blank=True)
+
+    text_01 = models.TextField('Text_01', null=True, blank=True)
+
+    # 与 Point 相同的字段
+    POINT_FIELDS = (
+        'sys_id', 'org_id', 'biz_id', 'src_id', 'sn', 'category', 'sdk_name', 'coordinate_name',
+        'longitude', 'latitude', 'radius', 'altitude', 'direction', 'velocity', 'acceleration',
+        'create_time', 'client_time', 'field_01', 'field_02', 'field_03', 'text_01',
+    )
+
+    class Meta:
+        verbose_name = '03.最后定位信息'
+        verbose_name_plural = verbose_name
+
+    def to_point(self) -> Point:
+        return Point(id=self.point_id, **{f: getattr(self, f) for f in self.POINT_FIELDS})
+
+
 class Polygon(models.Model):
     """地图多边形"""
     id = TableNamePKField('point')
@@ -68,34 +111,19 @@ class Polygon(models.Model):
     @property
     def center(self):
         """计算多边形中心点"""
-        import json
-        from shapely.geometry import Polygon
+        from .geofence import get_geometry
         if not self.line:
             return None
-        line = self.line
-        if isinstance(line, str):
-            line = json.loads(line)
-        if not isinstance(line, list):
+        geometry = get_geometry(self.pk, self.line)
+        if geometry is None:
             return []
-        if len(line) < 3:
-            return []
-        polygon = Polygon([[i[0], i[1]] for i in line])
-        center = polygon.centroid
+        center = geometry.polygon.centroid
         return [center.x, center.y]
 
     def contains_point(self, point: Point):
         """判断点是否在多边形内"""
-        import json
-        from shapely.geometry import Point as SPoint, Polygon
-        if not self.line:
-            return False
-        line = self.line
-        if isinstance(line, str):
-            line = json.loads(line)
-        if not isinstance(line, list):
-            return False
-        if len(line) < 3:
+        from .geofence import get_geometry
+        geometry = get_geometry(self.pk, self.line)
+        if geometry is None:
             return False
-        polygon = Polygon([[i[0], i[1]] for i in line])
-        point = SPoint([float(point.longitude), float(point.latitude)])
-        return polygon.contains(point)
+        return geometry.contains(float(point.longitude), float(point.latitude))
@@ -0,0 +1,99 @@
+"""
+gps_point 按时间分区存储及数据保留。
+
+分区模式由 `gps_point_partition convert` 命令开启：原表改名为 gps_point_legacy，
+新建按 create_time 范围分区的 gps_point，原表作为最早的分区挂载（见 utility.partitions）；
+分区表只保留常用查询需要的索引，减少写入时的索引维护。
+
+定时任务 `maintain_point_partitions` 提前创建后续分区，并按 `GPS_POINT_RETENTION_DAYS`
+把过期分区导出为 gzip 压缩的 CSV 文件保存到文件存储后删除；
+未开启分区模式时按保留天数分批删除过期数据，删除前同样导出。
+"""
+
+import datetime
+import logging
+
+from django.conf import settings
+from django.db import connection
+
+from utility.partitions import PartitionedTable, get_cutoff
+from . import models
+
+logger = logging.getLogger('restapi')
+
+# 分区周期：month 或 day
+GPS_PARTITION_PERIOD = getattr(settings, 'GPS_PARTITION_PERIOD', 'month')
+# 提前创建的分区数量
+GPS_PARTITION_PREMAKE = getattr(settings, 'GPS_PARTITION_PREMAKE', 2)
+# 定位数据保留天数，为 None 时不删除
+GPS_POINT_RETENTION_DAYS = getattr(settings, 'GPS_POINT_RETENTION_DAYS', None)
+# 删除前是否导出
+GPS_POINT_ARCHIVE = getattr(settings, 'GPS_POINT_ARCHIVE', True)
+# 导出文件在文件存储中的目录
+GPS_POINT_ARCHIVE_DIR = getattr(settings, 'GPS_POINT_ARCHIVE_DIR', 'gps/archive')
+# 按客户端时间查询时，认为服务器时间不早于客户端时间减去该秒数，用于分区裁剪
+GPS_CLIENT_TIME_SKEW = getattr(settings, 'GPS_CLIENT_TIME_SKEW', 24 * 60 * 60)
+# 未分区时每次删除的行数
+GPS_POINT_PURGE_BATCH_SIZE = getattr(settings, 'GPS_POINT_PURGE_BATCH_SIZE', 10000)
+
+TABLE = models.Point._meta.db_table
+
+# 分区表的索引，(名称, 字段)
+PARTITION_INDEXES = (
+    ('gps_point_sn_ctime', 'sn, create_time DESC'),
+    ('gps_point_sys_org_ctime', 'sys_id, org_id, create_time DESC'),
+    ('gps_point_ctime', 'create_time DESC'),
+    ('gps_point_client_time', 'client_time'),
+)
+
+point_table = PartitionedTable(
+    models.Point, period=GPS_PARTITION_PERIOD, premake=GPS_PARTITION_PREMAKE, archive=GPS_POINT_ARCHIVE,
+    archive_dir=GPS_POINT_ARCHIVE_DIR, indexes=PARTITION_INDEXES, label='gps point',
+)
+
+is_partitioned = point_table.is_partitioned
+list_partitions = point_table.list_partitions
+ensure_partitions = point_table.ensure_partitions
+convert = point_table.convert
+
+
+def purge_expired_rows(days: int) -> int:
+    """未分区时导出并分批删除保留期限之前的数据"""
+    cutoff = get_cutoff(days)
+    if GPS_POINT_ARCHIVE and models.Point.objects.filter(create_time__lt=cutoff).exists():
+        with connection.cursor() as cursor:
+            sql = cursor.mogrify(f'SELECT * FROM {TABLE} WHERE create_time < %s', [cutoff]).decode()
+        path = point_table.copy_to_storage(sql, f'{TABLE}_before_{cutoff:%Y%m%d}')
+        logger.info(f'gps points before {cutoff} archived to {path}')
+    count = 0
+    while True:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {TABLE} WHERE id IN (SELECT id FROM {TABLE} WHERE create_time < %s LIMIT %s)',
+                [cutoff, GPS_POINT_PURGE_BATCH_SIZE]
+            )
+            deleted = cursor.rowcount
+        count += deleted
+        if deleted < GPS_POINT_PURGE_BATCH_SIZE:
+            break
+    return count
+
+
+def maintain() -> dict:
+    """创建后续分区，删除过期数据"""
+    result = {'partitioned': is_partitioned(), 'created': [], 'dropped': [], 'purged': 0}
+    if result['partitioned']:
+        result['created'] = ensure_partitions()
+        if GPS_POINT_RETENTION_DAYS:
+            result['dropped'] = point_table.drop_expired_partitions(GPS_POINT_RETENTION_DAYS)
+    elif GPS_POINT_RETENTION_DAYS:
+        result['purged'] = purge_expired_rows(GPS_POINT_RETENTION_DAYS)
+    return result
+
+
+def prune_by_client_time(queryset, client_time):
+    """按客户端时间范围查询时增加服务器时间下限，使查询只扫描相关分区"""
+    start = getattr(client_time, 'start', None)
+    if start is None or not is_partitioned(cached=True):
+        return queryset
+    return queryset.filter(create_time__gte=start - datetime.timedelta(seconds=GPS_CLIENT_TIME_SKEW))
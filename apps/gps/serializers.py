@@ -31,6 +31,50 @@ class LastPointSerializer(serializers.Serializer):
         pass
 
 
+class GeofenceContainsSerializer(serializers.Serializer):
+    sys_id = serializers.IntegerField(required=True, allow_null=False)
+    org_id = serializers.IntegerField(required=True, allow_null=False)
+    category = serializers.CharField(required=False, allow_null=True, default=None)
+    points = serializers.ListField(
+        child=serializers.JSONField(), allow_empty=False, required=True,
+        help_text='定位点数组，每项为 {"longitude": .., "latitude": ..} 或 [经度, 纬度]'
+    )
+
+    def create(self, validated_data):
+        pass
+
+    def update(self, instance, validated_data):
+        pass
+
+
+class GeofencePointsSerializer(serializers.Serializer):
+    polygon = serializers.CharField(required=True, help_text='多边形ID')
+    client_time_after = serializers.DateTimeField(required=True)
+    client_time_before = serializers.DateTimeField(required=True)
+    sn = serializers.ListField(child=serializers.CharField(allow_blank=False), required=False)
+
+    def create(self, validated_data):
+        pass
+
+    def update(self, instance, validated_data):
+        pass
+
+
+class GeofenceEventsSerializer(serializers.Serializer):
+    sys_id = serializers.IntegerField(required=True, allow_null=False)
+    org_id = serializers.IntegerField(required=True, allow_null=False)
+    category = serializers.CharField(required=False, allow_null=True, default=None)
+    sn = serializers.CharField(required=True, allow_blank=False)
+    client_time_after = serializers.DateTimeField(required=True)
+    client_time_before = serializers.DateTimeField(required=True)
+
+    def create(self, validated_data):
+        pass
+
+    def update(self, instance, validated_data):
+        pass
+
+
 class PointSerializer(ModelSerializer):
     coordinate = serializers.SerializerMethodField()
     class Meta:
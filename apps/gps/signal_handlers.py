@@ -0,0 +1,12 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from . import geofence
+from .models import Polygon
+
+
+@receiver(post_save, sender=Polygon)
+@receiver(post_delete, sender=Polygon)
+def invalidate_geofence(sender, instance: Polygon, **kwargs):
+    geofence.discard_geometry(instance.pk)
+    geofence.invalidate(instance.sys_id, instance.org_id)
@@ -0,0 +1,21 @@
+from celery import shared_task
+from django.conf import settings
+
+# 每次定时任务读取缓冲的最长时间（秒），应小于定时任务间隔
+GPS_BUFFER_FLUSH_SECONDS = getattr(settings, 'GPS_BUFFER_FLUSH_SECONDS', 8)
+
+
+@shared_task
+def flush_point_buffer():
+    """定位数据写入缓冲批量写入数据库，未启用缓冲且缓冲为空时直接返回"""
+    from gps import buffer
+    if not buffer.GPS_WRITE_BEHIND and not buffer.get_connection().exists(buffer.STREAM_KEY):
+        return 0
+    return buffer.flush(max_seconds=GPS_BUFFER_FLUSH_SECONDS)
+
+
+@shared_task
+def maintain_point_partitions():
+    """创建后续的定位数据分区，按保留期限导出并删除过期数据"""
+    from gps import partitions
+    return partitions.maintain()
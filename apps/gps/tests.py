@@ -0,0 +1,162 @@
+import os
+import datetime
+import tempfile
+import importlib
+from unittest import mock
+
+from django.apps import apps
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from . import buffer
+from . import ingest
+from . import partitions
+from . import utils
+from .models import LastPoint, Point
+
+TEST_SN = 'test-buffer-sn'
+TEST_STREAM_KEY = 'test:gps:point-stream'
+TEST_STATS_KEY = 'test:gps:point-stream:stats'
+
+
+class WriteBehindFlushTestCase(TestCase):
+    """定位数据写入缓冲"""
+
+    def setUp(self):
+        patcher = mock.patch.multiple(buffer, STREAM_KEY=TEST_STREAM_KEY, STATS_KEY=TEST_STATS_KEY)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.r = buffer.get_connection()
+        self.r.delete(TEST_STREAM_KEY, TEST_STATS_KEY)
+        self.addCleanup(self.r.delete, TEST_STREAM_KEY, TEST_STATS_KEY, ingest.LAST_POINT_KEY.format(TEST_SN))
+
+    def enqueue(self, count=2, client_time=datetime.datetime(2026, 1, 1, 8, 0, 0, 123456)):
+        return buffer.enqueue_points([
+            {
+                'sn': TEST_SN, 'longitude': '120.1', 'latitude': '30.2',
+                'client_time': client_time + datetime.timedelta(seconds=i),
+            }
+            for i in range(count)
+        ])
+
+    def test_flush_writes_points(self):
+        points = self.enqueue()
+        self.assertEqual(Point.objects.filter(sn=TEST_SN).count(), 0)
+        self.assertEqual(buffer.flush(), 2)
+        saved = Point.objects.get(pk=points[1].pk)
+        self.assertEqual(saved.client_time, points[1].client_time)
+        # 服务器时间为写入缓冲的时间，重新写入时不变
+        self.assertEqual(saved.create_time, points[1].create_time)
+        self.assertEqual(Point.objects.filter(sn=TEST_SN).count(), 2)
+        self.assertEqual(self.r.xlen(TEST_STREAM_KEY), 0)
+
+    def test_replayed_messages_are_written_once(self):
+        self.enqueue()
+        buffer.ensure_group(self.r)
+        messages = self.r.xrange(TEST_STREAM_KEY)
+        buffer.write_messages(self.r, messages)
+        # 事务提交后确认消息前进程退出时，消息会被其他消费者接管重新写入
+        buffer.write_messages(self.r, messages)
+        self.assertEqual(Point.objects.filter(sn=TEST_SN).count(), 2)
+
+    def get_cached(self):
+        return ingest.get_redis_connection('default').get(ingest.LAST_POINT_KEY.format(TEST_SN))
+
+    def test_late_point_keeps_newer_cache(self):
+        points = self.enqueue()
+        cached = self.get_cached()
+        # 迟到的定位点不覆盖最后定位缓存
+        self.enqueue(count=1, client_time=points[0].client_time - datetime.timedelta(minutes=1))
+        self.assertEqual(self.get_cached(), cached)
+        with self.captureOnCommitCallbacks(execute=True):
+            buffer.flush()
+        self.assertEqual(LastPoint.objects.get(sn=TEST_SN).point_id, points[1].pk)
+        self.assertEqual(self.get_cached(), cached)
+
+
+class LastPointTestCase(TestCase):
+    """最后定位表及缓存"""
+
+    def setUp(self):
+        self.key = ingest.LAST_POINT_KEY.format(TEST_SN)
+        self.r = ingest.get_redis_connection('default')
+        self.r.delete(self.key)
+        self.addCleanup(self.r.delete, self.key)
+
+    def save(self, client_time):
+        point = Point(sn=TEST_SN, longitude='120.1', latitude='30.2', client_time=client_time)
+        with self.captureOnCommitCallbacks(execute=True):
+            ingest.save_points([point])
+        return point
+
+    def test_late_point(self):
+        client_time = datetime.datetime(2026, 1, 1, 8, 0, 0)
+        newest = self.save(client_time)
+        cached = self.r.get(self.key)
+        self.save(client_time - datetime.timedelta(seconds=1))
+        self.assertEqual(LastPoint.objects.get(sn=TEST_SN).point_id, newest.pk)
+        self.assertEqual(self.r.get(self.key), cached)
+        newer = self.save(client_time + datetime.timedelta(seconds=1))
+        self.assertEqual(LastPoint.objects.get(sn=TEST_SN).point_id, newer.pk)
+        self.assertNotEqual(self.r.get(self.key), cached)
+
+    def test_backfill(self):
+        # 最后定位表创建前已有的定位历史，由迁移填充后缓存未命中时可以查询到
+        client_time = datetime.datetime(2026, 1, 1, 8, 0, 0)
+        Point.objects.create(sn=TEST_SN, longitude='120.1', latitude='30.2', client_time=client_time)
+        newest = Point.objects.create(
+            sn=TEST_SN, longitude='120.2', latitude='30.3', client_time=client_time + datetime.timedelta(seconds=1)
+        )
+        self.assertFalse(LastPoint.objects.filter(sn=TEST_SN).exists())
+        migration = importlib.import_module('gps.migrations.0010_backfill_lastpoint')
+        with connection.schema_editor() as schema_editor:
+            migration.backfill_last_points(apps, schema_editor)
+        self.assertEqual(LastPoint.objects.get(sn=TEST_SN).point_id, newest.pk)
+        self.assertEqual(utils.get_last_point_map([TEST_SN])[TEST_SN]['longitude'], '120.2')
+
+
+class PointPartitionTestCase(TransactionTestCase):
+    """定位数据分区及数据保留"""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.media_root = tmp.name
+        self.old_time = datetime.datetime.now() - datetime.timedelta(days=400)
+
+    def maintain(self):
+        with mock.patch.object(partitions, 'GPS_POINT_RETENTION_DAYS', 30), \
+                override_settings(MEDIA_ROOT=self.media_root):
+            return partitions.maintain()
+
+    def get_archives(self):
+        return os.listdir(os.path.join(self.media_root, partitions.GPS_POINT_ARCHIVE_DIR))
+
+    def test_convert_and_maintain(self):
+        # 未分区时按行删除过期数据
+        Point.objects.create(sn=TEST_SN, create_time=self.old_time)
+        result = self.maintain()
+        self.assertFalse(result['partitioned'])
+        self.assertEqual(result['purged'], 1)
+        self.assertEqual(len(self.get_archives()), 1)
+
+        old = Point.objects.create(sn=TEST_SN, create_time=self.old_time)
+        current = Point.objects.create(sn=TEST_SN)
+        partitions.convert()
+        self.assertTrue(partitions.is_partitioned())
+        self.assertIn(partitions.point_table.legacy_table, partitions.list_partitions())
+        self.assertEqual(set(Point.objects.values_list('pk', flat=True)), {old.pk, current.pk})
+
+        # 转换后写入、更新
+        point = Point.objects.create(sn=TEST_SN, longitude='120.1')
+        point.longitude = '120.2'
+        point.save()
+        self.assertEqual(Point.objects.get(pk=point.pk).longitude, '120.2')
+        self.assertEqual(Point.objects.count(), 3)
+
+        # 整个删除过期的分区（原表中只有过期数据）
+        result = self.maintain()
+        self.assertTrue(result['partitioned'])
+        self.assertEqual(result['dropped'], [partitions.point_table.legacy_table])
+        self.assertEqual(set(Point.objects.values_list('pk', flat=True)), {current.pk, point.pk})
+        self.assertEqual(len(self.get_archives()), 2)
@@ -6,9 +6,14 @@ from . import views
 router = DefaultRouter()
 
 router.register(r'gps-point', api.PointViewSet)
+router.register(r'gps-point-batch', api.PointBatchViewSet, basename='gps-point-batch')
+router.register(r'gps-point-buffer', api.PointBufferStatsViewSet, basename='gps-point-buffer')
 router.register(r'gps-point-find', api.PointFindViewSet)
 router.register(r'gps-point-time', api.PointTimeViewSet)
 router.register(r'gps-polygon', api.PolygonViewSet)
+router.register(r'gps-geofence-contains', api.GeofenceContainsViewSet, basename='gps-geofence-contains')
+router.register(r'gps-geofence-points', api.GeofencePointsViewSet, basename='gps-geofence-points')
+router.register(r'gps-geofence-events', api.GeofenceEventsViewSet, basename='gps-geofence-events')
 router.register(r'gps-lastpoints', api.LastPointViewSet)
 router.register(r'gps-refreshlastpoints', api.RefreshLastPointViewSet)
 
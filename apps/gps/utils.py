@@ -1,73 +1,114 @@
-from rest_framework.utils.json import dumps, loads
+from typing import Dict, Iterable, List, Optional
+
+from rest_framework.utils.json import loads
 from django_redis import get_redis_connection
-from django.db.models import QuerySet
 from . import serializers
 from . import models
+from .ingest import LAST_POINT_KEY, set_last_point_cache
 
 cache = get_redis_connection("default")
 
 
+def get_empty_point_data():
+    instance = models.Point()
+    return serializers.PointSerializer(instance=instance).data
+
+
 def get_point_data(gps_sn, sys_id):
-    key = f'gps-point-{gps_sn}'
-    val = cache.get(key)
-    val = loads(val) if val else None
+    val = get_last_point_map([gps_sn]).get(gps_sn)
     if val and str(val.get('sys_id')) == str(sys_id):
         return val
-    instance = models.Point()
-    return serializers.PointSerializer(instance=instance).data
+    return get_empty_point_data()
+
+
+def get_point_data_list(sn_list: Iterable, sys_id) -> List[dict]:
+    """批量获取最后定位，按 sn_list 顺序返回，没有定位或不属于该系统时返回空定位"""
+    sn_list = list(sn_list)
+    points = get_last_point_map(sn_list)
+    empty = None
+    result = []
+    for sn in sn_list:
+        val = points.get(sn)
+        if not (val and str(val.get('sys_id')) == str(sys_id)):
+            if empty is None:
+                empty = get_empty_point_data()
+            val = empty
+        result.append(val)
+    return result
+
+
+def cache_last_points(points: Iterable[models.Point]) -> Dict[str, dict]:
+    """最后定位写入缓存（缓存中已有更新的定位时不覆盖），返回 sn -> 定位数据"""
+    points = [i for i in points if i.sn]
+    data = serializers.PointSerializer(points, many=True).data
+    set_last_point_cache(cache, data)
+    return {point.sn: item for point, item in zip(points, data)}
+
+
+def get_last_point_map(sn_list: Iterable, sys_id: Optional[int] = None, org_id: Optional[int] = None) -> Dict[str, dict]:
+    """批量获取最后定位，一次 MGET 读取缓存，缓存中没有的从最后定位表查询并写入缓存"""
+    sn_list = list(dict.fromkeys(i for i in sn_list if i))
+    if not sn_list:
+        return {}
+    result = {}
+    missing = []
+    for sn, val in zip(sn_list, cache.mget([LAST_POINT_KEY.format(i) for i in sn_list])):
+        val = loads(val) if val else None
+        if isinstance(val, dict):
+            result[sn] = val
+        else:
+            missing.append(sn)
+    if missing:
+        qs = get_last_points(sys_id, org_id, missing)
+        result.update(cache_last_points(qs))
+    return result
 
 
 def refresh_last_point_all():
-    sql = """
-        with T as (
-          select
-            *,
-            row_number() over (
-              partition by fd.sn
-              order by
-                fd.create_time desc
-            ) as rownum
-          from
-            gps_point as fd
-        )
-        select * from T where rownum = 1
-    """
-    qs = models.Point.objects.raw(sql)
+    """按最后定位表刷新全部最后定位缓存"""
     cnt = 0
-    for i in qs:
-        cache.set(f'gps-point-{i.sn}', dumps(serializers.PointSerializer(instance=i).data))
-        # print('sn:', i.sn)
-        cnt += 1
+    qs = models.LastPoint.objects.order_by('sn')
+    batch = []
+    for i in qs.iterator(chunk_size=2000):
+        batch.append(i.to_point())
+        if len(batch) >= 2000:
+            cnt += len(cache_last_points(batch))
+            batch = []
+    cnt += len(cache_last_points(batch)) if batch else 0
     return cnt
 
 
 def refresh_last_point(sys_id, org_id, sn_list):
-    qs = get_last_points(sys_id, org_id, sn_list)
-    cnt = 0
-    for i in qs:
-        cache.set(f'gps-point-{i.sn}', dumps(serializers.PointSerializer(instance=i).data))
-        cnt += 1
-    return cnt
+    return len(cache_last_points(get_last_points(sys_id, org_id, sn_list)))
+
+
+def get_last_points(sys_id, org_id, sn_list) -> List[models.Point]:
+    """从最后定位表查询最后定位，sys_id、org_id 为 None 时不过滤"""
+    qs = models.LastPoint.objects.filter(sn__in=list(sn_list))
+    if sys_id is not None:
+        qs = qs.filter(sys_id=sys_id)
+    if org_id is not None:
+        qs = qs.filter(org_id=org_id)
+    return [i.to_point() for i in qs]
 
 
-def get_last_points(sys_id, org_id, sn_list) -> QuerySet[models.Point]:
-    sql = """
-        with T as (
-          select
-            *,
-            row_number() over (
-              partition by fd.sn
-              order by
-                fd.create_time desc
-            ) as rownum
-          from
-            gps_point as fd
-          where
-            fd.org_id = %s and 
-            fd.sys_id = %s and
-            fd.sn in %s
-        )
-        select * from T where rownum = 1
+def rebuild_last_point_table() -> int:
+    """由定位历史重建最后定位表，只用于初始化或修复数据"""
+    from django.db import connection
+    table = models.LastPoint._meta.db_table
+    fields = [f for f in models.LastPoint.POINT_FIELDS if f != 'sn']
+    qn = connection.ops.quote_name
+    columns = ', '.join(qn(c) for c in fields)
+    updates = ', '.join(f'{qn(c)} = EXCLUDED.{qn(c)}' for c in ['point_id'] + fields)
+    sql = f"""
+        INSERT INTO {qn(table)} ({qn('sn')}, {qn('point_id')}, {columns})
+        SELECT DISTINCT ON (fd.sn) fd.sn, fd.id, {', '.join(f'fd.{qn(c)}' for c in fields)}
+        FROM {qn(models.Point._meta.db_table)} AS fd
+        WHERE fd.sn IS NOT NULL AND fd.sn <> ''
+        ORDER BY fd.sn, fd.client_time DESC, fd.create_time DESC
+        ON CONFLICT ({qn('sn')}) DO UPDATE SET {updates}
+        WHERE {qn(table)}.{qn('client_time')} <= EXCLUDED.{qn('client_time')}
     """
-    qs = models.Point.objects.raw(sql, (org_id, sys_id, tuple(sn_list),))
-    return qs
+    with connection.cursor() as cursor:
+        cursor.execute(sql)
+        return cursor.rowcount
@@ -1,7 +1,7 @@
 from django.shortcuts import render
 from django.http import HttpResponse
 from .serializers import PointSerializer
-from .utils import refresh_last_point
+from .ingest import record_last_points
 
 def gps_test(request) -> HttpResponse:
     if request.method == 'GET':
@@ -10,7 +10,7 @@ def gps_test(request) -> HttpResponse:
         serial = PointSerializer(data=request.POST)
         if serial.is_valid():
             instance = serial.save()
-            refresh_last_point(instance.sys_id, instance.org_id, [instance.sn])
+            record_last_points([instance])
             return HttpResponse('{"success":true}')
         else:
             return HttpResponse(f'{{"success":false, "errors":{serial.errors}}}', status=400)
@@ -13,3 +13,11 @@ class NoticePoolAdmin(admin.ModelAdmin):
     list_display = ['pk', 'sys_id', 'channel', 'title', 'content', 'send_time', 'is_circulation', 'is_sent', 'from_user_display', 'create_time', ]
     list_display_links = ['pk', 'sys_id', 'channel', 'title', 'content', 'send_time', 'from_user_display', 'create_time', ]
     list_filter = ['channel', 'is_sent', 'is_circulation']
+
+
+@admin.register(models.NoticeDelivery)
+class NoticeDeliveryAdmin(admin.ModelAdmin):
+    list_display = ['pk', 'notice', 'user', 'channel', 'status', 'error_message', 'update_time', ]
+    list_display_links = ['pk', 'notice', 'user', ]
+    list_filter = ['channel', 'status']
+    raw_id_fields = ['notice', 'user']
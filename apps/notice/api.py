@@ -2,11 +2,13 @@ from rest_framework import viewsets, permissions
 from django_filters.rest_framework.backends import DjangoFilterBackend
 from rest_framework.response import Response
 from rest_framework.filters import SearchFilter
-from django.db.models import Q
+
+from usercenter.permissions import IsSuperuser
 
 from . import models
 from . import serializers
 from . import filters
+from . import unread
 
 
 class NoticeViewSet(viewsets.ModelViewSet):
@@ -33,23 +35,8 @@ class ViewMyNoticeViewSet(viewsets.ReadOnlyModelViewSet):
         qs = super().get_queryset()
         if self.request.user.is_anonymous:
             return qs.none()
-        user = self.request.user
-        dep = user.department
-        deps = []
-        if dep:
-            deps = dep.get_ancestors(include_self=True).values_list('pk', flat=True)
-        if deps:
-            return qs.filter(
-                Q(is_public=True) | Q(public_user=self.request.user) | (
-                    Q(departments__in=deps) & Q(department_range='本级及以下')
-                )
-            )
-        else:
-            return qs.filter(
-                Q(is_public=True) | Q(public_user=self.request.user) | (
-                    Q(departments=self.request.user.department) & Q(department_range='本级')
-                )
-            )
+        # 可查看的通知在发布时展开到收件索引
+        return qs.filter(inbox_entries__user_id=self.request.user.pk)
 
 
 class MailBoxViewSet(viewsets.ModelViewSet):
@@ -84,10 +71,24 @@ class MailBoxUnreadCountView(viewsets.mixins.ListModelMixin, viewsets.GenericVie
     filterset_fields = ('user_id', 'from_user_id', 'sys_id', 'org_id', 'biz_id', 'obj_id', 'is_read', 'obj_type',)
 
     def list(self, request, *args, **kwargs):
-        queryset = self.filter_queryset(self.get_queryset())
-        count = queryset.filter(category='mailbox', user_id=request.user.pk, is_read=False).count()
+        if self.use_cached_count():
+            count = unread.get_unread_count(request.user.pk)
+        else:
+            queryset = self.filter_queryset(self.get_queryset())
+            count = queryset.filter(category='mailbox', user_id=request.user.pk, is_read=False).count()
         return Response(self.serializer_class({'count': count}).data)
 
+    def use_cached_count(self):
+        """只按当前用户的 sys_id、org_id、user_id 查询时读取缓存的未读数量"""
+        user = self.request.user
+        current = {'sys_id': str(user.sys_id), 'org_id': str(user.org_id), 'user_id': str(user.pk)}
+        for key, value in self.request.query_params.items():
+            if key == 'format':
+                continue
+            if current.get(key) != value:
+                return False
+        return True
+
 
 class MailBoxMarkAllReadView(viewsets.GenericViewSet):
     """标记所有消息为已读 notice_mailbox"""
@@ -98,8 +99,8 @@ class MailBoxMarkAllReadView(viewsets.GenericViewSet):
 
     def create(self, request, *args, **kwargs):
         qs = models.MailBox.objects.filter(category='mailbox', user_id=request.user.pk, is_read=False)
-        count = qs.count()
-        qs.update(is_read=True)
+        count = qs.update(is_read=True)
+        unread.reset_unread(request.user.pk)
         return Response(self.serializer_class({'count': count}).data)
 
 
@@ -110,3 +111,25 @@ class NoticePoolViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = (DjangoFilterBackend,)
     filterset_class = filters.NoticePoolFilterSet
+
+
+class NoticeDeliveryViewSet(viewsets.ReadOnlyModelViewSet):
+    """通知发送记录API notice_noticedelivery"""
+    queryset = models.NoticeDelivery.objects.select_related('user').order_by('notice_id', 'user_id')
+    serializer_class = serializers.NoticeDeliverySerializer
+    permission_classes = [permissions.IsAuthenticated]
+    filter_backends = (DjangoFilterBackend,)
+    filterset_class = filters.NoticeDeliveryFilterSet
+
+
+class NoticePoolStatsViewSet(viewsets.GenericViewSet):
+    """通知池队列状态API"""
+    queryset = models.NoticePool.objects.none()
+    permission_classes = [IsSuperuser]
+    pagination_class = None
+
+    def list(self, request, *args, **kwargs):
+        """到期未发送的通知数 `due`、未来待发送数 `scheduled`，
+        按渠道的到期数、最早到期距今秒数 `lag_seconds`、待发送的发送记录数、本分钟已领取数及限制"""
+        from .scheduler import get_stats
+        return Response(get_stats())
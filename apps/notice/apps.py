@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class NoticeConfig(AppConfig):
     name = 'notice'
     verbose_name = '通知公告'
+
+    def ready(self):
+        import notice.signal_handlers
@@ -0,0 +1,210 @@
+"""
+通知池发送。
+
+接收用户由发送对象、部门范围（本级 / 本级及以下）、全局公开三部分合并，一次查询得到用户ID；
+发送前为每个接收用户写入一条发送记录（NoticeDelivery），状态为待发送。
+
+站内信按批 bulk_create 写入，同一事务内把发送记录标记为已发送；
+短信、邮件按 `NOTICE_DELIVERY_CHUNK_SIZE` 分片，每片一个 celery 任务，
+任务内只查询一次配置、邮件共用一个 SMTP 连接，逐个用户更新发送记录。
+"""
+
+import logging
+from collections import defaultdict
+from typing import Dict, List
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import MailBox, NoticeDelivery, NoticePool
+from .unread import incr_unread
+
+logger = logging.getLogger('celery.task')
+
+# 短信、邮件每个任务发送的用户数量
+NOTICE_DELIVERY_CHUNK_SIZE = getattr(settings, 'NOTICE_DELIVERY_CHUNK_SIZE', 200)
+# 站内信、发送记录每条 INSERT 语句写入的数量
+NOTICE_BULK_CREATE_BATCH_SIZE = getattr(settings, 'NOTICE_BULK_CREATE_BATCH_SIZE', 1000)
+
+
+def get_department_ids(notice: NoticePool) -> List[str]:
+    """部门范围，本级及以下时包含全部下级部门"""
+    from usercenter.models import Department
+    from usercenter.dep_tree import get_subtree_ids
+    dep_ids = list(notice.departments.values_list('pk', flat=True))
+    if not dep_ids or notice.department_range != '本级及以下':
+        return dep_ids
+    child_ids = get_subtree_ids(notice.sys_id, notice.org_id, dep_ids)
+    if child_ids is None:
+        child_ids = list(Department.objects.get_queryset_descendants(
+            Department.objects.filter(pk__in=dep_ids), include_self=True
+        ).values_list('pk', flat=True))
+    return child_ids
+
+
+def get_recipient_ids(notice: NoticePool) -> List[str]:
+    """接收用户ID：发送对象、部门范围内及全局公开时本系统本组织的有效用户"""
+    from usercenter.models import User
+    query = Q(pk__in=NoticePool.send_to.through.objects.filter(noticepool_id=notice.pk).values('user_id'))
+    scope = Q(sys_id=notice.sys_id, org_id=notice.org_id, is_active=True)
+    if notice.is_public:
+        query |= scope
+    else:
+        dep_ids = get_department_ids(notice)
+        if dep_ids:
+            query |= scope & Q(department_id__in=dep_ids)
+    return list(User.objects.filter(query).order_by('pk').values_list('pk', flat=True))
+
+
+def create_deliveries(notice: NoticePool, user_ids: List[str]):
+    """为每个接收用户写入待发送记录，再次发送（循环发送）时重置为待发送"""
+    deliveries = [
+        NoticeDelivery(
+            sys_id=notice.sys_id, org_id=notice.org_id, notice_id=notice.pk,
+            user_id=user_id, channel=notice.channel, status='pending',
+        )
+        for user_id in user_ids
+    ]
+    NoticeDelivery.objects.bulk_create(
+        deliveries, batch_size=NOTICE_BULK_CREATE_BATCH_SIZE,
+        update_conflicts=True, unique_fields=['notice', 'user'],
+        update_fields=['channel', 'status', 'error_message', 'update_time'],
+    )
+
+
+def set_status(notice_id: str, user_ids: List[str], status: str, error_message: str = None):
+    if user_ids:
+        NoticeDelivery.objects.filter(notice_id=notice_id, user_id__in=user_ids).update(
+            status=status, error_message=error_message, update_time=timezone.now()
+        )
+
+
+def deliver_mailbox(notice: NoticePool) -> int:
+    """站内信：一个事务内批量写入并标记发送记录"""
+    user_ids = get_recipient_ids(notice)
+    with transaction.atomic():
+        create_deliveries(notice, user_ids)
+        MailBox.objects.bulk_create([
+            MailBox(
+                sys_id=notice.sys_id, org_id=notice.org_id, biz_id=notice.biz_id,
+                src_id=notice.src_id, obj_id=notice.obj_id, obj_type=notice.obj_type,
+                title=notice.title, content=notice.content, from_user_id=notice.from_user_id,
+                user_id=user_id, category='mailbox', msg_type_id=notice.msg_type_id,
+            )
+            for user_id in user_ids
+        ], batch_size=NOTICE_BULK_CREATE_BATCH_SIZE)
+        set_status(notice.pk, user_ids, 'sent')
+        incr_unread(user_ids)
+    return len(user_ids)
+
+
+def check_config(notice: NoticePool):
+    from system.models import EmailConfig, SMSConfig
+    if notice.channel == 'email':
+        if not EmailConfig.objects.filter(system__sys_id=notice.sys_id).exists():
+            raise ValueError('EmailConfig not configured!')
+    elif notice.channel == 'sms':
+        if not SMSConfig.objects.filter(system__sys_id=notice.sys_id, is_enabled=True).exists():
+            raise ValueError('SMSConfig not configured!')
+
+
+def deliver_chunked(notice: NoticePool) -> int:
+    """短信、邮件：写入发送记录后按分片分发到 celery 任务"""
+    from .tasks import deliver_notice_chunk
+    check_config(notice)
+    user_ids = get_recipient_ids(notice)
+    with transaction.atomic():
+        create_deliveries(notice, user_ids)
+        for i in range(0, len(user_ids), NOTICE_DELIVERY_CHUNK_SIZE):
+            chunk = user_ids[i:i + NOTICE_DELIVERY_CHUNK_SIZE]
+            transaction.on_commit(lambda chunk=chunk: deliver_notice_chunk.delay(notice.pk, chunk))
+    return len(user_ids)
+
+
+def send_sms_chunk(notice: NoticePool, users) -> Dict[str, List[str]]:
+    """返回 状态或错误信息 -> 用户ID"""
+    from system.utils.send_sms_message import get_sms_config, send_sms_message
+    result = defaultdict(list)
+    sms_config = get_sms_config(notice.sys_id)
+    for user_id, mobile, _ in users:
+        if not mobile:
+            result['skipped'].append(user_id)
+            continue
+        try:
+            send_sms_message(notice.sys_id, mobile, notice.content, sms_config=sms_config)
+            result['sent'].append(user_id)
+        except Exception as e:
+            logger.error(f'notice {notice.pk} send sms to {mobile} error: {e}', exc_info=e)
+            result[str(e)].append(user_id)
+    return result
+
+
+def send_email_chunk(notice: NoticePool, users) -> Dict[str, List[str]]:
+    """共用一个 SMTP 连接，每个用户一封邮件"""
+    from django.core.mail import EmailMessage
+    from django.core.mail.backends.smtp import EmailBackend
+    from system.models import EmailConfig
+    result = defaultdict(list)
+    email_config = EmailConfig.objects.filter(system__sys_id=notice.sys_id).first()
+    if email_config is None:
+        result['EmailConfig not configured!'] = [i[0] for i in users]
+        return result
+    backend = EmailBackend(
+        host=email_config.host,
+        port=email_config.port,
+        username=email_config.username,
+        password=email_config.password,
+        use_ssl=email_config.use_ssl,
+        use_tls=email_config.use_tls,
+        timeout=10,
+    )
+    try:
+        backend.open()
+    except Exception as e:
+        logger.error(f'notice {notice.pk} open smtp connection error: {e}', exc_info=e)
+        result[str(e)] = [i[0] for i in users]
+        return result
+    try:
+        for user_id, _, email in users:
+            if not email:
+                result['skipped'].append(user_id)
+                continue
+            message = EmailMessage(
+                subject=notice.title or '通知',
+                body=notice.content,
+                from_email=email_config.from_email,
+                to=[email],
+                connection=backend,
+            )
+            try:
+                message.send()
+                result['sent'].append(user_id)
+            except Exception as e:
+                logger.error(f'notice {notice.pk} send email to {email} error: {e}', exc_info=e)
+                result[str(e)].append(user_id)
+    finally:
+        backend.close()
+    return result
+
+
+def deliver_chunk(notice_id: str, user_ids: List[str]) -> int:
+    """发送一个分片，返回发送成功的数量"""
+    from usercenter.models import User
+    notice = NoticePool.objects.filter(pk=notice_id).first()
+    if notice is None:
+        return 0
+    users = list(User.objects.filter(pk__in=user_ids).values_list('pk', 'mobile', 'email'))
+    if notice.channel == 'sms':
+        result = send_sms_chunk(notice, users)
+    elif notice.channel == 'email':
+        result = send_email_chunk(notice, users)
+    else:
+        return 0
+    for key, ids in result.items():
+        if key in ('sent', 'skipped'):
+            set_status(notice.pk, ids, key)
+        else:
+            set_status(notice.pk, ids, 'failed', key)
+    return len(result.get('sent', []))
@@ -81,3 +81,17 @@ class NoticePoolFilterSet(django_filters.FilterSet):
             'last_modify',
             'channel',
         )
+
+
+class NoticeDeliveryFilterSet(django_filters.FilterSet):
+    notice = CharInFilter(field_name='notice_id', label='通知', help_text='通知ID，多个用逗号分隔')
+    user = CharInFilter(field_name='user_id', label='接收用户', help_text='用户ID，多个用逗号分隔')
+    status = CharInFilter(field_name='status', label='状态', help_text='状态，多个用逗号分隔')
+
+    class Meta:
+        model = models.NoticeDelivery
+        fields = (
+            'sys_id',
+            'org_id',
+            'channel',
+        )
@@ -0,0 +1,153 @@
+"""
+通知收件索引。
+
+通知公告（MailBox category='notice'）发布或修改公开范围时，把全局公开、公开用户、部门范围
+展开为用户到通知的映射（NoticeInbox），查看我的通知只需按用户查询索引。
+
+- 全局公开：同一系统的全部用户
+- 公开用户：public_user 中的用户
+- 部门范围：本级为部门内的用户，本级及以下为部门及全部下级部门内的用户
+
+用户新建或调整部门、部门移动或删除后重新计算受影响用户或通知的索引。
+"""
+
+import logging
+import threading
+from typing import Iterable, List, Set
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+
+from .models import MailBox, NoticeInbox
+
+logger = logging.getLogger('restapi')
+
+# 每条 INSERT 语句写入的索引数量
+NOTICE_INBOX_BATCH_SIZE = getattr(settings, 'NOTICE_INBOX_BATCH_SIZE', 2000)
+
+_local = threading.local()
+
+
+def get_notice_user_ids(notice: MailBox) -> Set[str]:
+    """通知的接收用户ID"""
+    from usercenter.models import User, Department
+    from usercenter.dep_tree import get_subtree_ids
+    query = Q(pk__in=MailBox.public_user.through.objects.filter(mailbox_id=notice.pk).values('user_id'))
+    if notice.is_public:
+        query |= Q(sys_id=notice.sys_id)
+    dep_ids = list(notice.departments.values_list('pk', flat=True))
+    if dep_ids:
+        if notice.department_range == '本级及以下':
+            child_ids = get_subtree_ids(notice.sys_id, notice.org_id, dep_ids)
+            if child_ids is None:
+                child_ids = list(Department.objects.get_queryset_descendants(
+                    Department.objects.filter(pk__in=dep_ids), include_self=True
+                ).values_list('pk', flat=True))
+            dep_ids = child_ids
+        query |= Q(department_id__in=dep_ids)
+    return set(User.objects.filter(query).values_list('pk', flat=True))
+
+
+def get_user_notice_ids(user) -> Set[str]:
+    """用户可以查看的通知ID"""
+    from usercenter.dep_tree import get_tree
+    query = Q(is_public=True, sys_id=user.sys_id) | Q(public_user=user)
+    if user.department_id:
+        tree = get_tree(user.sys_id, user.org_id)
+        if user.department_id in tree:
+            ancestors = tree.get_ancestors(user.department_id)
+        else:
+            ancestors = list(user.department.get_ancestors().values_list('pk', flat=True))
+        query |= Q(departments=user.department_id)
+        if ancestors:
+            query |= Q(departments__in=ancestors, department_range='本级及以下')
+    return set(MailBox.objects.filter(query, category='notice').values_list('pk', flat=True))
+
+
+def rebuild_notice(notice_id: str) -> int:
+    """重新计算一条通知的收件索引，返回接收用户数量"""
+    notice = MailBox.objects.filter(pk=notice_id, category='notice').first()
+    with transaction.atomic():
+        if notice is None:
+            NoticeInbox.objects.filter(notice_id=notice_id).delete()
+            return 0
+        user_ids = get_notice_user_ids(notice)
+        existing = set(NoticeInbox.objects.filter(notice_id=notice_id).values_list('user_id', flat=True))
+        removed = existing - user_ids
+        if removed:
+            NoticeInbox.objects.filter(notice_id=notice_id, user_id__in=removed).delete()
+        NoticeInbox.objects.bulk_create([
+            NoticeInbox(user_id=user_id, notice_id=notice_id) for user_id in user_ids - existing
+        ], batch_size=NOTICE_INBOX_BATCH_SIZE, ignore_conflicts=True)
+    return len(user_ids)
+
+
+def rebuild_user(user_id: str) -> int:
+    """重新计算一个用户的收件索引，返回可查看的通知数量"""
+    from usercenter.models import User
+    user = User.objects.filter(pk=user_id).select_related('department').first()
+    with transaction.atomic():
+        if user is None:
+            NoticeInbox.objects.filter(user_id=user_id).delete()
+            return 0
+        notice_ids = get_user_notice_ids(user)
+        existing = set(NoticeInbox.objects.filter(user_id=user_id).values_list('notice_id', flat=True))
+        removed = existing - notice_ids
+        if removed:
+            NoticeInbox.objects.filter(user_id=user_id, notice_id__in=removed).delete()
+        NoticeInbox.objects.bulk_create([
+            NoticeInbox(user_id=user_id, notice_id=notice_id) for notice_id in notice_ids - existing
+        ], batch_size=NOTICE_INBOX_BATCH_SIZE, ignore_conflicts=True)
+    return len(notice_ids)
+
+
+def get_department_notice_ids(sys_id: int, org_id: int) -> List[str]:
+    """按部门范围公开的通知，部门结构变化时需要重新计算"""
+    return list(
+        MailBox.objects.filter(
+            category='notice', sys_id=sys_id, org_id=org_id, departments__isnull=False
+        ).order_by().values_list('pk', flat=True).distinct()
+    )
+
+
+def _get_pending() -> Set[tuple]:
+    """
+    当前事务中已安排在提交后计算的 (kind, pk)。
+    事务提交、回滚或回滚到保存点时 Django 都会替换 connection.run_on_commit 列表，
+    列表变化后原有的安排已执行或已丢弃，重新开始记录。
+    """
+    state = getattr(_local, 'state', None)
+    if state is None or state[0] is not connection.run_on_commit:
+        state = _local.state = (connection.run_on_commit, set())
+    return state[1]
+
+
+def _schedule(kind: str, pk: str, func):
+    """同一事务内多次修改只在提交后计算一次"""
+    pending = _get_pending()
+    if (kind, pk) in pending:
+        return
+
+    def run():
+        pending.discard((kind, pk))
+        try:
+            func(pk)
+        except Exception as e:
+            logger.error(f'notice inbox rebuild {kind} {pk} error: {e}', exc_info=e)
+
+    pending.add((kind, pk))
+    transaction.on_commit(run)
+
+
+def schedule_notice(notice_id: str):
+    _schedule('notice', notice_id, rebuild_notice)
+
+
+def schedule_user(user_id: str):
+    _schedule('user', user_id, rebuild_user)
+
+
+def schedule_notices(notice_ids: Iterable[str]):
+    for notice_id in notice_ids:
+        schedule_notice(notice_id)
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "重新计算全部通知公告的收件索引"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sys-id', dest='sys_id', default=None, type=int,
+                            help='只计算该系统的通知')
+
+    def handle(self, *args, **options):
+        from notice.inbox import rebuild_notice
+        from notice.models import MailBox
+        qs = MailBox.objects.filter(category='notice')
+        if options['sys_id'] is not None:
+            qs = qs.filter(sys_id=options['sys_id'])
+        count = 0
+        for notice_id in qs.order_by('pk').values_list('pk', flat=True).iterator():
+            rebuild_notice(notice_id)
+            count += 1
+        self.stdout.write(f"计算 {count} 条通知的收件索引")
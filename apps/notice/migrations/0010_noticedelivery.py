@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import utility.db_fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('notice', '0009_noticepool_error_message'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NoticeDelivery',
+            fields=[
+                ('id', utility.db_fields.TableNamePKField('nd', editable=False, serialize=False)),
+                ('sys_id', models.IntegerField(db_index=True, default=1, verbose_name='系统ID')),
+                ('org_id', models.IntegerField(db_index=True, default=1, verbose_name='组织ID')),
+                ('channel', models.CharField(choices=[('email', 'email'), ('sms', '短信'), ('wxa', '微信小程序'), ('mailbox', '站内信')], help_text='发送渠道', max_length=16, verbose_name='发送渠道')),
+                ('status', models.CharField(choices=[('pending', '待发送'), ('sent', '已发送'), ('failed', '发送失败'), ('skipped', '无接收地址')], db_index=True, default='pending', help_text='状态', max_length=16, verbose_name='状态')),
+                ('error_message', models.TextField(blank=True, help_text='错误信息', null=True, verbose_name='错误信息')),
+                ('create_time', models.DateTimeField(auto_now_add=True, help_text='创建时间', verbose_name='创建时间')),
+                ('update_time', models.DateTimeField(auto_now=True, help_text='更新时间', verbose_name='更新时间')),
+                ('notice', models.ForeignKey(db_constraint=False, help_text='通知ID', on_delete=django.db.models.deletion.CASCADE, related_name='deliveries', to='notice.noticepool', verbose_name='通知')),
+                ('user', models.ForeignKey(db_constraint=False, help_text='接收用户ID', on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='接收用户')),
+            ],
+            options={
+                'verbose_name': '03.通知发送记录',
+                'verbose_name_plural': '03.通知发送记录',
+                'unique_together': {('notice', 'user')},
+            },
+        ),
+    ]
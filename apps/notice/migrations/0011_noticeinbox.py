@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('notice', '0010_noticedelivery'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NoticeInbox',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('notice', models.ForeignKey(db_constraint=False, help_text='通知ID', on_delete=django.db.models.deletion.CASCADE, related_name='inbox_entries', to='notice.mailbox', verbose_name='通知')),
+                ('user', models.ForeignKey(db_constraint=False, help_text='用户ID', on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='用户')),
+            ],
+            options={
+                'verbose_name': '04.通知收件索引',
+                'verbose_name_plural': '04.通知收件索引',
+                'unique_together': {('user', 'notice')},
+            },
+        ),
+    ]
@@ -0,0 +1,53 @@
+from django.conf import settings
+from django.db import migrations
+from django.db.models import Q
+
+BATCH_SIZE = 2000
+
+
+def get_notice_user_ids(apps, notice):
+    """通知的接收用户ID，与 notice.inbox.get_notice_user_ids 的公开范围一致"""
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    Department = apps.get_model('usercenter', 'Department')
+    query = Q(pk__in=notice.public_user.through.objects.filter(mailbox_id=notice.pk).values('user_id'))
+    if notice.is_public:
+        query |= Q(sys_id=notice.sys_id)
+    departments = list(Department.objects.filter(
+        pk__in=notice.departments.through.objects.filter(mailbox_id=notice.pk).values('department_id')
+    ))
+    if departments:
+        if notice.department_range == '本级及以下':
+            dep_query = Q()
+            for dep in departments:
+                dep_query |= Q(tree_id=dep.tree_id, lft__gte=dep.lft, rght__lte=dep.rght)
+            query |= Q(department_id__in=Department.objects.filter(dep_query).values('pk'))
+        else:
+            query |= Q(department_id__in=[dep.pk for dep in departments])
+    return User.objects.filter(query).values_list('pk', flat=True)
+
+
+def backfill_notice_inbox(apps, schema_editor):
+    """查看我的通知只查询收件索引，为已有的通知公告计算索引"""
+    MailBox = apps.get_model('notice', 'MailBox')
+    NoticeInbox = apps.get_model('notice', 'NoticeInbox')
+    for notice in MailBox.objects.filter(category='notice').order_by('pk').iterator():
+        NoticeInbox.objects.bulk_create([
+            NoticeInbox(user_id=user_id, notice_id=notice.pk)
+            for user_id in get_notice_user_ids(apps, notice)
+        ], batch_size=BATCH_SIZE, ignore_conflicts=True)
+
+
+def clear_notice_inbox(apps, schema_editor):
+    apps.get_model('notice', 'NoticeInbox').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usercenter', '0025_userpermissionset'),
+        ('notice', '0011_noticeinbox'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_notice_inbox, clear_notice_inbox),
+    ]
@@ -141,32 +141,46 @@ class NoticePool(models.Model):
         pass
 
     def send_mailbox(self):
-        if self.send_to:
-            for user in self.send_to.all():
-                MailBox.objects.create(
-                    sys_id=self.sys_id, org_id=self.org_id, biz_id=self.biz_id,
-                    src_id=self.src_id, obj_id=self.obj_id, obj_type=self.obj_type,
-                    title=self.title, content=self.content, from_user=self.from_user,
-                    user=user, category='mailbox', msg_type=self.msg_type,
-                )
+        from .delivery import deliver_mailbox
+        deliver_mailbox(self)
 
     def send_sms(self):
-        from .tasks import send_sms
-        send_sms.delay(self.pk)
+        self.send_chunked()
 
     def send_email(self):
-        from .tasks import send_email
+        self.send_chunked()
+
+    def send_chunked(self):
+        """短信、邮件按分片分发到 celery 任务发送"""
+        from .delivery import deliver_chunked
         try:
-            send_email(self)
+            deliver_chunked(self)
         except Exception as e:
             self.is_sent = False
             self.error_message = str(e)
             self.save()
             raise e
 
+    def next_send_time(self, now):
+        """循环发送的下一次发送时间，错过的多次发送合并为一次"""
+        if not (self.is_circulation and self.circulation_time and self.send_time):
+            return None
+        send_time = self.send_time + self.circulation_time
+        if send_time <= now:
+            periods = (now - send_time) // self.circulation_time + 1
+            send_time += self.circulation_time * periods
+        return send_time
+
     def send(self):
         if self.is_sent:
             return
+        self.dispatch()
+        self.is_sent = True
+        self.save()
+        self.do_circulation()
+
+    def dispatch(self):
+        """按发送渠道发送，不修改发送状态"""
         if self.channel == 'email':
             # 发送邮件
             self.send_email()
@@ -181,6 +195,59 @@ class NoticePool(models.Model):
             self.send_mailbox()
         else:
             pass
-        self.is_sent = True
-        self.save()
-        self.do_circulation()
+
+
+class NoticeDelivery(models.Model):
+    """
+    通知发送记录，每个接收用户一条
+    """
+    STATUS = (
+        ('pending', '待发送', ),
+        ('sent', '已发送', ),
+        ('failed', '发送失败', ),
+        ('skipped', '无接收地址', ),
+    )
+    id = TableNamePKField('nd')
+    sys_id = models.IntegerField('系统ID', default=1, db_index=True)
+    org_id = models.IntegerField('组织ID', default=1, db_index=True)
+    notice = models.ForeignKey(
+        NoticePool, on_delete=models.CASCADE, related_name='deliveries',
+        verbose_name='通知', help_text='通知ID', db_constraint=False
+    )
+    user = models.ForeignKey(
+        'usercenter.User', on_delete=models.CASCADE, related_name='+',
+        verbose_name='接收用户', help_text='接收用户ID', db_constraint=False
+    )
+    channel = models.CharField('发送渠道', max_length=16, choices=NoticePool.CHANNELS, help_text='发送渠道')
+    status = models.CharField('状态', max_length=16, choices=STATUS, default='pending', db_index=True, help_text='状态')
+    error_message = models.TextField('错误信息', null=True, blank=True, help_text='错误信息')
+    create_time = models.DateTimeField('创建时间', auto_now_add=True, help_text='创建时间')
+    update_time = models.DateTimeField('更新时间', auto_now=True, help_text='更新时间')
+
+    class Meta:
+        verbose_name = '03.通知发送记录'
+        verbose_name_plural = verbose_name
+        unique_together = ['notice', 'user']
+
+    def __str__(self):
+        return "{} {} {}".format(self.notice_id, self.user_id, self.status)
+
+
+class NoticeInbox(models.Model):
+    """
+    通知收件索引，通知发布时按公开范围展开为用户到通知的映射
+    """
+    id = models.BigAutoField(primary_key=True)
+    user = models.ForeignKey(
+        'usercenter.User', on_delete=models.CASCADE, related_name='+',
+        verbose_name='用户', help_text='用户ID', db_constraint=False
+    )
+    notice = models.ForeignKey(
+        MailBox, on_delete=models.CASCADE, related_name='inbox_entries',
+        verbose_name='通知', help_text='通知ID', db_constraint=False
+    )
+
+    class Meta:
+        verbose_name = '04.通知收件索引'
+        verbose_name_plural = verbose_name
+        unique_together = ['user', 'notice']
@@ -0,0 +1,132 @@
+"""
+通知池定时发送。
+
+定时任务按发送时间以 `SELECT ... FOR UPDATE SKIP LOCKED` 分批领取到期的通知，
+同一事务内标记为已发送，循环发送的通知直接计算下一次发送时间（错过的多次合并为一次），
+事务提交后每个通知一个 celery 任务发送。多个 worker 或重叠的定时任务不会重复领取同一通知。
+
+`NOTICE_CHANNEL_RATE_LIMITS` 配置各发送渠道每分钟最多领取的通知数量，超出的留到下一次定时任务。
+"""
+
+import time
+import logging
+from typing import Dict, List
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Min
+from django.utils import timezone
+
+from .models import NoticeDelivery, NoticePool
+
+logger = logging.getLogger('celery.task')
+
+# 每个事务领取的通知数量
+NOTICE_SCHEDULER_BATCH_SIZE = getattr(settings, 'NOTICE_SCHEDULER_BATCH_SIZE', 100)
+# 每次定时任务最多领取的通知数量，避免积压时一次向消息队列写入过多任务
+NOTICE_SCHEDULER_MAX_PER_RUN = getattr(settings, 'NOTICE_SCHEDULER_MAX_PER_RUN', 1000)
+# 各发送渠道每分钟最多领取的通知数量，如 {'sms': 60, 'email': 120}，未配置的渠道不限制
+NOTICE_CHANNEL_RATE_LIMITS = getattr(settings, 'NOTICE_CHANNEL_RATE_LIMITS', {})
+
+RATE_KEY = 'notice:scheduler-rate:{}:{}'
+
+
+def get_rate_key(channel: str) -> str:
+    return RATE_KEY.format(channel, int(time.time() // 60))
+
+
+def get_channel_quota(channel: str, wanted: int) -> int:
+    """渠道本分钟内还可以领取的数量"""
+    limit = NOTICE_CHANNEL_RATE_LIMITS.get(channel)
+    if limit is None:
+        return wanted
+    used = cache.get(get_rate_key(channel)) or 0
+    return max(min(wanted, limit - used), 0)
+
+
+def use_channel_quota(channel: str, count: int):
+    if not count or NOTICE_CHANNEL_RATE_LIMITS.get(channel) is None:
+        return
+    key = get_rate_key(channel)
+    cache.add(key, 0, timeout=120)
+    cache.incr(key, count)
+
+
+def claim_batch(channel: str, limit: int) -> List[str]:
+    """领取一批到期通知，同一事务内标记已发送或计算下一次发送时间"""
+    now = timezone.now()
+    with transaction.atomic():
+        notices = list(
+            NoticePool.objects.select_for_update(skip_locked=True).filter(
+                is_sent=False, send_time__lte=now, channel=channel
+            ).order_by('send_time')[:limit]
+        )
+        for notice in notices:
+            next_time = notice.next_send_time(now)
+            if next_time is None:
+                notice.is_sent = True
+            else:
+                notice.send_time = next_time
+            notice.save(update_fields=['is_sent', 'send_time', 'last_modify'])
+        ids = [notice.pk for notice in notices]
+        if ids:
+            from .tasks import deliver_notice
+            transaction.on_commit(lambda: [deliver_notice.delay(pk) for pk in ids])
+    return ids
+
+
+def run() -> Dict[str, int]:
+    """领取全部渠道的到期通知，返回各渠道领取的数量"""
+    result = {}
+    total = 0
+    for channel, _ in NoticePool.CHANNELS:
+        count = 0
+        while total < NOTICE_SCHEDULER_MAX_PER_RUN:
+            wanted = min(NOTICE_SCHEDULER_BATCH_SIZE, NOTICE_SCHEDULER_MAX_PER_RUN - total)
+            limit = get_channel_quota(channel, wanted)
+            if not limit:
+                break
+            ids = claim_batch(channel, limit)
+            use_channel_quota(channel, len(ids))
+            count += len(ids)
+            total += len(ids)
+            if len(ids) < limit:
+                break
+        if count:
+            result[channel] = count
+    if total:
+        logger.info(f'notice scheduler claimed {result}')
+    return result
+
+
+def get_stats() -> dict:
+    """队列深度：各渠道到期未发送的通知数、最早到期距今秒数、待发送的发送记录数、本分钟已领取数"""
+    now = timezone.now()
+    due = {
+        row['channel']: row
+        for row in NoticePool.objects.filter(is_sent=False, send_time__lte=now).order_by().values(
+            'channel'
+        ).annotate(count=Count('pk'), oldest=Min('send_time'))
+    }
+    pending = dict(
+        NoticeDelivery.objects.filter(status='pending').order_by().values('channel').annotate(
+            count=Count('pk')
+        ).values_list('channel', 'count')
+    )
+    scheduled = NoticePool.objects.filter(is_sent=False, send_time__gt=now).count()
+    channels = {}
+    for channel, _ in NoticePool.CHANNELS:
+        row = due.get(channel)
+        channels[channel] = {
+            'due': row['count'] if row else 0,
+            'lag_seconds': round((now - row['oldest']).total_seconds(), 3) if row else 0,
+            'pending_deliveries': pending.get(channel, 0),
+            'rate_limit': NOTICE_CHANNEL_RATE_LIMITS.get(channel),
+            'rate_used': cache.get(get_rate_key(channel)) or 0,
+        }
+    return {
+        'due': sum(i['due'] for i in channels.values()),
+        'scheduled': scheduled,
+        'channels': channels,
+    }
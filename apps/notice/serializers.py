@@ -131,23 +131,26 @@ class MailBoxBulkCreateSerializer(serializers.ModelSerializer):
     def validate(self, attr):
         users = attr['users']
         sys_id = attr['sys_id']
+        uids = [uid for uid in users.split(',')]
+        found = {
+            user.pk: user for user in User.objects.filter(pk__in=set(uids), sys_id=sys_id)
+        }
         ulist = []
-        for uid in users.split(','):
-            try:
-                user = User.objects.get(pk=uid, sys_id=sys_id)
-                ulist.append(user)
-            except User.DoesNotExist:
+        for uid in uids:
+            if uid not in found:
                 raise serializers.ValidationError(f'user id {uid} not found!')
+            ulist.append(found[uid])
         attr['users'] = ulist
         return attr
 
     def create(self, validated_data):
+        from .unread import incr_unread
         validated_data['category'] = 'mailbox'
         users = validated_data.pop('users')
-        mails = []
-        for user in users:
-            validated_data['user'] = user
-            mails.append(super().create(validated_data))
+        mails = models.MailBox.objects.bulk_create([
+            models.MailBox(user=user, **validated_data) for user in users
+        ])
+        incr_unread([user.pk for user in users])
         return mails
 
 
@@ -169,3 +172,23 @@ class MailBoxMarkAllReadSerializer(serializers.Serializer):
 
     def update(self, instance, validated_data):
         pass
+
+
+class NoticeDeliverySerializer(serializers.ModelSerializer):
+    user_full_name = serializers.CharField(read_only=True, source='user.full_name')
+
+    class Meta:
+        model = models.NoticeDelivery
+        fields = (
+            'pk',
+            'sys_id',
+            'org_id',
+            'notice',
+            'user',
+            'user_full_name',
+            'channel',
+            'status',
+            'error_message',
+            'create_time',
+            'update_time',
+        )
@@ -0,0 +1,58 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+from mptt.signals import node_moved
+
+from usercenter.models import User, Department
+from . import inbox, unread
+from .models import MailBox
+
+# 影响用户可查看通知的字段
+USER_INBOX_FIELDS = {'sys_id', 'org_id', 'department'}
+
+
+@receiver(post_save, sender=MailBox)
+def update_mailbox_index(sender, instance: MailBox, created, **kwargs):
+    if instance.category == 'notice':
+        inbox.schedule_notice(instance.pk)
+    elif created:
+        if not instance.is_read:
+            unread.incr_unread([instance.user_id])
+    else:
+        unread.invalidate_unread(instance.user_id)
+
+
+@receiver(post_delete, sender=MailBox)
+def delete_mailbox_index(sender, instance: MailBox, **kwargs):
+    if instance.category == 'mailbox' and not instance.is_read:
+        unread.invalidate_unread(instance.user_id)
+
+
+@receiver(m2m_changed, sender=MailBox.public_user.through)
+@receiver(m2m_changed, sender=MailBox.departments.through)
+def update_notice_scope(sender, instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith('post'):
+        return
+    if not reverse:
+        inbox.schedule_notice(instance.pk)
+    elif isinstance(instance, User):
+        inbox.schedule_user(instance.pk)
+    elif pk_set:
+        inbox.schedule_notices(pk_set)
+    else:
+        inbox.schedule_notices(inbox.get_department_notice_ids(instance.sys_id, instance.org_id))
+
+
+@receiver(post_save, sender=User)
+def update_user_inbox(sender, instance: User, created, update_fields=None, **kwargs):
+    if created or update_fields is None or USER_INBOX_FIELDS & set(update_fields):
+        inbox.schedule_user(instance.pk)
+
+
+@receiver(post_delete, sender=Department)
+@receiver(node_moved, sender=Department)
+def update_department_inbox(sender, instance: Department, **kwargs):
+    """部门移动、删除后，按部门范围公开的通知重新计算"""
+    from .tasks import rebuild_department_notice_inbox
+    sys_id, org_id = instance.sys_id, instance.org_id
+    transaction.on_commit(lambda: rebuild_department_notice_inbox.delay(sys_id, org_id))
@@ -1,9 +1,5 @@
 import logging
 from celery import shared_task
-from django.utils import timezone
-from django.core.mail.backends.smtp import EmailBackend
-from django.core.mail import EmailMessage
-from system.models import EmailConfig, SMSConfig
 from .models import NoticePool
 
 logger = logging.getLogger('celery.task')
@@ -11,9 +7,9 @@ logger = logging.getLogger('celery.task')
 
 @shared_task
 def send_notice_from_pool():
-    nps = NoticePool.objects.filter(is_sent=False, send_time__lte=timezone.now()).values_list('id', flat=True).order_by()
-    for id in nps:
-        send_notice_from_poolid.delay(id)
+    """领取到期的通知并分发发送任务"""
+    from .scheduler import run
+    return run()
 
 
 @shared_task
@@ -25,49 +21,37 @@ def send_notice_from_poolid(np_id):
         logger.error(e)
 
 
-def send_email(notice_pool: NoticePool) -> tuple[bool, str]:
-    email_config = EmailConfig.objects.filter(system__sys_id=notice_pool.sys_id).first()
-    if email_config is None:
-        raise ValueError('EmailConfig not configured!')
-    backend = EmailBackend(
-        host=email_config.host,
-        port=email_config.port,
-        username=email_config.username,
-        password=email_config.password,
-        use_ssl=email_config.use_ssl,
-        use_tls=email_config.use_tls,
-        timeout=10,
-    )
-    to_emails = [user.email for user in notice_pool.send_to.all() if user.email]
-    message = EmailMessage(
-        subject=notice_pool.title or '通知',
-        body=notice_pool.content,
-        from_email=email_config.from_email,
-        to=to_emails,
-        connection=backend,
-    )
+@shared_task
+def deliver_notice(np_id):
+    """发送已由定时任务领取的通知"""
     try:
-        message.send()
-        return True, notice_pool.pk
+        np = NoticePool.objects.get(id=np_id)
+        np.dispatch()
     except Exception as e:
-        logger.error(f'send email error: {e}', exc_info=True)
-        raise e
+        logger.error(e)
+
+
+@shared_task
+def deliver_notice_chunk(np_id, user_ids):
+    """短信、邮件分片发送"""
+    from .delivery import deliver_chunk
+    return deliver_chunk(np_id, user_ids)
 
 
 @shared_task
 def send_sms(np_id) -> None:
-    from system.utils.send_sms_message import send_sms_message
+    """兼容已进入队列的短信任务，按分片重新分发"""
     notice_pool = NoticePool.objects.filter(pk=np_id).first()
     if notice_pool is None:
         raise ValueError('NoticePool not found!')
-    sms_config = SMSConfig.objects.filter(system__sys_id=notice_pool.sys_id, is_enabled=True).first()
-    if sms_config is None:
-        notice_pool.is_sent = False
-        notice_pool.error_message = 'SMSConfig not configured!'
-        notice_pool.save()
-        raise ValueError('SMSConfig not configured!')
-    for user in notice_pool.send_to.filter(mobile__isnull=False):
-        try:
-            send_sms_message(notice_pool.sys_id, user.mobile, notice_pool.content)
-        except Exception as e:
-            logger.error('send_sms_message error', exc_info=e)
+    notice_pool.send_sms()
+
+
+@shared_task
+def rebuild_department_notice_inbox(sys_id, org_id):
+    """部门结构变化后重新计算按部门范围公开的通知的收件索引"""
+    from .inbox import get_department_notice_ids, rebuild_notice
+    notice_ids = get_department_notice_ids(sys_id, org_id)
+    for notice_id in notice_ids:
+        rebuild_notice(notice_id)
+    return len(notice_ids)
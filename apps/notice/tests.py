@@ -0,0 +1,84 @@
+import importlib
+
+from django.apps import apps
+from django.db import connection, transaction
+from django.test import TestCase
+
+from usercenter.models import User, Department
+from . import inbox
+from .models import MailBox, NoticeInbox
+
+SYS_ID = 9001
+
+
+class NoticeInboxTestCase(TestCase):
+    """通知收件索引"""
+
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.parent = Department.objects.create(sys_id=SYS_ID, name='parent')
+            self.child = Department.objects.create(sys_id=SYS_ID, name='child', parent=self.parent)
+            self.parent_user = User.objects.create(sys_id=SYS_ID, username='inbox-parent', department=self.parent)
+            self.child_user = User.objects.create(sys_id=SYS_ID, username='inbox-child', department=self.child)
+            self.other_user = User.objects.create(sys_id=SYS_ID + 1, username='inbox-other')
+
+    def create_notice(self, departments=(), public_users=(), **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            notice = MailBox.objects.create(category='notice', sys_id=SYS_ID, **kwargs)
+            notice.departments.set(departments)
+            notice.public_user.set(public_users)
+        return notice
+
+    def get_receivers(self, notice):
+        return set(notice.inbox_entries.values_list('user_id', flat=True))
+
+    def test_public(self):
+        notice = self.create_notice(is_public=True)
+        self.assertEqual(self.get_receivers(notice), {self.parent_user.pk, self.child_user.pk})
+
+    def test_public_user(self):
+        notice = self.create_notice(is_public=False, public_users=[self.other_user])
+        self.assertEqual(self.get_receivers(notice), {self.other_user.pk})
+
+    def test_department_range(self):
+        notice = self.create_notice(is_public=False, departments=[self.parent], department_range='本级')
+        self.assertEqual(self.get_receivers(notice), {self.parent_user.pk})
+        notice = self.create_notice(is_public=False, departments=[self.parent], department_range='本级及以下')
+        self.assertEqual(self.get_receivers(notice), {self.parent_user.pk, self.child_user.pk})
+
+    def test_backfill(self):
+        # 迁移为收件索引创建前已有的通知计算索引，结果与发布时计算的一致
+        notices = [
+            self.create_notice(is_public=True),
+            self.create_notice(is_public=False, public_users=[self.other_user]),
+            self.create_notice(is_public=False, departments=[self.child], department_range='本级'),
+            self.create_notice(is_public=False, departments=[self.parent], department_range='本级及以下'),
+        ]
+        expected = [self.get_receivers(notice) for notice in notices]
+        NoticeInbox.objects.all().delete()
+        migration = importlib.import_module('notice.migrations.0012_backfill_noticeinbox')
+        with connection.schema_editor() as schema_editor:
+            migration.backfill_notice_inbox(apps, schema_editor)
+        self.assertEqual([self.get_receivers(notice) for notice in notices], expected)
+
+    def test_user_department_changed(self):
+        notice = self.create_notice(is_public=False, departments=[self.child], department_range='本级')
+        self.assertEqual(self.get_receivers(notice), {self.child_user.pk})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.child_user.department = self.parent
+            self.child_user.save()
+        self.assertEqual(self.get_receivers(notice), set())
+        self.assertEqual(inbox.get_user_notice_ids(self.child_user), set())
+
+    def test_rolled_back_schedule(self):
+        notice = self.create_notice(is_public=False)
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    notice.public_user.add(self.parent_user)
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+            # 回滚后同一事务中再次修改，仍需在提交后重新计算
+            notice.public_user.add(self.child_user)
+        self.assertEqual(self.get_receivers(notice), {self.child_user.pk})
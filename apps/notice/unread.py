@@ -0,0 +1,61 @@
+"""
+站内信未读数量计数。
+
+未读数量缓存在 Redis 中，首次查询时 COUNT 一次，之后由新增、标记已读、全部已读维护：
+新增未读站内信时加一（批量写入时按用户累加），全部已读时置零，
+其他修改或删除站内信时删除计数，下次查询重新统计。
+"""
+
+import logging
+from collections import Counter
+from typing import Iterable
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import MailBox
+
+logger = logging.getLogger('restapi')
+
+# 未读数量的缓存时间（秒），到期后重新统计一次，用于修正漏记的变化
+NOTICE_UNREAD_TTL = getattr(settings, 'NOTICE_UNREAD_TTL', 24 * 60 * 60)
+
+UNREAD_KEY = 'notice:mailbox-unread:{}'
+
+
+def get_unread_count(user_id: str) -> int:
+    key = UNREAD_KEY.format(user_id)
+    count = cache.get(key)
+    if count is None:
+        count = MailBox.objects.filter(category='mailbox', user_id=user_id, is_read=False).count()
+        cache.add(key, count, NOTICE_UNREAD_TTL)
+    return count
+
+
+def _incr(counts: Counter):
+    for user_id, count in counts.items():
+        try:
+            cache.incr(UNREAD_KEY.format(user_id), count)
+        except ValueError:
+            # 没有计数时下次查询再统计
+            pass
+        except Exception as e:
+            logger.error(f'notice unread incr {user_id} error: {e}', exc_info=e)
+
+
+def incr_unread(user_ids: Iterable[str]):
+    """事务提交后为每条新增的未读站内信加一，user_ids 可重复"""
+    counts = Counter(i for i in user_ids if i)
+    if counts:
+        transaction.on_commit(lambda: _incr(counts))
+
+
+def invalidate_unread(user_id: str):
+    if user_id:
+        transaction.on_commit(lambda: cache.delete(UNREAD_KEY.format(user_id)))
+
+
+def reset_unread(user_id: str):
+    """全部标记已读后置零"""
+    transaction.on_commit(lambda: cache.set(UNREAD_KEY.format(user_id), 0, NOTICE_UNREAD_TTL))
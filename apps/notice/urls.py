@@ -11,6 +11,8 @@ router.register(r'mailboxbulkcreate', api.MailBoxBulkCreateViewSet)
 router.register(r'mailbox-mark-all-read', api.MailBoxMarkAllReadView)
 router.register(r'mailbox-unread-count', api.MailBoxUnreadCountView)
 router.register(r'noticepool', api.NoticePoolViewSet)
+router.register(r'noticedelivery', api.NoticeDeliveryViewSet)
+router.register(r'noticepool-stats', api.NoticePoolStatsViewSet, basename='noticepool-stats')
 
 
 urlpatterns = (
@@ -100,12 +100,18 @@ def jwt_decode_handler(token):
     options = {
         'verify_exp': api_settings.JWT_VERIFY_EXPIRATION,
     }
-    # get user from token, BEFORE verification, to get user secret key
-    unverified_payload = jwt.decode(token, None, False)
-    secret_key = jwt_get_secret_key(unverified_payload)
+    if api_settings.JWT_PUBLIC_KEY:
+        secret_key = api_settings.JWT_PUBLIC_KEY
+    elif api_settings.JWT_GET_USER_SECRET_KEY:
+        # get user from token, BEFORE verification, to get user secret key
+        unverified_payload = jwt.decode(token, None, False)
+        secret_key = jwt_get_secret_key(unverified_payload)
+    else:
+        # the secret key does not depend on the payload, skip the unverified decode
+        secret_key = api_settings.JWT_SECRET_KEY
     return jwt.decode(
         token,
-        api_settings.JWT_PUBLIC_KEY or secret_key,
+        secret_key,
         api_settings.JWT_VERIFY,
         options=options,
         leeway=api_settings.JWT_LEEWAY,
@@ -6,6 +6,8 @@ from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet, ReadOnlyModelViewSet, GenericViewSet
 from usercenter.permissions import IsSuperuserOrReadOnly, IsSuperuser
 from usercenter.serializers import FuncPermissionSerializer
+from usercenter.pagination import KeysetPaginationMixin
+from utility.tree import TreeListMixin
 
 from . import filters
 from . import models
@@ -112,9 +114,10 @@ class SystemProjectRouterViewSet(ReadOnlyModelViewSet):
     search_fields = ('name',)
 
 
-class SystemPRViewSet(ModelViewSet):
+class SystemPRViewSet(TreeListMixin, ModelViewSet):
     """系统项目工程路由配置"""
     queryset = models.SystemProjectRouter.objects.order_by('sys_id', 'project', 'tree_id')
+    tree_queryset = models.SystemProjectRouter.objects.select_related('permission')
     serializer_class = serializers.SystemPRSerializer
     permission_classes = [IsSuperuserOrReadOnly]
     filter_backends = (DjangoFilterBackend,)
@@ -137,7 +140,7 @@ class SystemPRMoveView(GenericViewSet):
             return Response({'error': True, 'msg': serializer.errors})
 
 
-class SystemPMViewSet(ModelViewSet):
+class SystemPMViewSet(TreeListMixin, ModelViewSet):
     """系统项目工程菜单配置"""
     queryset = models.SystemProjectMenu.objects.order_by('sys_id', 'project', 'tree_id')
     serializer_class = serializers.SystemPMSerializer
@@ -152,7 +155,7 @@ class SystemPMViewSet(ModelViewSet):
         return super().list(request, *args, **kwargs)
 
 
-class MySystemPMViewSet(ReadOnlyModelViewSet):
+class MySystemPMViewSet(TreeListMixin, ReadOnlyModelViewSet):
     """当前用户的系统项目工程菜单"""
     queryset = models.SystemProjectMenu.objects.order_by('sys_id', 'project', 'tree_id')
     serializer_class = serializers.MySystemPMSerializer
@@ -177,7 +180,7 @@ class MySystemPMViewSet(ReadOnlyModelViewSet):
         if user.is_anonymous:
             self._perms = []
         else:
-            self._perms = list(tuple(user.get_permissions().values_list('pk', flat=True)))
+            self._perms = list(user.get_permission_set().permission_ids)
         return self._perms
 
 
@@ -197,8 +200,8 @@ class SystemPMMoveView(GenericViewSet):
             return Response({'error': True, 'msg': serializer.errors})
 
 
-class SystemLogViewSet(ModelViewSet):
-    """系统日志"""
+class SystemLogViewSet(KeysetPaginationMixin, ModelViewSet):
+    """系统日志，请求参数中带有 cursor 时使用游标分页，传 with_count=false 时不统计总数"""
     queryset = models.SystemLog.objects.order_by('-create_time')
     serializer_class = serializers.SystemLogSerializer
     permission_classes = [IsAuthenticated]
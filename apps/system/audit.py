@@ -0,0 +1,196 @@
+"""
+系统日志（SystemLog）异步写入。
+
+请求中调用 `log()` 只把日志记录追加到缓冲，由后台批量 bulk_create 写入数据库。
+在事务中调用时，事务提交后才追加到缓冲，事务回滚时不记录：
+
+- `SYSTEM_AUDIT_MODE = 'redis'`：追加到 Redis 列表，由 celery 定时任务或 `flush_audit_log` 命令写入；
+  写入时加锁，先读取一批、写入数据库、再从列表删除，主键在追加时生成，重复写入时忽略冲突，
+  进程异常退出不会丢失日志
+- `SYSTEM_AUDIT_MODE = 'memory'`：追加到进程内队列，由后台线程定时写入，进程退出时写入剩余日志，
+  进程异常退出时可能丢失
+- `SYSTEM_AUDIT_MODE = 'sync'`：直接写入数据库
+
+`SYSTEM_AUDIT_GUARANTEED = True` 时追加到 Redis 失败会改为直接写入数据库，否则只记录错误日志。
+"""
+
+import json
+import time
+import atexit
+import logging
+import threading
+from collections import deque
+from typing import List, Optional
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import SystemLog
+
+logger = logging.getLogger('restapi')
+
+# 写入方式：redis、memory、sync
+SYSTEM_AUDIT_MODE = getattr(settings, 'SYSTEM_AUDIT_MODE', 'redis')
+# 追加到缓冲失败时是否直接写入数据库
+SYSTEM_AUDIT_GUARANTEED = getattr(settings, 'SYSTEM_AUDIT_GUARANTEED', True)
+# 每批写入的日志数量
+SYSTEM_AUDIT_BATCH_SIZE = getattr(settings, 'SYSTEM_AUDIT_BATCH_SIZE', 1000)
+# 进程内队列的写入间隔（秒）
+SYSTEM_AUDIT_FLUSH_INTERVAL = getattr(settings, 'SYSTEM_AUDIT_FLUSH_INTERVAL', 2)
+
+BUFFER_KEY = 'system:audit-log'
+LOCK_KEY = 'system:audit-log:lock'
+LOCK_TIMEOUT = 60
+
+FIELDS = (
+    'id', 'sys_id', 'org_id', 'biz_id', 'src_id', 'log_level', 'log_type',
+    'template_id', 'user_id', 'user_name', 'content', 'create_time',
+)
+
+
+def make_record(sys_id=1, org_id=1, log_type=None, content=None, user=None, user_name=None,
+                template_id=None, log_level=0, biz_id=1, src_id=1) -> dict:
+    return {
+        'id': SystemLog._meta.pk.get_default(),
+        'sys_id': sys_id,
+        'org_id': org_id,
+        'biz_id': biz_id,
+        'src_id': src_id,
+        'log_level': log_level,
+        'log_type': log_type,
+        'template_id': template_id,
+        'user_id': getattr(user, 'pk', user),
+        'user_name': user_name,
+        'content': content,
+        'create_time': timezone.now(),
+    }
+
+
+def build_logs(records: List[dict]) -> List[SystemLog]:
+    logs = []
+    for record in records:
+        data = {k: record.get(k) for k in FIELDS}
+        if isinstance(data['create_time'], str):
+            data['create_time'] = parse_datetime(data['create_time'])
+        logs.append(SystemLog(**data))
+    return logs
+
+
+def write_records(records: List[dict]) -> int:
+    """批量写入数据库，已写入的日志忽略"""
+    if not records:
+        return 0
+    SystemLog.objects.bulk_create(build_logs(records), batch_size=SYSTEM_AUDIT_BATCH_SIZE, ignore_conflicts=True)
+    return len(records)
+
+
+def get_connection():
+    from django_redis import get_redis_connection
+    return get_redis_connection('default')
+
+
+class MemoryBuffer(object):
+    """进程内队列，后台线程定时批量写入"""
+
+    def __init__(self):
+        self.queue = deque()
+        self.event = threading.Event()
+        self.lock = threading.Lock()
+        self.thread = None  # type: Optional[threading.Thread]
+
+    def append(self, record: dict):
+        self.queue.append(record)
+        if self.thread is None or not self.thread.is_alive():
+            with self.lock:
+                if self.thread is None or not self.thread.is_alive():
+                    self.thread = threading.Thread(target=self.run, name='system-audit-log', daemon=True)
+                    self.thread.start()
+        if len(self.queue) >= SYSTEM_AUDIT_BATCH_SIZE:
+            self.event.set()
+
+    def drain(self) -> List[dict]:
+        records = []
+        while self.queue and len(records) < SYSTEM_AUDIT_BATCH_SIZE:
+            records.append(self.queue.popleft())
+        return records
+
+    def flush(self) -> int:
+        total = 0
+        with self.lock:
+            while self.queue:
+                records = self.drain()
+                try:
+                    total += write_records(records)
+                except Exception as e:
+                    logger.error(f'system audit log flush {len(records)} error: {e}', exc_info=e)
+        return total
+
+    def run(self):
+        while True:
+            self.event.wait(SYSTEM_AUDIT_FLUSH_INTERVAL)
+            self.event.clear()
+            self.flush()
+            close_old_connections()
+
+
+memory_buffer = MemoryBuffer()
+atexit.register(memory_buffer.flush)
+
+
+def append(record: dict):
+    if SYSTEM_AUDIT_MODE == 'sync':
+        write_records([record])
+    elif SYSTEM_AUDIT_MODE == 'memory':
+        memory_buffer.append(record)
+    else:
+        try:
+            get_connection().rpush(BUFFER_KEY, json.dumps(record, cls=DjangoJSONEncoder))
+        except Exception as e:
+            logger.error(f'system audit log append error: {e}', exc_info=e)
+            if SYSTEM_AUDIT_GUARANTEED:
+                write_records([record])
+
+
+def log(**kwargs):
+    """记录系统日志，参数同 SystemLog 字段，user 可为用户或用户ID；操作时间为调用时间，事务提交后追加到缓冲"""
+    record = make_record(**kwargs)
+    transaction.on_commit(lambda: append(record))
+
+
+def flush(max_seconds: Optional[float] = None) -> int:
+    """把 Redis 缓冲中的日志写入数据库，同一时间只有一个进程写入，返回写入数量"""
+    r = get_connection()
+    token = str(time.time_ns())
+    if not r.set(LOCK_KEY, token, nx=True, ex=LOCK_TIMEOUT):
+        return 0
+    deadline = time.monotonic() + max_seconds if max_seconds else None
+    total = 0
+    try:
+        while True:
+            items = r.lrange(BUFFER_KEY, 0, SYSTEM_AUDIT_BATCH_SIZE - 1)
+            if not items:
+                break
+            records = []
+            for item in items:
+                try:
+                    records.append(json.loads(item))
+                except ValueError as e:
+                    logger.error(f'system audit log invalid record {item!r}: {e}')
+            write_records(records)
+            # 写入成功后再从缓冲删除
+            r.ltrim(BUFFER_KEY, len(items), -1)
+            total += len(records)
+            r.expire(LOCK_KEY, LOCK_TIMEOUT)
+            if deadline and time.monotonic() > deadline:
+                break
+    finally:
+        if r.get(LOCK_KEY) == token.encode():
+            r.delete(LOCK_KEY)
+    return total
+
+
+def get_length() -> int:
+    return get_connection().llen(BUFFER_KEY)
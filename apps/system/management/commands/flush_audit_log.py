@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "把系统日志缓冲写入数据库"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', dest='once', action='store_true',
+                            help='缓冲为空后退出')
+        parser.add_argument('--interval', dest='interval', default=1, type=float,
+                            help='缓冲为空时的等待时间（秒）')
+
+    def handle(self, *args, **options):
+        from system import audit
+        if options['once']:
+            count = audit.flush()
+            self.stdout.write(f"写入 {count} 条系统日志")
+            return
+        while True:
+            try:
+                if not audit.flush():
+                    time.sleep(options['interval'])
+            except KeyboardInterrupt:
+                break
+            except Exception as e:
+                self.stderr.write(f"写入失败: {e}")
+                time.sleep(5)
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "系统日志表分区管理：convert 转换为按月分区的表，maintain 创建后续分区并删除过期日志"
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', choices=['convert', 'maintain', 'status'],
+                            help='convert: 转换为分区表; maintain: 创建分区并按保留期限删除; status: 查看分区')
+
+    def handle(self, *args, **options):
+        from system import partitions
+        action = options['action']
+        if action == 'convert':
+            if partitions.is_partitioned():
+                self.stdout.write("系统日志表已经是分区表")
+                return
+            partitions.convert()
+            self.stdout.write(self.style.SUCCESS("系统日志表已转换为分区表"))
+        elif action == 'maintain':
+            result = partitions.maintain()
+            purged = ', '.join(f'{k}: {v}' for k, v in result['purged'].items())
+            self.stdout.write(
+                f"分区表: {result['partitioned']}, 分区: {', '.join(result['created'])}, "
+                f"删除分区: {', '.join(result['dropped'])}, 删除日志: {purged}"
+            )
+        else:
+            if not partitions.is_partitioned():
+                self.stdout.write("系统日志表未分区")
+                return
+            for name in partitions.list_partitions():
+                self.stdout.write(name)
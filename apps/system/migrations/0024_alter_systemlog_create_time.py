@@ -0,0 +1,17 @@
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('system', '0023_alter_smsconfig_sms_type_emailconfig'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='systemlog',
+            name='create_time',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False, verbose_name='操作时间'),
+        ),
+    ]
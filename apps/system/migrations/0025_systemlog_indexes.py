@@ -0,0 +1,107 @@
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+import django.db.models.deletion
+
+TABLE = 'system_systemlog'
+# 原单列索引（db_index）的字段，字符类型的字段另有 varchar_pattern_ops 的 _like 索引
+FIELD_INDEX_COLUMNS = ('sys_id', 'org_id', 'biz_id', 'src_id', 'log_type', 'template_id', 'user_id')
+LIKE_INDEX_COLUMNS = ('log_type', 'template_id', 'user_id')
+
+
+def get_field_indexes(schema_editor):
+    """原单列索引的 (名称, 字段)，名称与 Django 创建时生成的一致"""
+    indexes = [(schema_editor._create_index_name(TABLE, [c]), c) for c in FIELD_INDEX_COLUMNS]
+    indexes += [
+        (schema_editor._create_index_name(TABLE, [c], suffix='_like'), f'{c} varchar_pattern_ops')
+        for c in LIKE_INDEX_COLUMNS
+    ]
+    return indexes
+
+
+def drop_field_indexes(apps, schema_editor):
+    for name, _ in get_field_indexes(schema_editor):
+        schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {schema_editor.quote_name(name)}')
+
+
+def create_field_indexes(apps, schema_editor):
+    for name, columns in get_field_indexes(schema_editor):
+        schema_editor.execute(
+            f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {schema_editor.quote_name(name)} ON {TABLE} ({columns})'
+        )
+
+
+class Migration(migrations.Migration):
+    # 系统日志表数据量大，索引并发创建、删除，不阻塞日志写入
+    atomic = False
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('system', '0024_alter_systemlog_create_time'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='systemlog',
+            index=models.Index(fields=['sys_id', 'org_id', '-create_time'], name='syslog_sys_org_ctime'),
+        ),
+        AddIndexConcurrently(
+            model_name='systemlog',
+            index=models.Index(fields=['sys_id', 'log_type', '-create_time'], name='syslog_sys_type_ctime'),
+        ),
+        AddIndexConcurrently(
+            model_name='systemlog',
+            index=models.Index(fields=['template_id', '-create_time'], name='syslog_template_ctime'),
+        ),
+        AddIndexConcurrently(
+            model_name='systemlog',
+            index=models.Index(fields=['user', '-create_time'], name='syslog_user_ctime'),
+        ),
+        AddIndexConcurrently(
+            model_name='systemlog',
+            index=models.Index(fields=['-create_time'], name='syslog_ctime'),
+        ),
+        # 组合索引创建后再删除被其覆盖的单列索引
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='systemlog',
+                    name='sys_id',
+                    field=models.IntegerField(default=1, verbose_name='系统ID'),
+                ),
+                migrations.AlterField(
+                    model_name='systemlog',
+                    name='org_id',
+                    field=models.IntegerField(default=1, verbose_name='组织ID'),
+                ),
+                migrations.AlterField(
+                    model_name='systemlog',
+                    name='biz_id',
+                    field=models.IntegerField(default=1, verbose_name='业务ID'),
+                ),
+                migrations.AlterField(
+                    model_name='systemlog',
+                    name='src_id',
+                    field=models.IntegerField(default=1, verbose_name='数据源ID'),
+                ),
+                migrations.AlterField(
+                    model_name='systemlog',
+                    name='log_type',
+                    field=models.CharField(blank=True, help_text='日志类别', max_length=32, null=True, verbose_name='日志类别'),
+                ),
+                migrations.AlterField(
+                    model_name='systemlog',
+                    name='template_id',
+                    field=models.CharField(blank=True, help_text='模板ID', max_length=32, null=True, verbose_name='模板ID'),
+                ),
+                migrations.AlterField(
+                    model_name='systemlog',
+                    name='user',
+                    field=models.ForeignKey(blank=True, db_constraint=False, db_index=False, help_text='User ID', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL),
+                ),
+            ],
+            database_operations=[
+                migrations.RunPython(drop_field_indexes, create_field_indexes),
+            ],
+        ),
+    ]
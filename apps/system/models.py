@@ -433,24 +433,33 @@ class SystemProjectMenu(MPTTModel):
 
 class SystemLog(models.Model):
     id = TableNamePKField('SYSLOG')
-    sys_id = models.IntegerField('系统ID', default=1, db_index=True)
-    org_id = models.IntegerField('组织ID', default=1, db_index=True)
-    biz_id = models.IntegerField('业务ID', default=1, db_index=True)
-    src_id = models.IntegerField('数据源ID', default=1, db_index=True)
+    sys_id = models.IntegerField('系统ID', default=1)
+    org_id = models.IntegerField('组织ID', default=1)
+    biz_id = models.IntegerField('业务ID', default=1)
+    src_id = models.IntegerField('数据源ID', default=1)
     log_level = models.IntegerField('日志级别', choices=LOG_LEVELS, default=0, help_text='日志级别')
-    log_type = models.CharField('日志类别', max_length=32, db_index=True, null=True, blank=True, help_text='日志类别')
-    template_id = models.CharField('模板ID', max_length=32, db_index=True, null=True, blank=True, help_text='模板ID')
+    log_type = models.CharField('日志类别', max_length=32, null=True, blank=True, help_text='日志类别')
+    template_id = models.CharField('模板ID', max_length=32, null=True, blank=True, help_text='模板ID')
     user = models.ForeignKey(
         'usercenter.User', on_delete=models.SET_NULL, null=True, blank=True, help_text='User ID', db_constraint=False,
-        related_name='+'
+        related_name='+', db_index=False
     )
     content = models.TextField('日志内容', null=True, blank=True, help_text='日志内容')
     user_name = models.CharField('操作用户名', max_length=64, null=True, blank=True, help_text='操作用户名')
-    create_time = models.DateTimeField('操作时间', auto_now_add=True)
+    # 日志异步批量写入，操作时间在记录日志时生成
+    create_time = models.DateTimeField('操作时间', default=timezone.now, editable=False)
 
     class Meta:
         verbose_name = '系统日志'
         verbose_name_plural = verbose_name
+        # 日志按操作时间倒序查看，索引均以操作时间结尾，按 SystemLogFilterSet 的常用条件组合
+        indexes = [
+            models.Index(fields=['sys_id', 'org_id', '-create_time'], name='syslog_sys_org_ctime'),
+            models.Index(fields=['sys_id', 'log_type', '-create_time'], name='syslog_sys_type_ctime'),
+            models.Index(fields=['template_id', '-create_time'], name='syslog_template_ctime'),
+            models.Index(fields=['user', '-create_time'], name='syslog_user_ctime'),
+            models.Index(fields=['-create_time'], name='syslog_ctime'),
+        ]
 
 
 class SystemDataBackup(models.Model):
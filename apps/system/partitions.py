@@ -0,0 +1,113 @@
+"""
+系统日志（SystemLog）按时间分区存储及数据保留。
+
+分区模式由 `system_log_partition convert` 命令开启：原表改名为 system_systemlog_legacy，
+新建按 create_time 范围分区的 system_systemlog，原表作为最早的分区挂载（见 utility.partitions），
+分区表使用模型中定义的索引。
+
+定时任务 `maintain_log_partitions` 提前创建后续分区并按保留期限删除过期日志，删除前导出为
+gzip 压缩的 CSV 文件保存到文件存储：
+
+- `SYSTEM_LOG_RETENTION_DAYS`：日志默认保留天数，为 None 时不删除
+- `SYSTEM_LOG_TYPE_RETENTION_DAYS`：按日志类别配置保留天数，如 {'登录日志': 90}，值为 None 时该类别不删除
+
+分区结束时间早于全部类别的保留期限时直接导出并删除整个分区，
+保留期限较短的类别在分区删除之前按类别分批删除，未开启分区模式时全部按行分批删除。
+"""
+
+import logging
+from typing import Optional
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.utils.text import get_valid_filename
+
+from utility.partitions import PartitionedTable, get_cutoff
+from .models import SystemLog
+
+logger = logging.getLogger('restapi')
+
+# 提前创建的分区数量，按月分区
+SYSTEM_LOG_PARTITION_PREMAKE = getattr(settings, 'SYSTEM_LOG_PARTITION_PREMAKE', 2)
+# 日志默认保留天数，为 None 时不删除
+SYSTEM_LOG_RETENTION_DAYS = getattr(settings, 'SYSTEM_LOG_RETENTION_DAYS', None)
+# 按日志类别配置的保留天数
+SYSTEM_LOG_TYPE_RETENTION_DAYS = getattr(settings, 'SYSTEM_LOG_TYPE_RETENTION_DAYS', {})
+# 删除前是否导出
+SYSTEM_LOG_ARCHIVE = getattr(settings, 'SYSTEM_LOG_ARCHIVE', True)
+# 导出文件在文件存储中的目录
+SYSTEM_LOG_ARCHIVE_DIR = getattr(settings, 'SYSTEM_LOG_ARCHIVE_DIR', 'system/log/archive')
+# 按行删除时每次删除的行数
+SYSTEM_LOG_PURGE_BATCH_SIZE = getattr(settings, 'SYSTEM_LOG_PURGE_BATCH_SIZE', 10000)
+
+TABLE = SystemLog._meta.db_table
+
+log_table = PartitionedTable(
+    SystemLog, period='month', premake=SYSTEM_LOG_PARTITION_PREMAKE, archive=SYSTEM_LOG_ARCHIVE,
+    archive_dir=SYSTEM_LOG_ARCHIVE_DIR, label='system log',
+)
+
+is_partitioned = log_table.is_partitioned
+list_partitions = log_table.list_partitions
+ensure_partitions = log_table.ensure_partitions
+convert = log_table.convert
+
+
+def get_partition_retention_days() -> Optional[int]:
+    """可以整个删除分区的保留天数：全部类别保留天数的最大值，有类别不删除时为 None"""
+    days = [SYSTEM_LOG_RETENTION_DAYS, *SYSTEM_LOG_TYPE_RETENTION_DAYS.values()]
+    if None in days:
+        return None
+    return max(days)
+
+
+def purge_expired_rows(query: Q, days: int, label: str) -> int:
+    """导出并分批删除符合条件且早于保留期限的日志"""
+    cutoff = get_cutoff(days)
+    queryset = SystemLog.objects.filter(query, create_time__lt=cutoff)
+    if not queryset.exists():
+        return 0
+    if SYSTEM_LOG_ARCHIVE:
+        columns = [f.attname for f in SystemLog._meta.concrete_fields]
+        sql, params = queryset.order_by().values(*columns).query.sql_with_params()
+        with connection.cursor() as cursor:
+            sql = cursor.mogrify(sql, params).decode()
+        path = log_table.copy_to_storage(sql, get_valid_filename(f'{TABLE}_{label}_before_{cutoff:%Y%m%d}'))
+        logger.info(f'system log {label} before {cutoff} archived to {path}')
+    count = 0
+    while True:
+        pks = list(queryset.order_by().values_list('pk', flat=True)[:SYSTEM_LOG_PURGE_BATCH_SIZE])
+        if not pks:
+            break
+        deleted, _ = queryset.filter(pk__in=pks).delete()
+        count += deleted
+        if len(pks) < SYSTEM_LOG_PURGE_BATCH_SIZE:
+            break
+    return count
+
+
+def purge_expired(partition_days: Optional[int]) -> dict:
+    """按类别删除保留期限短于整个分区删除期限的日志"""
+    purged = {}
+    for log_type, days in SYSTEM_LOG_TYPE_RETENTION_DAYS.items():
+        if days is None or (partition_days is not None and days >= partition_days):
+            continue
+        purged[log_type] = purge_expired_rows(Q(log_type=log_type), days, log_type)
+    if SYSTEM_LOG_RETENTION_DAYS is not None and (
+            partition_days is None or SYSTEM_LOG_RETENTION_DAYS < partition_days):
+        query = ~Q(log_type__in=list(SYSTEM_LOG_TYPE_RETENTION_DAYS)) if SYSTEM_LOG_TYPE_RETENTION_DAYS else Q()
+        purged['*'] = purge_expired_rows(query, SYSTEM_LOG_RETENTION_DAYS, 'other')
+    return {k: v for k, v in purged.items() if v}
+
+
+def maintain() -> dict:
+    """创建后续分区，按保留期限删除过期日志"""
+    result = {'partitioned': is_partitioned(), 'created': [], 'dropped': [], 'purged': {}}
+    partition_days = get_partition_retention_days() if result['partitioned'] else None
+    if result['partitioned']:
+        result['created'] = ensure_partitions()
+    result['purged'] = purge_expired(partition_days)
+    if partition_days is not None:
+        result['dropped'] = log_table.drop_expired_partitions(partition_days)
+    return result
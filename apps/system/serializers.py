@@ -5,6 +5,7 @@ from rest_framework.serializers import ValidationError
 from rest_framework.validators import UniqueTogetherValidator
 
 from usercenter.serializers import FuncPermissionSerializer
+from utility import tree
 from . import models
 
 
@@ -189,10 +190,10 @@ class SystemPRSerializer(ModelSerializer):
         )
 
     def get_child_serializer_data(self, children):
-        return SystemPRSerializer(children, many=True).data
+        return SystemPRSerializer(children, many=True, context=tree.get_child_context(self.context)).data
 
     def get_children(self, obj):
-        children = obj.children.all()
+        children = tree.get_children(self.context, obj)
         childrens = self.get_child_serializer_data(children)
         result = []
         result.extend(childrens)
@@ -263,10 +264,10 @@ class SystemPMSerializer(ModelSerializer):
         )
 
     def get_child_serializer_data(self, children):
-        return SystemPMSerializer(children, many=True).data
+        return SystemPMSerializer(children, many=True, context=tree.get_child_context(self.context)).data
 
     def get_children(self, obj):
-        children = obj.children.all()
+        children = tree.get_children(self.context, obj)
         childrens = self.get_child_serializer_data(children)
         result = []
         result.extend(childrens)
@@ -295,9 +296,16 @@ class MySystemPMSerializer(ModelSerializer):
 
     def get_children(self, obj):
         perms = self.context['view'].perms_cache
-        children = obj.children.filter(
-            Q(permission__in=perms) | Q(permission__isnull=True)
-        )
+        if tree.TREE_CHILDREN in self.context:
+            perm_set = set(perms)
+            children = [
+                c for c in tree.get_children(self.context, obj)
+                if c.permission_id is None or c.permission_id in perm_set
+            ]
+        else:
+            children = obj.children.filter(
+                Q(permission__in=perms) | Q(permission__isnull=True)
+            )
         childrens = self.get_child_serializer_data(children)
         result = []
         result.extend(childrens)
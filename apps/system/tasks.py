@@ -0,0 +1,21 @@
+from celery import shared_task
+from django.conf import settings
+
+# 每次定时任务写入系统日志的最长时间（秒），应小于定时任务间隔
+SYSTEM_AUDIT_FLUSH_SECONDS = getattr(settings, 'SYSTEM_AUDIT_FLUSH_SECONDS', 4)
+
+
+@shared_task
+def flush_audit_log():
+    """系统日志缓冲批量写入数据库"""
+    from system import audit
+    if audit.SYSTEM_AUDIT_MODE != 'redis' and not audit.get_length():
+        return 0
+    return audit.flush(max_seconds=SYSTEM_AUDIT_FLUSH_SECONDS)
+
+
+@shared_task
+def maintain_log_partitions():
+    """创建后续的系统日志分区，按保留期限导出并删除过期日志"""
+    from system import partitions
+    return partitions.maintain()
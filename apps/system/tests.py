@@ -0,0 +1,76 @@
+import os
+import datetime
+import tempfile
+from unittest import mock
+
+from django.db import connection
+from django.test import TransactionTestCase, override_settings
+
+from . import partitions
+from .models import SystemLog
+
+LOGIN = '登录日志'
+OTHER = '操作日志'
+
+
+class SystemLogPartitionTestCase(TransactionTestCase):
+    """系统日志分区及按类别保留"""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.media_root = tmp.name
+
+    def create_log(self, log_type, days=0):
+        return SystemLog.objects.create(
+            log_type=log_type, content=log_type,
+            create_time=datetime.datetime.now() - datetime.timedelta(days=days),
+        )
+
+    def maintain(self, days, type_days):
+        with mock.patch.multiple(partitions, SYSTEM_LOG_RETENTION_DAYS=days, SYSTEM_LOG_TYPE_RETENTION_DAYS=type_days), \
+                override_settings(MEDIA_ROOT=self.media_root):
+            return partitions.maintain()
+
+    def get_archives(self):
+        return sorted(os.listdir(os.path.join(self.media_root, partitions.SYSTEM_LOG_ARCHIVE_DIR)))
+
+    def get_log_ids(self):
+        return set(SystemLog.objects.values_list('pk', flat=True))
+
+    def test_convert_and_purge(self):
+        # 未分区时按类别删除，其他类别不删除
+        self.create_log(LOGIN, days=100)
+        other = self.create_log(OTHER, days=100)
+        result = self.maintain(None, {LOGIN: 30})
+        self.assertFalse(result['partitioned'])
+        self.assertEqual(result['purged'], {LOGIN: 1})
+        self.assertEqual(self.get_log_ids(), {other.pk})
+
+        old_login = self.create_log(LOGIN, days=100)
+        partitions.convert()
+        self.assertTrue(partitions.is_partitioned())
+        self.assertIn(partitions.log_table.legacy_table, partitions.list_partitions())
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT indexname FROM pg_indexes WHERE tablename = %s', [partitions.TABLE])
+            index_names = {row[0] for row in cursor.fetchall()}
+        self.assertTrue({index.name for index in SystemLog._meta.indexes} <= index_names)
+
+        # 转换后写入、更新
+        current = self.create_log(OTHER)
+        current.content = 'changed'
+        current.save()
+        self.assertEqual(SystemLog.objects.get(pk=current.pk).content, 'changed')
+        self.assertEqual(self.get_log_ids(), {other.pk, old_login.pk, current.pk})
+
+        # 分区内仍有未过期的日志时只按类别删除
+        result = self.maintain(365, {LOGIN: 30})
+        self.assertEqual(result['purged'], {LOGIN: 1})
+        self.assertEqual(result['dropped'], [])
+        self.assertEqual(self.get_log_ids(), {other.pk, current.pk})
+
+        # 原表中的日志全部过期后整个删除
+        result = self.maintain(60, {LOGIN: 30})
+        self.assertEqual(result['dropped'], [partitions.log_table.legacy_table])
+        self.assertEqual(self.get_log_ids(), {current.pk})
+        self.assertEqual(len(self.get_archives()), 3)
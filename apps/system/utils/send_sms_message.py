@@ -16,9 +16,15 @@ except ImportError:
 from system.models import System, SMSConfig
 
 
-def send_sms_message(sys_id: int, phone, message) -> None:
+def get_sms_config(sys_id: int):
     system = System.objects.get(sys_id=sys_id)
-    sms_config = SMSConfig.objects.filter(system=system, is_enabled=True).first()
+    return SMSConfig.objects.filter(system=system, is_enabled=True).first()
+
+
+def send_sms_message(sys_id: int, phone, message, sms_config=None) -> None:
+    """发送短信，批量发送时可传入已查询的 sms_config"""
+    if sms_config is None:
+        sms_config = get_sms_config(sys_id)
     if sms_config is None:
         raise SystemError('SMSConfig not configured!')
     if sms_config.sms_type == 'TENCENT':
@@ -1,8 +1,11 @@
+from collections import defaultdict
+
 from django_filters.rest_framework import DjangoFilterBackend
 from django.utils import timezone
 from rest_framework import viewsets, permissions, filters
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
+from utility import tree
 
 from .filters import UserFilterSet, DepartmentFilterSet, FuncPermissionTreeFilterSet
 from .permissions import CsrfExemptSessionAuthentication, BasicAuthentication
@@ -118,7 +121,7 @@ class PermissionViewSet(viewsets.ModelViewSet):
         return instance
 
 
-class PermissionTreeViewSet(viewsets.ReadOnlyModelViewSet):
+class PermissionTreeViewSet(tree.TreeListMixin, viewsets.ReadOnlyModelViewSet):
     """权限树API usercenter_funcpermission"""
     queryset = models.FuncPermission.objects.all()
     serializer_class = serializers.FuncPermissionTreeSerializer
@@ -159,9 +162,18 @@ class TreeDepartmentViewSet(viewsets.ModelViewSet):
     search_fields = ('name',)
 
     def list(self, request, *args, **kwargs):
-        qs = self.filter_queryset(models.Department.objects.root_nodes())
-        serializer = self.serializer_class(qs, many=True)
-        return Response(serializer.data)
+        """`use_cache=1` 时使用按部门版本号缓存的结果"""
+        if request.query_params.get('use_cache'):
+            data = tree.get_cached_data(
+                ['department-tree', request.get_full_path()], [models.Department], self.get_tree_data
+            )
+            return Response(data)
+        return Response(self.get_tree_data())
+
+    def get_tree_data(self):
+        qs = list(self.filter_queryset(models.Department.objects.root_nodes()))
+        context = tree.get_tree_context(models.Department.objects.prefetch_related('dep_manager'), qs)
+        return self.serializer_class(qs, many=True, context=context).data
 
 
 class TxlViewSet(viewsets.ReadOnlyModelViewSet):
@@ -173,12 +185,28 @@ class TxlViewSet(viewsets.ReadOnlyModelViewSet):
     filterset_fields = ('sys_id', 'org_id',)
 
     def list(self, request, *args, **kwargs):
+        """`use_cache=1` 时使用按部门、用户版本号缓存的结果"""
         if 'sys_id' not in request.GET:
             return Response([])
+        if request.query_params.get('use_cache'):
+            data = tree.get_cached_data(
+                ['txl', request.get_full_path()], [models.Department, models.User], self.get_tree_data
+            )
+            return Response(data)
+        return Response(self.get_tree_data())
+
+    def get_tree_data(self):
         qs = self.filter_queryset(models.Department.objects.root_nodes())
-        qs = models.Department.objects.filter(parent__in=qs).order_by('lft')
-        serializer = self.serializer_class(qs, many=True)
-        return Response(serializer.data)
+        qs = list(models.Department.objects.filter(parent__in=qs).order_by('lft'))
+        context = tree.get_tree_context(models.Department.objects.all(), qs)
+        # 一次查询这些树中全部部门的用户
+        users = defaultdict(list)
+        for user in models.User.objects.filter(
+            department__tree_id__in={d.tree_id for d in qs}
+        ).order_by('sort_num', 'full_name'):
+            users[user.department_id].append(user)
+        context['tree_users'] = users
+        return self.serializer_class(qs, many=True, context=context).data
 
 
 class MyInfoViewSet(viewsets.mixins.ListModelMixin, viewsets.GenericViewSet):
@@ -1,22 +1,21 @@
-from django.contrib.auth import get_user_model
 from django.utils.translation import gettext as _
 from rest_framework import exceptions
 from rest_framework_jwt.authentication import JSONWebTokenAuthentication
 
+from .principal import get_principal
+
 
 class MyJSONWebTokenAuthentication(JSONWebTokenAuthentication):
 
     def authenticate_credentials(self, payload):
-        User = get_user_model()
         user_id = payload.get('user_id')
 
         if not user_id:
             msg = _('Invalid payload.')
             raise exceptions.AuthenticationFailed(msg)
 
-        try:
-            user = User.objects.get(pk=user_id)
-        except User.DoesNotExist:
+        user = get_principal(user_id)
+        if user is None:
             msg = _('Invalid signature.')
             raise exceptions.AuthenticationFailed(msg)
 
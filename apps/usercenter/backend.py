@@ -27,11 +27,12 @@ class UserAuthBackend(ModelBackend):
         perm_cache_name = '_%s_perm_cache' % from_name
         if not hasattr(user_obj, perm_cache_name):
             if user_obj.is_superuser:
-                perms = FuncPermission.objects.all()
+                perms = set(FuncPermission.objects.values_list('codename', flat=True).order_by())
+            elif from_name == 'user':
+                perms = set(user_obj.func_codename_set)
             else:
-                perms = getattr(self, '_get_%s_permissions' % from_name)(user_obj)
-            perms = perms.values_list('codename', flat=True).order_by()
-            setattr(user_obj, perm_cache_name, set(perms))
+                perms = set(self._get_group_permissions(user_obj).values_list('codename', flat=True).order_by())
+            setattr(user_obj, perm_cache_name, perms)
         return getattr(user_obj, perm_cache_name)
 
     def authenticate(self, request, username=None, password=None, sys_id=None, **kwargs):
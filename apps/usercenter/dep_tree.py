@@ -0,0 +1,137 @@
+"""
+部门树索引。
+
+按 (sys_id, org_id) 一次查询出全部部门的树结构（pk、parent、tree_id、lft、rght、level），
+在进程内构建索引，上级、下级、子部门查找不再查询数据库。
+
+索引数据缓存在 Redis 中，缓存键包含版本号；部门新增、修改、删除、移动后递增版本号，
+各进程发现版本号变化后重新加载。
+"""
+
+import time
+import logging
+import threading
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+logger = logging.getLogger('restapi')
+
+# Redis 中部门树数据的缓存时间（秒）
+DEPARTMENT_TREE_TTL = getattr(settings, 'USERCENTER_DEPARTMENT_TREE_TTL', 24 * 60 * 60)
+
+TREE_VERSION_KEY = 'usercenter:department-tree-version:{}:{}'
+TREE_DATA_KEY = 'usercenter:department-tree:{}:{}:{}'
+
+
+class DepartmentTree(object):
+    """部门树索引，rows 为按 tree_id、lft 排序的 (pk, parent_id, tree_id, lft, rght, level)"""
+
+    def __init__(self, rows: List[tuple], version=None):
+        self.version = version
+        self.ids = [row[0] for row in rows]
+        self.index = {pk: i for i, pk in enumerate(self.ids)}
+        self.parents = {}  # type: Dict[str, Optional[str]]
+        # 含自身的子树节点数量，下级部门即 ids 中紧随其后的连续节点
+        self.sizes = []  # type: List[int]
+        self.children = defaultdict(list)  # type: Dict[Optional[str], List[str]]
+        self.ancestors = {}  # type: Dict[str, Tuple[str, ...]]
+        for pk, parent_id, tree_id, lft, rght, level in rows:
+            self.parents[pk] = parent_id
+            self.sizes.append((rght - lft + 1) // 2)
+            self.children[parent_id if parent_id in self.index else None].append(pk)
+            if parent_id in self.ancestors:
+                self.ancestors[pk] = self.ancestors[parent_id] + (parent_id,)
+            else:
+                self.ancestors[pk] = ()
+
+    def __contains__(self, pk):
+        return pk in self.index
+
+    @property
+    def roots(self) -> List[str]:
+        return list(self.children.get(None, []))
+
+    def get_children(self, pk) -> List[str]:
+        return list(self.children.get(pk, []))
+
+    def get_descendants(self, pk, include_self: bool = False) -> List[str]:
+        i = self.index[pk]
+        return self.ids[i if include_self else i + 1:i + self.sizes[i]]
+
+    def get_ancestors(self, pk, include_self: bool = False) -> List[str]:
+        ancestors = list(self.ancestors[pk])
+        if include_self:
+            ancestors.append(pk)
+        return ancestors
+
+    def get_subtree_ids(self, pks: Iterable) -> Optional[List[str]]:
+        """多个部门及其下级部门的并集，按 tree_id、lft 排序；有部门不在树中时返回 None"""
+        positions = set()
+        for pk in pks:
+            i = self.index.get(pk)
+            if i is None:
+                return None
+            positions.update(range(i, i + self.sizes[i]))
+        return [self.ids[i] for i in sorted(positions)]
+
+
+_local_trees = {}  # type: Dict[Tuple[int, int], DepartmentTree]
+_local_lock = threading.Lock()
+
+
+def get_version(sys_id: int, org_id: int):
+    key = TREE_VERSION_KEY.format(sys_id, org_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def load_rows(sys_id: int, org_id: int) -> List[tuple]:
+    from .models import Department
+    return list(
+        Department.objects.filter(sys_id=sys_id, org_id=org_id).order_by(
+            'tree_id', 'lft'
+        ).values_list('pk', 'parent_id', 'tree_id', 'lft', 'rght', 'level')
+    )
+
+
+def get_tree(sys_id: int, org_id: int) -> DepartmentTree:
+    """获取部门树索引，版本号未变化时直接使用进程内的索引"""
+    version = get_version(sys_id, org_id)
+    tree = _local_trees.get((sys_id, org_id))
+    if tree is not None and tree.version == version:
+        return tree
+    data_key = TREE_DATA_KEY.format(sys_id, org_id, version)
+    rows = cache.get(data_key)
+    if rows is None:
+        rows = load_rows(sys_id, org_id)
+        cache.set(data_key, rows, DEPARTMENT_TREE_TTL)
+    tree = DepartmentTree(rows, version)
+    with _local_lock:
+        _local_trees[(sys_id, org_id)] = tree
+    return tree
+
+
+def get_subtree_ids(sys_id: int, org_id: int, pks: Iterable) -> Optional[List[str]]:
+    return get_tree(sys_id, org_id).get_subtree_ids(pks)
+
+
+def invalidate(sys_id: int, org_id: int):
+    """在事务提交后递增部门树版本号"""
+    transaction.on_commit(lambda: _incr_version(sys_id, org_id))
+
+
+def _incr_version(sys_id: int, org_id: int):
+    key = TREE_VERSION_KEY.format(sys_id, org_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, time.time_ns(), timeout=None)
+    except Exception as e:
+        logger.error(f'usercenter department tree invalidate {sys_id}:{org_id} error: {e}', exc_info=e)
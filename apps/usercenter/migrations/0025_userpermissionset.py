@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usercenter', '0024_emailaccess'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserPermissionSet',
+            fields=[
+                ('user', models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='func_permission_set', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='用户')),
+                ('version', models.IntegerField(default=0, help_text='每次重新计算递增', verbose_name='版本')),
+                ('permission_ids', models.JSONField(default=list, verbose_name='功能权限ID')),
+                ('codenames', models.JSONField(default=list, verbose_name='功能权限codename')),
+                ('names', models.JSONField(default=list, verbose_name='功能权限名称')),
+                ('update_time', models.DateTimeField(auto_now=True, verbose_name='计算时间')),
+            ],
+            options={
+                'verbose_name': '07.用户有效功能权限',
+                'verbose_name_plural': '07.用户有效功能权限',
+            },
+        ),
+    ]
@@ -219,7 +219,7 @@ class User(AbstractBaseUser):
 
     @property
     def category_names(self):
-        return ",".join(self.category.all().values_list('name', flat=True))
+        return ",".join(c.name for c in self.category.all())
 
     def email_user(self, subject, message, from_email=None, **kwargs):
         if self.email:
@@ -249,37 +249,44 @@ class User(AbstractBaseUser):
             FuncPermission.objects.filter(pk__in=self.func_groups.all().values('permissions').distinct())
         )
 
+    def get_permission_set(self) -> 'UserPermissionSet':
+        """预计算的有效功能权限，不存在时重新计算"""
+        try:
+            return self.func_permission_set
+        except UserPermissionSet.DoesNotExist:
+            from .perm_sets import get_permission_set
+            permission_set = get_permission_set(self.pk)
+            self.func_permission_set = permission_set
+            return permission_set
+
+    @property
+    def func_codename_set(self) -> frozenset:
+        return self.get_permission_set().codename_set
+
     @property
     def func_names(self):
-        return list(self.get_permissions().values_list('name', flat=True))
+        return list(self.get_permission_set().names)
 
     @property
     def func_codenames(self):
-        return list(self.get_permissions().values_list('codename', flat=True))
+        return list(self.get_permission_set().codenames)
 
     @property
     def func_group_names(self):
-        return list(self.func_groups.values_list('name', flat=True))
+        return [g.name for g in self.func_groups.all()]
 
     def has_perm(self, perm, obj=None):
         # Active superusers have all permissions.
         if self.is_active and self.is_superuser:
             return True
-        perms_codes = self.func_codenames
-        if perm in perms_codes:
-            return True
-        return False
+        return perm in self.func_codename_set
 
     def has_perms(self, perm_list, obj=None):
         # Active superusers have all permissions.
         if self.is_active and self.is_superuser:
             return True
-        perms_codes = self.func_codenames
-        hp = True
-        for p in perm_list:
-            if p not in perms_codes:
-                hp = False
-        return hp
+        perms_codes = self.func_codename_set
+        return all(p in perms_codes for p in perm_list)
 
     def has_module_perms(self, app_label):
         # Active superusers have all permissions.
@@ -289,8 +296,22 @@ class User(AbstractBaseUser):
 
     @property
     def department_child_ids(self) -> str:
+        if hasattr(self, '_department_child_ids_cache'):
+            return self._department_child_ids_cache
+        from .dep_tree import get_subtree_ids
+        dep_ids = set(
+            Department.objects.filter(
+                models.Q(head_leader=self) | models.Q(dep_manager=self)
+            ).values_list('pk', flat=True).distinct()
+        )
+        if self.department_id:
+            dep_ids.add(self.department_id)
+        child_ids = get_subtree_ids(self.sys_id, self.org_id, dep_ids)
+        if child_ids is not None:
+            return ",".join(child_ids)
+        # 管理的部门不属于用户所在的系统、组织时按数据库查询
         leader_dep_qs = Department.objects.filter(head_leader=self)
-        self_dep_qs = Department.objects.filter(pk=self.department.pk)  # type: ignore
+        self_dep_qs = Department.objects.filter(pk=self.department_id)
         qs = self.dep_manager.all().union(self_dep_qs, leader_dep_qs)  # type: ignore
         qs = Department.objects.get_queryset_descendants(  # type: ignore
             Department.objects.filter(pk__in=qs.values('pk')),
@@ -306,6 +327,36 @@ class User(AbstractBaseUser):
             return []
 
 
+# 用户有效功能权限
+class UserPermissionSet(models.Model):
+    """
+    用户直接分配的功能权限与所属角色的功能权限的并集，
+    在用户角色、用户功能权限、角色功能权限变化时重新计算。
+    """
+    user = models.OneToOneField(
+        User, primary_key=True, on_delete=models.CASCADE, db_constraint=False,
+        related_name='func_permission_set', verbose_name='用户'
+    )
+    version = models.IntegerField('版本', default=0, help_text='每次重新计算递增')
+    permission_ids = models.JSONField('功能权限ID', default=list)
+    codenames = models.JSONField('功能权限codename', default=list)
+    names = models.JSONField('功能权限名称', default=list)
+    update_time = models.DateTimeField('计算时间', auto_now=True)
+
+    class Meta:
+        verbose_name = '07.用户有效功能权限'
+        verbose_name_plural = verbose_name
+
+    def __str__(self):
+        return str(self.user_id)
+
+    @property
+    def codename_set(self) -> frozenset:
+        if not hasattr(self, '_codename_set'):
+            self._codename_set = frozenset(self.codenames)
+        return self._codename_set
+
+
 # 机构部门模型
 class Department(MPTTModel):
     id = TableNamePKField('dep')
@@ -1,6 +1,12 @@
+import json
+import base64
+import datetime
 from collections import OrderedDict
+from django.db.models import F, Q
+from rest_framework.exceptions import ParseError
 from rest_framework.response import Response
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import BasePagination, PageNumberPagination, _positive_int
+from rest_framework.settings import api_settings
 
 
 class UCPageNumberPagination(PageNumberPagination):
@@ -41,3 +47,166 @@ class UCPageNumberPagination(PageNumberPagination):
                 'results': schema,
             },
         }
+
+
+def _cursor_value_default(value):
+    # datetime 需要保留微秒，不能使用 DjangoJSONEncoder
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    return str(value)
+
+
+class UCKeysetPagination(BasePagination):
+    """
+    游标分页（keyset），按上一页最后一行的排序字段值定位下一页，不使用 OFFSET。
+
+    第一页传空的 `cursor=`，之后传返回值中的 `next`，`next` 为 null 时没有下一页；
+    传 `with_count=false` 时不统计总数，返回的 `count` 为 null。
+    排序字段之后会自动追加唯一字段（默认 pk）保证顺序稳定。
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'pageSize'
+    count_query_param = 'with_count'
+    page_size = api_settings.PAGE_SIZE
+    max_page_size = 1000
+    default_ordering = ('-create_time',)
+    unique_fields = ('pk',)
+    key_prefix = 'keyset_'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_page_size(self, request):
+        try:
+            return _positive_int(
+                request.query_params[self.page_size_query_param],
+                strict=True,
+                cutoff=self.max_page_size
+            )
+        except (KeyError, ValueError):
+            return self.page_size
+
+    def get_ordering(self, queryset, view):
+        ordering = [o for o in queryset.query.order_by if isinstance(o, str)]
+        if '?' in ordering:
+            raise ParseError('Random ordering is not supported by cursor pagination')
+        if not ordering:
+            ordering = list(getattr(view, 'keyset_default_ordering', self.default_ordering))
+        names = [o.lstrip('-') for o in ordering]
+        desc = ordering[-1].startswith('-')
+        for field in getattr(view, 'keyset_unique_fields', self.unique_fields):
+            if field not in names:
+                ordering.append(f'-{field}' if desc else field)
+                names.append(field)
+        return ordering
+
+    def encode_cursor(self, position):
+        raw = json.dumps({'o': self.ordering, 'v': position}, default=_cursor_value_default)
+        return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+            ordering, position = cursor['o'], cursor['v']
+        except (TypeError, ValueError, KeyError, UnicodeError):
+            raise ParseError(self.invalid_cursor_message)
+        if ordering != self.ordering or len(position) != len(ordering):
+            raise ParseError(self.invalid_cursor_message)
+        return position
+
+    @staticmethod
+    def _after(field, value, desc):
+        """排序在 value 之后的条件，PostgreSQL 默认 ASC NULLS LAST / DESC NULLS FIRST"""
+        if value is None:
+            return Q(**{f'{field}__isnull': False}) if desc else None
+        if desc:
+            return Q(**{f'{field}__lt': value})
+        return Q(**{f'{field}__gt': value}) | Q(**{f'{field}__isnull': True})
+
+    def get_keyset_filter(self, position):
+        result = None
+        equal = Q()
+        for name, value in zip(self.ordering, position):
+            field = name.lstrip('-')
+            after = self._after(field, value, name.startswith('-'))
+            if after is not None:
+                term = equal & after
+                result = term if result is None else result | term
+            equal &= Q(**{f'{field}__isnull': True}) if value is None else Q(**{field: value})
+        if result is None:
+            return Q(pk__in=[])
+        return result
+
+    def get_position(self, row):
+        keys = [f'{self.key_prefix}{i}' for i in range(len(self.ordering))]
+        if isinstance(row, dict):
+            return [row[k] for k in keys]
+        return [getattr(row, k) for k in keys]
+
+    def strip_row(self, row):
+        if isinstance(row, dict):
+            return {k: v for k, v in row.items() if not k.startswith(self.key_prefix)}
+        return row
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(queryset, view)
+        self.count = None
+        if request.query_params.get(self.count_query_param) != 'false':
+            self.count = queryset.count()
+        position = self.decode_cursor(request)
+        queryset = queryset.order_by(*self.ordering).annotate(**{
+            f'{self.key_prefix}{i}': F(name.lstrip('-')) for i, name in enumerate(self.ordering)
+        })
+        if position is not None:
+            queryset = queryset.filter(self.get_keyset_filter(position))
+        rows = list(queryset[:page_size + 1])
+        self.next_cursor = None
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            self.next_cursor = self.encode_cursor(self.get_position(rows[-1]))
+        return [self.strip_row(row) for row in rows]
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('count', self.count),
+            ('next', self.next_cursor),
+            ('previous', False),
+            ('data', data)
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'count': {
+                    'type': 'integer',
+                    'nullable': True,
+                    'example': 123,
+                },
+                'next': {
+                    'type': 'string',
+                    'nullable': True,
+                },
+                'previous': {
+                    'type': 'boolean',
+                    'nullable': False,
+                    'example': False,
+                },
+                'results': schema,
+            },
+        }
+
+
+class KeysetPaginationMixin(object):
+    """请求参数中带有 cursor 时使用游标分页，否则使用默认的分页类"""
+    keyset_pagination_class = UCKeysetPagination
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator') and \
+                self.keyset_pagination_class.cursor_query_param in self.request.query_params:
+            self._paginator = self.keyset_pagination_class()
+        return super().paginator
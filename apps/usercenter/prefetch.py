@@ -0,0 +1,66 @@
+"""
+用户列表序列化的批量预加载。
+
+`UserSerializer` 中的部门名称、department_child_ids、有效功能权限、角色名称、分类名称
+原本按用户逐个查询，列表接口每行产生多次查询。序列化列表前对整页用户批量查询这些数据
+（下级部门通过部门树索引查找），写入用户对象的关联缓存，查询次数与每页用户数量无关。
+"""
+
+from collections import defaultdict
+from typing import Dict, List
+
+from django.db.models import prefetch_related_objects
+
+from . import perm_sets, dep_tree
+from .models import User, Department, UserPermissionSet
+
+
+def get_department_child_ids_map(users: List[User]) -> Dict[str, str]:
+    """用户ID -> department_child_ids，与 User.department_child_ids 结果相同"""
+    user_ids = [u.pk for u in users]
+    roots = defaultdict(set)
+    for user in users:
+        if user.department_id:
+            roots[user.pk].add(user.department_id)
+    for user_id, dep_id in Department.dep_manager.through.objects.filter(
+        user_id__in=user_ids
+    ).values_list('user_id', 'department_id'):
+        roots[user_id].add(dep_id)
+    for user_id, dep_id in Department.objects.filter(head_leader_id__in=user_ids).values_list('head_leader_id', 'pk'):
+        roots[user_id].add(dep_id)
+    result = {}
+    for user in users:
+        child_ids = dep_tree.get_subtree_ids(user.sys_id, user.org_id, roots.get(user.pk, ()))
+        if child_ids is None:
+            # 管理的部门不属于用户所在的系统、组织
+            result[user.pk] = user.department_child_ids
+        else:
+            result[user.pk] = ",".join(child_ids)
+    return result
+
+
+def prefetch_permission_sets(users: List[User]):
+    missing = [u for u in users if not User.func_permission_set.related.is_cached(u)]
+    if not missing:
+        return
+    permission_sets = UserPermissionSet.objects.in_bulk([u.pk for u in missing])
+    not_built = [u.pk for u in missing if u.pk not in permission_sets]
+    if not_built:
+        permission_sets.update(perm_sets.rebuild_permission_sets(not_built))
+    for user in missing:
+        if user.pk in permission_sets:
+            user.func_permission_set = permission_sets[user.pk]
+
+
+def prefetch_users(users: List[User]):
+    """批量加载用户序列化需要的关联数据"""
+    users = [u for u in users if u.pk]
+    if not users:
+        return
+    prefetch_related_objects(users, 'department', 'func_groups', 'func_user_permissions', 'category')
+    prefetch_permission_sets(users)
+    need_dep = [u for u in users if not hasattr(u, '_department_child_ids_cache')]
+    if need_dep:
+        child_ids = get_department_child_ids_map(need_dep)
+        for user in need_dep:
+            user._department_child_ids_cache = child_ids[user.pk]
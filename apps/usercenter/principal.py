@@ -0,0 +1,167 @@
+"""
+JWT 认证用户快照缓存。
+
+认证时不再每次查询用户表：用户字段、有效功能权限和 department_child_ids
+组成快照缓存在 Redis 中，进程内再以短过期时间的 LRU 缓存一层。
+
+用户、角色、功能权限、部门发生变化时删除相关用户的快照；
+部门树变化影响的用户无法直接确定，通过递增全局版本号使所有快照失效。
+进程内缓存无法跨进程失效，其过期时间即为其他进程看到变化的最长延迟。
+"""
+
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Iterable, Optional
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+
+logger = logging.getLogger('restapi')
+
+# Redis 中快照的缓存时间（秒）
+PRINCIPAL_CACHE_TTL = getattr(settings, 'USERCENTER_PRINCIPAL_CACHE_TTL', 5 * 60)
+# 进程内快照的缓存时间（秒），为 0 时不使用进程内缓存
+PRINCIPAL_LOCAL_TTL = getattr(settings, 'USERCENTER_PRINCIPAL_LOCAL_TTL', 5)
+# 进程内缓存的最大用户数量
+PRINCIPAL_LOCAL_MAXSIZE = getattr(settings, 'USERCENTER_PRINCIPAL_LOCAL_MAXSIZE', 1024)
+
+PRINCIPAL_KEY = 'usercenter:principal:{}'
+GENERATION_KEY = 'usercenter:principal-generation'
+PERMISSION_SET_FIELDS = ('version', 'permission_ids', 'codenames', 'names')
+# 不放入缓存的敏感字段，快照还原的用户对象中为延迟加载字段
+EXCLUDE_FIELDS = ('password', 'wechart_access_token', 'wechart_refresh_token', 'wechart_session_key')
+
+
+class LocalLRU(object):
+    """带过期时间的进程内 LRU 缓存"""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.data = OrderedDict()
+        self.lock = threading.RLock()
+
+    def get(self, key):
+        if self.ttl <= 0:
+            return None
+        with self.lock:
+            item = self.data.get(key)
+            if item is None:
+                return None
+            expire, value = item
+            if expire < time.monotonic():
+                del self.data[key]
+                return None
+            self.data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if self.ttl <= 0:
+            return
+        with self.lock:
+            self.data[key] = (time.monotonic() + self.ttl, value)
+            self.data.move_to_end(key)
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.data.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+
+local_cache = LocalLRU(PRINCIPAL_LOCAL_MAXSIZE, PRINCIPAL_LOCAL_TTL)
+
+
+def get_snapshot_fields():
+    User = get_user_model()
+    return [f.attname for f in User._meta.concrete_fields if f.name not in EXCLUDE_FIELDS]
+
+
+def make_snapshot(user, generation) -> dict:
+    fields = get_snapshot_fields()
+    return {
+        'generation': generation,
+        'fields': fields,
+        'values': [getattr(user, name) for name in fields],
+        'permission_set': {
+            name: getattr(user.get_permission_set(), name) for name in PERMISSION_SET_FIELDS
+        },
+        'department_child_ids': user.department_child_ids,
+    }
+
+
+def load_snapshot(snapshot: dict):
+    """由快照还原用户对象，未缓存的字段访问时再从数据库加载"""
+    User = get_user_model()
+    user = User.from_db('default', snapshot['fields'], snapshot['values'])
+    from .models import UserPermissionSet
+    user.func_permission_set = UserPermissionSet(user_id=user.pk, **snapshot['permission_set'])
+    user._department_child_ids_cache = snapshot['department_child_ids']
+    return user
+
+
+def get_principal(user_id) -> Optional[object]:
+    """获取认证用户，用户不存在时返回 None"""
+    user_id = str(user_id)
+    snapshot = local_cache.get(user_id)
+    if snapshot is not None:
+        return load_snapshot(snapshot)
+    key = PRINCIPAL_KEY.format(user_id)
+    try:
+        cached = cache.get_many([key, GENERATION_KEY])
+    except Exception as e:
+        logger.error(f'usercenter principal cache get error: {e}', exc_info=e)
+        cached = {}
+    generation = cached.get(GENERATION_KEY)
+    snapshot = cached.get(key)
+    if snapshot is None or snapshot.get('generation') != generation:
+        User = get_user_model()
+        user = User.objects.select_related('department').filter(pk=user_id).first()
+        if user is None:
+            return None
+        snapshot = make_snapshot(user, generation)
+        try:
+            cache.set(key, snapshot, PRINCIPAL_CACHE_TTL)
+        except Exception as e:
+            logger.error(f'usercenter principal cache set error: {e}', exc_info=e)
+    local_cache.set(user_id, snapshot)
+    return load_snapshot(snapshot)
+
+
+def invalidate_principals(user_ids: Iterable):
+    """在事务提交后删除用户快照"""
+    keys = sorted({str(pk) for pk in user_ids if pk})
+    if keys:
+        transaction.on_commit(lambda: _delete_principals(keys))
+
+
+def _delete_principals(user_ids):
+    for pk in user_ids:
+        local_cache.delete(pk)
+    try:
+        cache.delete_many([PRINCIPAL_KEY.format(pk) for pk in user_ids])
+    except Exception as e:
+        logger.error(f'usercenter principal cache delete error: {e}', exc_info=e)
+
+
+def invalidate_all():
+    """在事务提交后使所有用户快照失效"""
+    transaction.on_commit(_incr_generation)
+
+
+def _incr_generation():
+    local_cache.clear()
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.add(GENERATION_KEY, time.time_ns(), timeout=None)
+    except Exception as e:
+        logger.error(f'usercenter principal generation incr error: {e}', exc_info=e)
@@ -8,6 +8,7 @@ from rest_captcha import utils
 from rest_captcha.settings import api_settings
 
 from system.models import SystemOrg
+from utility import tree
 from . import models
 
 cache = caches[api_settings.CAPTCHA_CACHE]
@@ -100,8 +101,8 @@ class FuncPermissionTreeSerializer(serializers.ModelSerializer):
         )
 
     def get_items(self, obj):
-        children = obj.children.all()
-        childrens = FuncPermissionTreeSerializer(children, many=True).data
+        children = tree.get_children(self.context, obj)
+        childrens = FuncPermissionTreeSerializer(children, many=True, context=tree.get_child_context(self.context)).data
         result = []
         result.extend(childrens)
         return result or None
@@ -166,8 +167,8 @@ class DepartmentSerializer(serializers.ModelSerializer):
         )
 
     def get_items(self, obj):
-        children = obj.children.all()
-        childrens = DepartmentSerializer(children, many=True).data
+        children = tree.get_children(self.context, obj)
+        childrens = DepartmentSerializer(children, many=True, context=tree.get_child_context(self.context)).data
         result = []
         result.extend(childrens)
         return result
@@ -207,11 +208,14 @@ class TxlSerializer(serializers.ModelSerializer):
         )
 
     def get_children(self, obj: models.Department):
-        children = obj.children.all()
-        childrens = TxlSerializer(children, many=True).data
+        children = tree.get_children(self.context, obj)
+        childrens = TxlSerializer(children, many=True, context=tree.get_child_context(self.context, 'tree_users')).data
         result = []
         result.extend(childrens)
-        users = obj.users.order_by('sort_num', 'full_name')
+        if 'tree_users' in self.context:
+            users = self.context['tree_users'].get(obj.pk, [])
+        else:
+            users = obj.users.order_by('sort_num', 'full_name')
         result.extend(TxlUserSerializer(users, many=True).data)
         return result
 
@@ -242,12 +246,24 @@ class FlatDepartmentSerializer(serializers.ModelSerializer):
         )
 
 
+class UserListSerializer(serializers.ListSerializer):
+    """用户列表，序列化前批量加载整页用户的关联数据"""
+
+    def to_representation(self, data):
+        from django.db.models.manager import BaseManager
+        from .prefetch import prefetch_users
+        users = list(data.all() if isinstance(data, BaseManager) else data)
+        prefetch_users(users)
+        return super().to_representation(users)
+
+
 class UserSerializer(serializers.ModelSerializer):
     """用户"""
     department_name = serializers.CharField(source='department.name', read_only=True)
 
     class Meta:
         model = models.User
+        list_serializer_class = UserListSerializer
         fields = (
             'pk',
             'sys_id',
@@ -1,13 +1,19 @@
 from django.contrib.auth.signals import user_logged_in
+from django.db.models.signals import post_init, post_save, post_delete, pre_delete, m2m_changed
 from django.dispatch import receiver
+from mptt.signals import node_moved
 
-from system.models import SystemLog
+from system import audit
+from utility import tree
 from utility.client_ip import get_client_ip
 
+from . import principal, perm_sets, dep_tree
+from .models import User, FuncGroup, FuncPermission, Department
+
 
 @receiver(user_logged_in)
 def add_user_login_log(sender, request, user, **kwargs):
-    SystemLog.objects.create(
+    audit.log(
         sys_id=user.sys_id,
         org_id=user.org_id,
         log_level=0,
@@ -15,3 +21,114 @@ def add_user_login_log(sender, request, user, **kwargs):
         user=user, user_name=user.username,
         content=get_client_ip(request),
     )
+
+
+# 通讯录中显示用户时使用的字段，变化后才需要使通讯录缓存失效
+USER_TREE_FIELDS = ('department_id', 'full_name', 'sort_num', 'is_department_manager', 'avatar')
+_unloaded = object()
+
+
+def get_user_tree_state(instance: User) -> tuple:
+    # 只读取已加载的字段，不触发延迟加载字段的查询
+    return tuple(instance.__dict__.get(name, _unloaded) for name in USER_TREE_FIELDS)
+
+
+@receiver(post_init, sender=User)
+def remember_user_tree_state(sender, instance, **kwargs):
+    instance._tree_state = get_user_tree_state(instance)
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_principal(sender, instance, created, **kwargs):
+    principal.invalidate_principals([instance.pk])
+    state = get_user_tree_state(instance)
+    if created or state != getattr(instance, '_tree_state', None):
+        tree.invalidate_tree(User)
+    instance._tree_state = state
+
+
+@receiver(post_delete, sender=User)
+def invalidate_deleted_user_principal(sender, instance, **kwargs):
+    principal.invalidate_principals([instance.pk])
+    tree.invalidate_tree(User)
+
+
+@receiver(m2m_changed, sender=User.func_groups.through)
+@receiver(m2m_changed, sender=User.func_user_permissions.through)
+def rebuild_user_permission_set(sender, instance, action, reverse, pk_set, **kwargs):
+    """用户的角色、功能权限变化"""
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            perm_sets.rebuild_permission_sets([instance.pk])
+    elif action in ('post_add', 'post_remove'):
+        perm_sets.rebuild_permission_sets(pk_set or [])
+    elif action == 'pre_clear':
+        instance._clear_user_ids = list(instance.user_set.values_list('pk', flat=True))
+    elif action == 'post_clear':
+        perm_sets.rebuild_permission_sets(getattr(instance, '_clear_user_ids', []))
+
+
+@receiver(m2m_changed, sender=FuncGroup.permissions.through)
+def rebuild_group_permission_set(sender, instance, action, reverse, pk_set, **kwargs):
+    """角色的功能权限变化，重新计算角色下所有用户"""
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            perm_sets.rebuild_permission_sets(perm_sets.get_group_user_ids([instance.pk]))
+    elif action in ('post_add', 'post_remove'):
+        perm_sets.rebuild_permission_sets(perm_sets.get_group_user_ids(pk_set or []))
+    elif action == 'pre_clear':
+        instance._clear_user_ids = perm_sets.get_permission_user_ids([instance.pk])
+    elif action == 'post_clear':
+        perm_sets.rebuild_permission_sets(getattr(instance, '_clear_user_ids', []))
+
+
+@receiver(pre_delete, sender=FuncGroup)
+def collect_group_permission_users(sender, instance, **kwargs):
+    instance._delete_user_ids = perm_sets.get_group_user_ids([instance.pk])
+
+
+@receiver(post_delete, sender=FuncGroup)
+def rebuild_group_delete_permission_set(sender, instance, **kwargs):
+    perm_sets.rebuild_permission_sets(getattr(instance, '_delete_user_ids', []))
+
+
+@receiver(post_save, sender=FuncPermission)
+def rebuild_permission_permission_set(sender, instance, created, **kwargs):
+    """功能权限名称、codename 修改"""
+    if not created:
+        perm_sets.rebuild_permission_sets(perm_sets.get_permission_user_ids([instance.pk]))
+
+
+@receiver(pre_delete, sender=FuncPermission)
+def collect_permission_users(sender, instance, **kwargs):
+    instance._delete_user_ids = perm_sets.get_permission_user_ids([instance.pk])
+
+
+@receiver(post_delete, sender=FuncPermission)
+def rebuild_permission_delete_permission_set(sender, instance, **kwargs):
+    perm_sets.rebuild_permission_sets(getattr(instance, '_delete_user_ids', []))
+
+
+@receiver(post_save, sender=Department)
+@receiver(post_delete, sender=Department)
+@receiver(node_moved, sender=Department)
+@receiver(m2m_changed, sender=Department.dep_manager.through)
+def invalidate_all_principal(sender, **kwargs):
+    """部门树变化影响的用户无法直接确定，使所有用户快照失效"""
+    if kwargs.get('action', 'post').startswith('pre'):
+        return
+    principal.invalidate_all()
+
+
+@receiver(post_save, sender=Department)
+@receiver(post_delete, sender=Department)
+@receiver(node_moved, sender=Department)
+def invalidate_department_tree(sender, instance, **kwargs):
+    dep_tree.invalidate(instance.sys_id, instance.org_id)
+    tree.invalidate_tree(Department)
+
+
+@receiver(m2m_changed, sender=Department.dep_manager.through)
+def invalidate_department_manager_tree(sender, action, **kwargs):
+    if action.startswith('post'):
+        tree.invalidate_tree(Department)
@@ -0,0 +1,102 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.exceptions import ParseError
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from .models import User, Department, FuncGroup, FuncPermission
+from .pagination import UCKeysetPagination
+from .serializers import UserSerializer
+
+SYS_ID = 9002
+
+
+class UserListQueryCountTestCase(TestCase):
+    """用户列表序列化的查询次数与每页用户数量无关"""
+
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            parent = Department.objects.create(sys_id=SYS_ID, name='parent')
+            child = Department.objects.create(sys_id=SYS_ID, name='child', parent=parent)
+            permission = FuncPermission.objects.create(sys_id=SYS_ID, name='perm', codename='perm')
+            group = FuncGroup.objects.create(sys_id=SYS_ID, name='group')
+            group.permissions.add(permission)
+            for i in range(10):
+                user = User.objects.create(
+                    sys_id=SYS_ID, username=f'query-count-{i}', department=(parent, child, None)[i % 3]
+                )
+                user.func_groups.add(group)
+                user.func_user_permissions.add(permission)
+                if i % 4 == 0:
+                    child.dep_manager.add(user)
+        self.users = User.objects.filter(sys_id=SYS_ID).order_by('username')
+        # 预先构建权限集合、部门树索引等缓存，两次计数的条件相同
+        UserSerializer(self.users, many=True).data
+
+    def serialize(self, size):
+        return UserSerializer(self.users[:size], many=True).data
+
+    def test_page_size(self):
+        with CaptureQueriesContext(connection) as small:
+            data = self.serialize(2)
+        self.assertEqual(len(data), 2)
+        with self.assertNumQueries(len(small)):
+            data = self.serialize(10)
+        self.assertEqual(len(data), 10)
+
+    def test_same_result(self):
+        data = self.serialize(10)
+        for user, item in zip(self.users, data):
+            self.assertEqual(item['department_child_ids'], user.department_child_ids)
+            self.assertEqual(item['func_group_names'], ['group'])
+            self.assertEqual(item['func_codenames'], user.func_codenames)
+
+
+class KeysetPaginationTestCase(TestCase):
+    """游标分页"""
+
+    def setUp(self):
+        for i in range(8):
+            # 部分用户排序编号相同或为空，需要按唯一字段和空值顺序定位
+            User.objects.create(sys_id=SYS_ID, username=f'keyset-{i}', sort_num=(None, 1, 2)[i % 3])
+        self.queryset = User.objects.filter(sys_id=SYS_ID)
+
+    def paginate(self, queryset, **params):
+        paginator = UCKeysetPagination()
+        request = Request(APIRequestFactory().get('/', params))
+        return paginator, paginator.paginate_queryset(queryset, request)
+
+    def walk(self, queryset, page_size=3):
+        result = []
+        cursor = ''
+        while cursor is not None:
+            paginator, rows = self.paginate(queryset, cursor=cursor, pageSize=page_size)
+            self.assertLessEqual(len(rows), page_size)
+            result.extend(row.pk for row in rows)
+            cursor = paginator.next_cursor
+        return result
+
+    def test_default_ordering(self):
+        expected = list(self.queryset.order_by('-create_time', '-pk').values_list('pk', flat=True))
+        self.assertEqual(self.walk(self.queryset.order_by()), expected)
+
+    def test_nullable_ordering(self):
+        for ordering in ('sort_num', '-sort_num'):
+            queryset = self.queryset.order_by(ordering)
+            expected = list(self.queryset.order_by(ordering, ordering.replace('sort_num', 'pk')).values_list('pk', flat=True))
+            self.assertEqual(self.walk(queryset), expected)
+
+    def test_count(self):
+        paginator, _ = self.paginate(self.queryset, cursor='')
+        self.assertEqual(paginator.count, 8)
+        paginator, _ = self.paginate(self.queryset, cursor='', with_count='false')
+        self.assertIsNone(paginator.count)
+
+    def test_invalid_cursor(self):
+        with self.assertRaises(ParseError):
+            self.paginate(self.queryset, cursor='invalid')
+        paginator, _ = self.paginate(self.queryset.order_by('sort_num'), cursor='', pageSize=3)
+        # 排序与游标不一致
+        with self.assertRaises(ParseError):
+            self.paginate(self.queryset.order_by('-sort_num'), cursor=paginator.next_cursor)
@@ -0,0 +1,231 @@
+"""
+按 create_time 范围分区的数据表。
+
+分区模式由各应用的命令开启：原表改名为 {table}_legacy，新建按 create_time 范围分区的同名表
+（主键为 id, create_time），原表作为最早的分区挂载；分区表的索引由调用方指定或使用模型 Meta.indexes。
+
+定时任务提前创建后续分区，过期分区导出为 gzip 压缩的 CSV 文件保存到文件存储后删除。
+定位点（gps.partitions）和系统日志（system.partitions）使用此模块，各自处理未分区时的数据删除。
+"""
+
+import gzip
+import time
+import datetime
+import logging
+import tempfile
+from typing import List, Optional, Sequence, Tuple, Type
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import connection, models, transaction
+from django.utils import timezone
+
+logger = logging.getLogger('restapi')
+
+# 查询接口判断是否已分区时进程内缓存的时间（秒）
+PARTITIONED_CHECK_TTL = 60
+
+
+def get_today() -> datetime.date:
+    """当前日期，USE_TZ = False 时 timezone.localdate() 不能用于无时区的时间"""
+    if settings.USE_TZ:
+        return timezone.localdate()
+    return datetime.date.today()
+
+
+def get_cutoff(days: int) -> datetime.date:
+    return get_today() - datetime.timedelta(days=days)
+
+
+def next_month(start: datetime.date) -> datetime.date:
+    return (start.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+
+
+class PartitionedTable(object):
+    """
+    按 create_time 范围分区的模型数据表。
+
+    period 为分区周期（month 或 day），premake 为提前创建的分区数量；
+    indexes 为分区表的索引 [(名称, 字段)]，为 None 时使用模型 Meta.indexes。
+    """
+
+    def __init__(self, model: Type[models.Model], period: str = 'month', premake: int = 2,
+                 archive: bool = True, archive_dir: str = '', indexes: Optional[Sequence[Tuple[str, str]]] = None,
+                 label: Optional[str] = None):
+        self.model = model
+        self.table = model._meta.db_table
+        self.legacy_table = f'{self.table}_legacy'
+        self.partition_prefix = f'{self.table}_p'
+        self.period = period
+        self.premake = premake
+        self.archive = archive
+        self.archive_dir = archive_dir
+        self.indexes = indexes
+        self.label = label or self.table
+        self._partitioned = None  # type: Optional[Tuple[bool, float]]
+
+    def is_partitioned(self, cached: bool = False) -> bool:
+        """
+        查询系统表判断是否已转换为分区表。
+
+        cached=True 时使用进程内短时间的缓存，仅用于查询接口的分区裁剪；
+        分区维护、转换等操作总是直接查询，避免长期运行的进程使用转换前的结果。
+        """
+        now = time.monotonic()
+        if cached and self._partitioned is not None and self._partitioned[1] > now:
+            return self._partitioned[0]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid "
+                "WHERE c.relname = %s AND c.relnamespace = 'public'::regnamespace",
+                [self.table]
+            )
+            value = cursor.fetchone() is not None
+        self._partitioned = (value, now + PARTITIONED_CHECK_TTL)
+        return value
+
+    def period_start(self, day: datetime.date) -> datetime.date:
+        if self.period == 'day':
+            return day
+        return day.replace(day=1)
+
+    def next_period(self, start: datetime.date) -> datetime.date:
+        if self.period == 'day':
+            return start + datetime.timedelta(days=1)
+        return next_month(start)
+
+    def partition_name(self, start: datetime.date) -> str:
+        fmt = '%Y%m%d' if self.period == 'day' else '%Y%m'
+        return self.partition_prefix + start.strftime(fmt)
+
+    def parse_partition_name(self, name: str) -> Optional[Tuple[datetime.date, datetime.date]]:
+        """由分区名得到分区的时间范围 [start, end)，分区周期变更前创建的分区同样可以解析"""
+        suffix = name[len(self.partition_prefix):]
+        try:
+            if len(suffix) == 8:
+                start = datetime.datetime.strptime(suffix, '%Y%m%d').date()
+                return start, start + datetime.timedelta(days=1)
+            start = datetime.datetime.strptime(suffix, '%Y%m').date()
+            return start, next_month(start)
+        except ValueError:
+            return None
+
+    def list_partitions(self) -> List[str]:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT c.relname FROM pg_inherits i "
+                "JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent "
+                "WHERE p.relname = %s ORDER BY c.relname",
+                [self.table]
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def create_partition(self, cursor, start: datetime.date):
+        cursor.execute(
+            f'CREATE TABLE IF NOT EXISTS {self.partition_name(start)} PARTITION OF {self.table} '
+            f'FOR VALUES FROM (%s) TO (%s)',
+            [start.isoformat(), self.next_period(start).isoformat()]
+        )
+
+    def ensure_partitions(self, today: Optional[datetime.date] = None) -> List[str]:
+        """创建当前及后续 premake 个周期的分区"""
+        start = self.period_start(today or get_today())
+        names = []
+        with connection.cursor() as cursor:
+            for _ in range(self.premake + 1):
+                self.create_partition(cursor, start)
+                names.append(self.partition_name(start))
+                start = self.next_period(start)
+        return names
+
+    def get_indexes(self) -> List[Tuple[str, str]]:
+        """分区表的索引 [(名称, 创建语句)]"""
+        if self.indexes is not None:
+            return [
+                (name, f'CREATE INDEX IF NOT EXISTS {name} ON {self.table} ({columns})')
+                for name, columns in self.indexes
+            ]
+        result = []
+        with connection.schema_editor() as schema_editor:
+            for index in self.model._meta.indexes:
+                result.append((index.name, str(index.create_sql(self.model, schema_editor))))
+        return result
+
+    def convert(self):
+        """把数据表转换为按 create_time 范围分区的表，原表数据作为最早的分区保留"""
+        if self.is_partitioned():
+            return
+        boundary = self.period_start(get_today())
+        indexes = self.get_indexes()
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(f'LOCK TABLE {self.table} IN ACCESS EXCLUSIVE MODE')
+                cursor.execute(f'ALTER TABLE {self.table} RENAME TO {self.legacy_table}')
+                # 作为分区挂载时主键需要与分区表一致，原表主键 (id) 改为 (id, create_time)
+                cursor.execute(
+                    "SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'p'",
+                    [self.legacy_table]
+                )
+                for (conname,) in cursor.fetchall():
+                    cursor.execute(f'ALTER TABLE {self.legacy_table} DROP CONSTRAINT {conname}')
+                cursor.execute(
+                    f'ALTER TABLE {self.legacy_table} ADD CONSTRAINT {self.legacy_table}_pkey PRIMARY KEY (id, create_time)'
+                )
+                # 索引名称在同一 schema 中唯一，原表的同名索引改名后由分区表的索引挂载
+                for name, _ in indexes:
+                    cursor.execute(f'ALTER INDEX IF EXISTS {name} RENAME TO {name}_legacy')
+                cursor.execute(
+                    f'CREATE TABLE {self.table} (LIKE {self.legacy_table} INCLUDING DEFAULTS) '
+                    f'PARTITION BY RANGE (create_time)'
+                )
+                cursor.execute(f'ALTER TABLE {self.table} ADD PRIMARY KEY (id, create_time)')
+                for _, sql in indexes:
+                    cursor.execute(sql)
+                start = boundary
+                for _ in range(self.premake + 1):
+                    self.create_partition(cursor, start)
+                    start = self.next_period(start)
+                # 当前周期的数据移入新分区，原表只保留更早的数据
+                cursor.execute(
+                    f'INSERT INTO {self.table} SELECT * FROM {self.legacy_table} WHERE create_time >= %s', [boundary]
+                )
+                cursor.execute(f'DELETE FROM {self.legacy_table} WHERE create_time >= %s', [boundary])
+                cursor.execute(
+                    f'ALTER TABLE {self.table} ATTACH PARTITION {self.legacy_table} FOR VALUES FROM (MINVALUE) TO (%s)',
+                    [boundary]
+                )
+        self._partitioned = None
+
+    def copy_to_storage(self, sql: str, file_name: str) -> str:
+        """执行 COPY 导出为 gzip 压缩的 CSV，保存到文件存储，返回文件路径"""
+        with tempfile.TemporaryFile() as tmp:
+            with gzip.GzipFile(fileobj=tmp, mode='wb') as gz:
+                with connection.cursor() as cursor:
+                    cursor.copy_expert(f'COPY ({sql}) TO STDOUT WITH CSV HEADER', gz)
+            tmp.seek(0)
+            return default_storage.save(f'{self.archive_dir}/{file_name}.csv.gz', File(tmp))
+
+    def drop_expired_partitions(self, days: int) -> List[str]:
+        """导出并删除结束时间早于保留期限的分区"""
+        cutoff = get_cutoff(days)
+        dropped = []
+        for name in self.list_partitions():
+            if name == self.legacy_table:
+                with connection.cursor() as cursor:
+                    cursor.execute(f'SELECT max(create_time) FROM {self.legacy_table}')
+                    latest = cursor.fetchone()[0]
+                if latest is not None and latest.date() >= cutoff:
+                    continue
+            else:
+                bounds = self.parse_partition_name(name)
+                if bounds is None or bounds[1] > cutoff:
+                    continue
+            if self.archive:
+                path = self.copy_to_storage(f'SELECT * FROM {name}', name)
+                logger.info(f'{self.label} partition {name} archived to {path}')
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(f'ALTER TABLE {self.table} DETACH PARTITION {name}')
+                cursor.execute(f'DROP TABLE {name}')
+            dropped.append(name)
+        return dropped
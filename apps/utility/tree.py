@@ -0,0 +1,121 @@
+"""
+MPTT 树形接口的批量加载。
+
+树形序列化器通过 SerializerMethodField 递归序列化子节点，原本每个节点查询一次子节点。
+序列化前按根节点的 tree_id 一次查询出这些树的全部节点，按 parent 分组后放入序列化上下文，
+序列化器通过 `get_children` 从上下文读取子节点，查询次数与节点数量无关。
+
+树形接口的序列化结果可按相关模型的版本号缓存，模型新增、修改、删除、移动节点后递增版本号。
+"""
+
+import json
+import time
+import hashlib
+import logging
+from collections import defaultdict
+from typing import Callable, Dict, Iterable, List, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.utils.encoders import JSONEncoder
+
+logger = logging.getLogger('restapi')
+
+# 树形接口序列化结果的缓存时间（秒）
+TREE_CACHE_TTL = getattr(settings, 'UTILITY_TREE_CACHE_TTL', 60 * 60)
+
+TREE_CHILDREN = 'tree_children'
+TREE_VERSION_KEY = 'utility:tree-version:{}'
+
+
+def load_children_map(queryset, roots: Iterable) -> Dict[str, list]:
+    """一次查询加载根节点所在树的全部节点，返回 父节点ID -> 按 lft 排序的子节点列表"""
+    tree_ids = {node.tree_id for node in roots}
+    children = defaultdict(list)
+    if tree_ids:
+        for node in queryset.filter(tree_id__in=tree_ids).order_by('tree_id', 'lft'):
+            if node.parent_id is not None:
+                children[node.parent_id].append(node)
+    return children
+
+
+def get_tree_context(queryset, roots: Iterable, context: Optional[dict] = None) -> dict:
+    context = dict(context or {})
+    context[TREE_CHILDREN] = load_children_map(queryset, roots)
+    return context
+
+
+def get_child_context(context: dict, *keys) -> dict:
+    """子节点序列化器的上下文，只传递预先加载的节点及 keys 中的数据，不传递 request 等，子节点输出与原来一致"""
+    return {key: context[key] for key in (TREE_CHILDREN,) + keys if key in context}
+
+
+def get_children(context: dict, obj):
+    """序列化器中获取子节点，上下文中没有预先加载的节点时按原方式查询"""
+    children = context.get(TREE_CHILDREN)
+    if children is None:
+        return obj.children.all()
+    return children.get(obj.pk, [])
+
+
+class TreeListMixin(object):
+    """列表接口序列化前一次加载当前页节点所在树的全部节点"""
+    tree_queryset = None
+
+    def get_tree_queryset(self):
+        if self.tree_queryset is not None:
+            return self.tree_queryset.all()
+        return self.get_queryset().model._default_manager.all()
+
+    def get_serializer(self, *args, **kwargs):
+        if kwargs.get('many') and args:
+            roots = list(args[0])
+            args = (roots,) + args[1:]
+            kwargs['context'] = get_tree_context(self.get_tree_queryset(), roots, self.get_serializer_context())
+        return super().get_serializer(*args, **kwargs)
+
+
+def get_model_label(model) -> str:
+    return model._meta.label_lower
+
+
+def get_tree_versions(models: Iterable) -> List[str]:
+    keys = [TREE_VERSION_KEY.format(get_model_label(model)) for model in models]
+    versions = cache.get_many(keys)
+    result = []
+    for key in keys:
+        version = versions.get(key)
+        if version is None:
+            cache.add(key, time.time_ns(), timeout=None)
+            version = cache.get(key)
+        result.append(str(version))
+    return result
+
+
+def invalidate_tree(model):
+    """在事务提交后递增模型的树版本号"""
+    transaction.on_commit(lambda: _incr_version(get_model_label(model)))
+
+
+def _incr_version(label: str):
+    key = TREE_VERSION_KEY.format(label)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, time.time_ns(), timeout=None)
+    except Exception as e:
+        logger.error(f'utility tree invalidate {label} error: {e}', exc_info=e)
+
+
+def get_cached_data(parts, models: Iterable, func: Callable):
+    """按模型版本号缓存树形接口的序列化结果（JSON），func 返回序列化数据"""
+    digest = hashlib.sha1(
+        json.dumps([parts, get_tree_versions(models)], sort_keys=True, default=str).encode('utf-8')
+    ).hexdigest()
+    key = f'utility:tree:{digest}'
+    content = cache.get(key)
+    if content is None:
+        content = json.dumps(func(), cls=JSONEncoder, ensure_ascii=False)
+        cache.set(key, content, TREE_CACHE_TTL)
+    return json.loads(content)
@@ -242,6 +242,32 @@ CELERY_RESULT_BACKEND = 'django-db'
 CELERY_CACHE_BACKEND = 'default'
 
 CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers:DatabaseScheduler'
+CELERY_BEAT_SCHEDULE = {
+    'formtemplate-reconcile-rollups': {
+        'task': 'formtemplate.tasks.reconcile_rollups',
+        'schedule': 10 * 60,
+    },
+    'formtemplate-clean-report-jobs': {
+        'task': 'formtemplate.tasks.clean_report_jobs',
+        'schedule': 24 * 60 * 60,
+    },
+    'gps-flush-point-buffer': {
+        'task': 'gps.tasks.flush_point_buffer',
+        'schedule': 10,
+    },
+    'gps-maintain-point-partitions': {
+        'task': 'gps.tasks.maintain_point_partitions',
+        'schedule': 6 * 60 * 60,
+    },
+    'system-flush-audit-log': {
+        'task': 'system.tasks.flush_audit_log',
+        'schedule': 5,
+    },
+    'system-maintain-log-partitions': {
+        'task': 'system.tasks.maintain_log_partitions',
+        'schedule': 6 * 60 * 60,
+    },
+}
 CELERY_BROKER_URL = REDIS_URL + '2'
 
 CORS_ALLOW_ALL_ORIGINS = True